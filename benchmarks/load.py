@@ -0,0 +1,132 @@
+"""In-process load generator: drives an ASGI app through httpx at a fixed concurrency.
+
+    python -m benchmarks.load [--app main:app] [--concurrency 16] [--requests 500]
+                              [--scenarios analyze,history,auth] [--token TOKEN]
+                              [--output results/load.json]
+
+Requests go straight to the app through httpx's ASGI transport, so the
+numbers cover the app and framework without sockets or a server. The client
+shares the event loop with the app, which makes them a lower bound on
+throughput. Reports throughput and p50/p95/p99 latency per scenario.
+"""
+import argparse
+import asyncio
+import importlib
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+import httpx
+import numpy as np
+from .results import save, summarize
+from .synthetic import image_payload
+
+USER_ID = "bench-user"
+
+Request = Tuple[str, str, Dict]
+
+def scenarios(image: str, run_id: str = "") -> Dict[str, Callable[[int], List[Request]]]:
+    """Request builders by scenario name; each maps a number to the requests one worker sends in order.
+
+    Numbers are unique within a run, and run_id keeps accounts from
+    different runs against the same database apart.
+    """
+    def analyze(i: int) -> List[Request]:
+        return [("POST", "/api/analyze-face", {"json": {"image": image, "user_id": USER_ID}})]
+
+    def history(i: int) -> List[Request]:
+        return [("GET", f"/api/analysis-history/{USER_ID}", {})]
+
+    def auth(i: int) -> List[Request]:
+        # Register a fresh account, then log into it once the registration has answered
+        account = {"email": f"bench-{run_id}{i}@example.com", "password": "bench-password"}
+        return [
+            ("POST", "/api/auth/register", {"json": {**account, "username": f"bench{run_id}{i}", "full_name": "Bench"}}),
+            ("POST", "/api/auth/login", {"json": account}),
+        ]
+
+    return {"analyze": analyze, "history": history, "auth": auth}
+
+def load_app(spec: str):
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name or "app")
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    build: Callable[[int], List[Request]],
+    total: int,
+    concurrency: int,
+    first: int = 0,
+) -> Dict:
+    """Send the requests for numbers first to first + total; each request is timed on its own."""
+    latencies = []
+    statuses: Dict[int, int] = {}
+    numbers = iter(range(first, first + total))
+
+    async def worker():
+        for i in numbers:
+            for method, url, kwargs in build(i):
+                start = time.perf_counter()
+                response = await client.request(method, url, **kwargs)
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        **summarize(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+async def run(args) -> Dict[str, Dict]:
+    app = load_app(args.app)
+    width, height = map(int, args.image_size.split("x"))
+    builders = scenarios(image_payload(width, height, np.random.default_rng(0)), f"{int(time.time()):x}-")
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+            for name in args.scenarios.split(","):
+                build = builders[name]
+                warm_up = min(args.requests, args.concurrency * 2)
+                await run_scenario(client, build, warm_up, args.concurrency)
+                key = f"{name}/c{args.concurrency}"
+                # Numbered after the warm-up, so auth registers accounts that don't exist yet
+                results[key] = run_result = await run_scenario(client, build, args.requests, args.concurrency, warm_up)
+                print(
+                    f"{key:<20}{run_result['throughput_rps']:>10.1f}{run_result['p50_ms']:>10.2f}"
+                    f"{run_result['p95_ms']:>10.2f}{run_result['p99_ms']:>10.2f}{run_result['errors']:>8}"
+                )
+    return results
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="main:app", help="module:attribute of the ASGI app")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario (auth: register and login pairs)")
+    parser.add_argument("--scenarios", default="analyze,history,auth")
+    parser.add_argument("--image-size", default="640x480")
+    parser.add_argument("--token", help="bearer token for apps that require authentication")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios.split(",")) - set(scenarios("").keys())
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    print(f"{'scenario':<20}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    results = asyncio.run(run(args))
+    save(args.output, "load", results, {
+        "app": args.app,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "image_size": args.image_size,
+    })
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Microbenchmarks for each stage a request goes through: decode, quality gate,
+face mesh, skin, scoring and response serialization.
+
+    python -m benchmarks.micro [--runs 50] [--output results/micro.json]
+
+Inputs are synthetic (see synthetic.py). A stage whose model can't load here
+is reported as skipped rather than failing the suite.
+"""
+import argparse
+import sys
+import time
+from typing import Callable, Dict
+import cv2
+import numpy as np
+from src.services.face_analysis import decode_image, face_analysis_service
+from src.services.quality import assess_image
+from src.services.scoring import scorer_registry
+from src.services.skin import skin_clarity
+from .results import save, summarize
+from .serialization import cases as serialization_cases
+from .synthetic import synthetic_frame, synthetic_landmarks
+
+def measure(fn: Callable, runs: int, warmup: int = 3) -> Dict:
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+def benchmarks(rng: np.random.Generator) -> Dict[str, Callable]:
+    frames = {name: synthetic_frame(width, height, rng) for name, (width, height) in (
+        ("720p", (1280, 720)),
+        ("1080p", (1920, 1080)),
+    )}
+    data, candidate = frames["1080p"]
+    image = decode_image(data)
+    crop, transform = face_analysis_service.align_crop(image, candidate)
+    scorer = scorer_registry.active
+
+    suite = {}
+    for name, (frame, _) in frames.items():
+        suite[f"decode/{name}"] = lambda frame=frame: decode_image(frame)
+    suite["quality_gate/1080p"] = lambda: assess_image(image)
+    suite["mesh/crop"] = lambda: face_analysis_service.mesh_crop(crop, transform)
+    suite["mesh/full_frame_1080p"] = lambda: face_analysis_service.mesh_full_frame(image)
+    landmarks = synthetic_landmarks(1, rng, size=float(candidate.box[2])) + candidate.box[:2]
+    suite["skin/1_face"] = lambda: skin_clarity(image, landmarks)
+    for batch in (1, 32, 512):
+        faces = synthetic_landmarks(batch, rng)
+        suite[f"scoring/batch_{batch}"] = lambda faces=faces: scorer.split(scorer.score(faces))
+    for name, _, fast in serialization_cases(50):
+        suite[f"serialize/{name}"] = fast
+    return suite
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--only", help="run benchmarks whose name starts with this prefix")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)
+    results = {}
+    print(f"{'benchmark':<40}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, fn in benchmarks(np.random.default_rng(0)).items():
+        if args.only and not name.startswith(args.only):
+            continue
+        try:
+            # Serialization calls are microseconds; run them enough times to time reliably
+            results[name] = measure(fn, args.runs * 20 if name.startswith("serialize/") else args.runs)
+        except Exception as e:
+            results[name] = {"skipped": f"{type(e).__name__}: {e}"}
+            print(f"{name:<40}skipped ({results[name]['skipped']})")
+            continue
+        r = results[name]
+        print(f"{name:<40}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}")
+
+    save(args.output, "micro", results, {"runs": args.runs})
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
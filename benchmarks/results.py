@@ -0,0 +1,118 @@
+"""Benchmark results as JSON, and a comparison between two runs.
+
+    python -m benchmarks.results BASELINE.json CURRENT.json [--threshold 0.1]
+
+Each file holds one suite's results keyed by benchmark name, plus the commit
+and machine they were measured on. Exits non-zero if any latency grew, or any
+throughput shrank, by more than the threshold (a fraction).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Metrics where a larger value is better; every other metric is a latency
+HIGHER_IS_BETTER = {"throughput_rps"}
+COMPARED = {"p50_ms", "p95_ms", "p99_ms", "throughput_rps"}
+
+def summarize(values_ms: List[float]) -> Dict[str, float]:
+    """Latency percentiles of a list of timings in milliseconds."""
+    ordered = sorted(values_ms)
+    if not ordered:
+        return {"runs": 0}
+
+    def percentile(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "runs": len(ordered),
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1],
+    }
+
+def environment() -> Dict:
+    """Where and on what the results were measured."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "measured_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def save(path: Optional[str], suite: str, results: Dict[str, Dict], settings: Optional[Dict] = None) -> None:
+    """Write a suite's results to path, if one was given."""
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "suite": suite,
+            "environment": environment(),
+            "settings": settings or {},
+            "results": results,
+        }, f, indent=2, sort_keys=True)
+    print(f"results written to {path}")
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """Print metric changes between two result files; returns the regressions."""
+    regressions = []
+    print(f"{'benchmark':<36}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, metrics in sorted(current["results"].items()):
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<36}(new)")
+            continue
+        for metric in sorted(COMPARED & metrics.keys() & before.keys()):
+            old, new = before[metric], metrics[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = "  !" if worse > threshold else ""
+            print(f"{name:<36}{metric:<16}{old:>12.3f}{new:>12.3f}{change:>+8.1%}{flag}")
+            if worse > threshold:
+                regressions.append(f"{name} {metric}: {old:.3f} -> {new:.3f} ({change:+.1%})")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline.get("suite") != current.get("suite"):
+        print(f"suites differ: {baseline.get('suite')} vs {current.get('suite')}")
+        return 2
+    print(f"baseline {baseline['environment'].get('commit')}  current {current['environment'].get('commit')}")
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
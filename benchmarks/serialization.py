@@ -0,0 +1,117 @@
+"""Serialization cost per endpoint: FastAPI's default path against the orjson fast path.
+
+    python -m benchmarks.serialization [--runs 20000] [--history 50]
+
+The default path is what FastAPI does with a returned dict: jsonable_encoder,
+then JSONResponse rendering with the json module (plus, for analyze-face, the
+pydantic validate-then-dump round trip main_simple.py used to do). The fast
+path is what the endpoints now return. Payloads mirror the real responses;
+the apps themselves aren't imported so no model has to load.
+"""
+import argparse
+import json
+import sys
+import timeit
+from datetime import datetime
+from typing import Dict, List
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from src.api.serialization import dumps, encoded_response, json_response, open_string_field
+
+class AnalysisResponse(BaseModel):
+    # Same fields as src.api.demo.AnalysisResponse
+    id: str
+    user_id: str
+    scores: Dict[str, float]
+    improvement_tips: List[str]
+    landmarks_detected: bool
+    analysis_timestamp: str
+    faces: List[Dict] = []
+
+ROOT = {"message": "Mafixy API is running!", "status": "healthy", "version": "1.0.0", "environment": "production"}
+ROOT_BODY = dumps(ROOT)
+HEALTH = {"status": "healthy", "environment": "production", "database": "connected"}
+HEALTH_PREFIX = open_string_field(HEALTH, "timestamp")
+PING_BODY = dumps({"message": "pong"})
+SCORES = {"symmetry": 85.31, "jawline": 78.02, "facial_ratio": 92.4, "skin_clarity": 81.77, "overall": 84.37}
+TIPS = ["Strengthen jawline muscles with specific exercises"]
+
+def analysis_fields() -> Dict:
+    return {
+        "id": "7d7f3f0e-4b43-4a32-9a50-2a3d1e0b9c11",
+        "user_id": "user_123",
+        "scores": SCORES,
+        "improvement_tips": TIPS,
+        "landmarks_detected": True,
+        "analysis_timestamp": datetime.now().isoformat(),
+        "faces": [{"box": {"x": 412.0, "y": 96.5, "width": 188.0, "height": 231.2}, "scores": SCORES}] * 3,
+    }
+
+def history(count: int) -> List[Dict]:
+    return [{
+        "id": i,
+        "scores": SCORES,
+        "improvement_tips": TIPS,
+        "scorer_version": "v1",
+        "analysis_timestamp": datetime(2025, 7, 26, 13, 28, 50).isoformat(),
+    } for i in range(count)]
+
+def without_timestamps(value):
+    """Decoded payload minus per-request timestamps, for comparing the two paths."""
+    if isinstance(value, dict):
+        return {k: without_timestamps(v) for k, v in value.items() if not k.endswith("timestamp")}
+    if isinstance(value, list):
+        return [without_timestamps(v) for v in value]
+    return value
+
+def default_path(content) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+def cases(history_size: int):
+    batch_line = {"type": "result", "index": 2, "filename": "front.jpg", "id": 17, **analysis_fields()}
+    rows = history(history_size)
+    return [
+        ("GET /", lambda: default_path({**ROOT}), lambda: encoded_response(ROOT_BODY).body),
+        (
+            "GET /health",
+            lambda: default_path({**HEALTH, "timestamp": datetime.now().isoformat()}),
+            lambda: encoded_response(HEALTH_PREFIX + datetime.now().isoformat().encode() + b'"}').body,
+        ),
+        ("GET /ping", lambda: default_path({"message": "pong"}), lambda: encoded_response(PING_BODY).body),
+        (
+            "POST /api/analyze-face",
+            lambda: default_path({"message": "ok", "data": AnalysisResponse(**analysis_fields()).model_dump()}),
+            lambda: json_response({"message": "ok", "data": AnalysisResponse.model_construct(**analysis_fields())}).body,
+        ),
+        (
+            f"GET history ({history_size} rows)",
+            lambda: default_path(rows),
+            lambda: json_response(rows).body,
+        ),
+        (
+            "batch NDJSON line",
+            lambda: (json.dumps(batch_line) + "\n").encode(),
+            lambda: dumps(batch_line) + b"\n",
+        ),
+    ]
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20000)
+    parser.add_argument("--history", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<28}{'default us':>12}{'fast us':>10}{'speedup':>9}")
+    for name, default, fast in cases(args.history):
+        if without_timestamps(json.loads(default())) != without_timestamps(json.loads(fast())):
+            print(f"{name}: payloads differ")
+            return 1
+        runs = max(1, args.runs // (args.history if "history" in name else 1))
+        default_us = min(timeit.repeat(default, number=runs, repeat=3)) / runs * 1e6
+        fast_us = min(timeit.repeat(fast, number=runs, repeat=3)) / runs * 1e6
+        print(f"{name:<28}{default_us:>12.2f}{fast_us:>10.2f}{default_us / fast_us:>8.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
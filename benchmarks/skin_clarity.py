@@ -0,0 +1,63 @@
+"""Per-face cost of the skin-clarity stage on a full-HD frame.
+
+    python -m benchmarks.skin_clarity [--faces 4] [--runs 200] [--budget-ms 5]
+
+Exits non-zero if the median time per face is over the budget.
+"""
+import argparse
+import sys
+import time
+import cv2
+import numpy as np
+from src.services.skin import SKIN_REGIONS, skin_clarity
+
+# Region centres and radii relative to the face box
+REGION_LAYOUT = ((0.5, 0.18, 0.28, 0.1), (0.28, 0.58, 0.12, 0.12), (0.72, 0.58, 0.12, 0.12))
+
+def synthetic_landmarks(x: float, y: float, size: float, rng: np.random.Generator) -> np.ndarray:
+    """478 landmarks in a size x size box at (x, y), with convex skin-region polygons."""
+    landmarks = rng.uniform(0, size, (478, 2)) + [x, y]
+    for region, (cx, cy, rx, ry) in zip(SKIN_REGIONS, REGION_LAYOUT):
+        angles = np.linspace(0, 2 * np.pi, len(region), endpoint=False)
+        landmarks[list(region)] = np.stack([
+            x + (cx + rx * np.cos(angles)) * size,
+            y + (cy + ry * np.sin(angles)) * size,
+        ], axis=1)
+    return landmarks.astype(np.float32)
+
+def synthetic_frame(faces: int, noise: float, rng: np.random.Generator):
+    """A 1920x1080 skin-toned frame with faces side by side and their landmarks."""
+    frame = np.empty((1080, 1920, 3), np.float32)
+    frame[:] = (120, 150, 200)
+    frame += rng.normal(0, noise, frame.shape)
+    size = 1800 / max(faces, 1) - 20
+    landmarks = np.stack([synthetic_landmarks(20 + i * (size + 20), 100, size, rng) for i in range(faces)])
+    return np.clip(frame, 0, 255).astype(np.uint8), landmarks
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--budget-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)
+    rng = np.random.default_rng(0)
+    for noise in (2.0, 25.0):
+        frame, landmarks = synthetic_frame(args.faces, noise, rng)
+        skin_clarity(frame, landmarks)  # warm up
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            scores = skin_clarity(frame, landmarks)
+            timings.append((time.perf_counter() - start) * 1000 / args.faces)
+        median, p95 = np.percentile(timings, [50, 95])
+        print(f"noise={noise:>4}: score={scores.mean():5.1f}  per face median={median:.3f} ms  p95={p95:.3f} ms")
+
+    if median > args.budget_ms:
+        print(f"over budget: {median:.3f} ms > {args.budget_ms} ms per face")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""Synthetic inputs shared by the benchmarks: face-like frames, landmark sets and API payloads."""
+import base64
+import cv2
+import numpy as np
+from src.services.face_analysis import FaceCandidate
+
+def synthetic_frame(width: int, height: int, rng: np.random.Generator, face: bool = True):
+    """JPEG bytes of a noisy frame with an optional face-like drawing, and the drawing's candidate box."""
+    frame = rng.normal(110, 30, (height, width, 3)).clip(0, 255).astype(np.uint8)
+    size = height // 3
+    x, y = int(rng.integers(0, width - size)), int(rng.integers(0, height - size))
+    if face:
+        center = (x + size // 2, y + size // 2)
+        cv2.ellipse(frame, center, (size * 2 // 5, size // 2), 0, 0, 360, (140, 170, 215), -1)
+        for side in (-1, 1):
+            cv2.circle(frame, (center[0] + side * size // 6, center[1] - size // 10), size // 20, (40, 40, 40), -1)
+        cv2.ellipse(frame, (center[0], center[1] + size // 5), (size // 8, size // 20), 0, 0, 180, (60, 60, 150), -1)
+    candidate = FaceCandidate(
+        box=np.array([x, y, size, size], dtype=np.float32),
+        right_eye=np.array([x + size / 3, y + size * 0.4], dtype=np.float32),
+        left_eye=np.array([x + size * 2 / 3, y + size * 0.4], dtype=np.float32),
+        nose=np.array([x + size / 2, y + size * 0.55], dtype=np.float32),
+        score=1.0,
+    )
+    return cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes(), candidate
+
+def synthetic_landmarks(count: int, rng: np.random.Generator, size: float = 300.0, modes: int = 20) -> np.ndarray:
+    """(count, 478, 2) landmark sets that vary along a few shape modes around one base face, like real meshes."""
+    base = rng.uniform(0, size, 478 * 2)
+    directions = rng.normal(0, 1, (modes, 478 * 2))
+    weights = rng.normal(0, 1, (count, modes)) * np.linspace(size / 100, size / 1000, modes)
+    offsets = rng.uniform(0, size, (count, 1, 2))
+    return ((base + weights @ directions).reshape(count, 478, 2) + offsets).astype(np.float32)
+
+def image_payload(width: int, height: int, rng: np.random.Generator) -> str:
+    """Base64 JPEG of a synthetic face frame, as the analyze-face endpoints expect."""
+    data, _ = synthetic_frame(width, height, rng)
+    return base64.b64encode(data).decode()
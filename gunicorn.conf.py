@@ -0,0 +1,44 @@
+"""Gunicorn settings; `gunicorn main:app` reads this file from the working directory.
+
+The master imports the app once (preload_app), builds the heavy modules and
+read-only tables, and freezes its heap before forking, so workers share
+those pages copy-on-write. Workers are recycled after SERVER_MAX_REQUESTS
+requests (plus jitter) to bound slow leaks, and log their memory on exit.
+"""
+import gc
+import os
+from src import server
+from src.config.settings import get_settings
+
+settings = get_settings()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# WEB_CONCURRENCY is how hosting platforms size the pool; otherwise follow the cores
+workers = int(os.getenv("WEB_CONCURRENCY") or server.worker_count(settings))
+preload_app = True
+max_requests = settings.SERVER_MAX_REQUESTS
+max_requests_jitter = settings.SERVER_MAX_REQUESTS_JITTER
+timeout = settings.SERVER_TIMEOUT
+graceful_timeout = settings.SERVER_GRACEFUL_TIMEOUT
+
+def when_ready(arbiter):
+    # The preloaded app decides the mode, e.g. main_original forces full
+    server.preload(arbiter.app.wsgi().state.settings)
+    server.freeze_heap()
+    memory = server.process_memory(os.getpid()) or {}
+    arbiter.log.info(f"Preloaded master, rss {memory.get('rss_kb', 0) // 1024} MB; starting {workers} workers")
+
+def pre_fork(arbiter, worker):
+    # Anything the master allocated since the last fork is frozen too
+    gc.freeze()
+
+def post_fork(arbiter, worker):
+    server.master_pid = arbiter.pid
+
+def worker_exit(arbiter, worker):
+    memory = server.process_memory(worker.pid) or {}
+    arbiter.log.info(
+        f"Worker {worker.pid} exiting: rss {memory.get('rss_kb', 0) // 1024} MB, "
+        f"private {memory.get('private_kb', 0) // 1024} MB"
+    )
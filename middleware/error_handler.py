@@ -51,5 +51,7 @@ def setup_error_handling(app):
         logger.error(f"HTTP Exception in {request.url.path}: {str(exc)}")
         return JSONResponse(
             status_code=exc.status_code,
-            content={"detail": str(exc.detail)}
+            # Structured details (e.g. quality gate reasons) are passed through as JSON
+            content={"detail": exc.detail if isinstance(exc.detail, (dict, list)) else str(exc.detail)},
+            headers=getattr(exc, "headers", None)
         )
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from datetime import datetime
@@ -36,6 +36,7 @@ class Analysis(Base):
     
     # Metadata
     landmarks_detected = Column(Boolean, nullable=False)
+    scorer_version = Column(String)
     analysis_timestamp = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="analyses")
@@ -0,0 +1,359 @@
+import asyncio
+import base64
+import binascii
+import os
+import zipfile
+from typing import AsyncIterator, List, Optional, Tuple
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from .compression import etag_matches
+from .serialization import dumps, json_response
+from ..config.settings import get_settings
+from ..models.analysis import Analysis
+from ..models.base import get_db
+from ..models.job import AnalysisJob
+from ..models.user import User
+from ..services.analysis_history import history_versions
+from ..services.auth import get_current_user
+from ..services.engines import get_engine
+from ..services.face_analysis import face_analysis_service, save_analyses
+from ..services.idempotency import idempotency_store, idempotent
+from ..services.jobs import job_queue, job_worker_pool
+from ..services.landmark_store import load_landmarks
+from ..services.quality import QualityError, issue_dicts
+from ..services.scheduler import deadline_from_timeout, inference_scheduler, tier_for
+from ..services.similarity import similarity_index
+from ..services.storage import IMAGE_EXTENSIONS, storage_service
+
+settings = get_settings()
+
+router = APIRouter(prefix="/api", tags=["analysis"])
+
+ARCHIVE_TYPES = {"application/zip", "application/x-zip-compressed"}
+
+class AnalysisRequest(BaseModel):
+    image: str  # Base64 encoded image
+    max_faces: int = 1  # > 1 scores every detected face, largest first
+
+def _read_images(files: List[UploadFile]) -> List[Tuple[str, bytes]]:
+    """Collect (filename, bytes) from uploaded images and zip archives, enforcing batch caps."""
+    images: List[Tuple[str, bytes]] = []
+    total = 0
+
+    def add(name: str, data: bytes) -> None:
+        nonlocal total
+        if len(images) >= settings.ANALYSIS_BATCH_MAX_IMAGES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch exceeds {settings.ANALYSIS_BATCH_MAX_IMAGES} images"
+            )
+        total += len(data)
+        if total > settings.ANALYSIS_BATCH_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Batch exceeds size limit")
+        images.append((name, data))
+
+    for upload in files:
+        if upload.content_type in ARCHIVE_TYPES or (upload.filename or "").lower().endswith(".zip"):
+            try:
+                archive = zipfile.ZipFile(upload.file)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"Invalid archive: {upload.filename}")
+            with archive:
+                for info in archive.infolist():
+                    extension = os.path.splitext(info.filename)[1].lower()
+                    if info.is_dir() or extension not in {".jpg", ".jpeg", *IMAGE_EXTENSIONS.values()}:
+                        continue
+                    # Check the declared size before inflating anything
+                    if info.file_size > settings.MAX_UPLOAD_SIZE:
+                        raise HTTPException(status_code=413, detail=f"{info.filename} exceeds size limit")
+                    with archive.open(info) as member:
+                        add(info.filename, member.read(settings.MAX_UPLOAD_SIZE + 1))
+        else:
+            data = upload.file.read(settings.MAX_UPLOAD_SIZE + 1)
+            if len(data) > settings.MAX_UPLOAD_SIZE:
+                raise HTTPException(status_code=413, detail=f"{upload.filename} exceeds size limit")
+            add(upload.filename or f"image-{len(images)}", data)
+
+    if not images:
+        raise HTTPException(status_code=400, detail="No images in batch")
+    return images
+
+async def _analyze_batch(
+    images: List[Tuple[str, bytes]],
+    user_id: int,
+    db: Session,
+    tier: str,
+    deadline: Optional[float] = None,
+) -> AsyncIterator[bytes]:
+    """Run decode, landmarks and skin measurement through the scheduler and stream NDJSON results.
+
+    Whatever has finished when the loop wakes up is scored together in one
+    vectorized pass and written with one insert, then streamed immediately.
+    """
+    pending = {
+        asyncio.ensure_future(inference_scheduler.run(
+            tier, face_analysis_service.landmarks_from_bytes, data, deadline=deadline, shed=False
+        )): index
+        for index, (_, data) in enumerate(images)
+    }
+    failed = []
+    succeeded = 0
+
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            ready = []
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    ready.append((index, future.result()))
+                except HTTPException as e:
+                    failed.append({"index": index, "filename": images[index][0], "error": e.detail})
+                    yield dumps({"type": "error", **failed[-1]}) + b"\n"
+                except QualityError as e:
+                    failed.append({
+                        "index": index,
+                        "filename": images[index][0],
+                        "error": str(e),
+                        "issues": issue_dicts(e.issues),
+                    })
+                    yield dumps({"type": "error", **failed[-1]}) + b"\n"
+                except Exception as e:
+                    failed.append({"index": index, "filename": images[index][0], "error": str(e)})
+                    yield dumps({"type": "error", **failed[-1]}) + b"\n"
+
+            if not ready:
+                continue
+            results = face_analysis_service.score([detection for _, detection in ready])
+            ids = await run_in_threadpool(
+                save_analyses, db, user_id, results, None,
+                [detection.landmarks for _, detection in ready],
+                [detection.skin_clarity for _, detection in ready],
+            )
+            for (index, _), result, id in zip(ready, results, ids):
+                succeeded += 1
+                yield dumps({
+                    "type": "result",
+                    "index": index,
+                    "filename": images[index][0],
+                    "id": id,
+                    **result,
+                }) + b"\n"
+    finally:
+        # Client went away: don't keep workers busy on images nobody will read
+        for future in pending:
+            future.cancel()
+
+    yield dumps({
+        "type": "summary",
+        "total": len(images),
+        "succeeded": succeeded,
+        "failed": failed,
+    }) + b"\n"
+
+@router.post("/analyze-face")
+async def analyze_face(
+    request: AnalysisRequest,
+    http_request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    engine=Depends(get_engine),
+    x_request_timeout: Optional[float] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """Analyze one image; every face is scored and the largest is saved as the user's analysis.
+
+    With an Idempotency-Key, retries get the first attempt's response instead
+    of a second analysis.
+    """
+    deadline = deadline_from_timeout(x_request_timeout)
+
+    async def analyze():
+        if not 1 <= request.max_faces <= settings.ANALYSIS_MAX_FACES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"max_faces must be between 1 and {settings.ANALYSIS_MAX_FACES}"
+            )
+        try:
+            image_bytes = base64.b64decode(request.image)
+        except (binascii.Error, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid image data")
+
+        try:
+            result = await engine.analyze(
+                image_bytes,
+                request.max_faces,
+                tier=tier_for(current_user),
+                deadline=deadline,
+            )
+        except QualityError as e:
+            raise HTTPException(status_code=422, detail={"message": str(e), "issues": issue_dicts(e.issues)})
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        face = result.faces[0]
+        landmarks = skin = None
+        if result.detection is not None:
+            landmarks, skin = [result.detection.landmarks[0]], [result.detection.skin_clarity[0]]
+        (analysis_id,) = await run_in_threadpool(save_analyses, db, current_user.id, [face], None, landmarks, skin)
+        analysis = await run_in_threadpool(db.get, Analysis, analysis_id)
+        return 200, {
+            "id": analysis_id,
+            "scores": face["scores"],
+            "improvement_tips": face["improvement_tips"],
+            "exercise_recommendations": face["exercise_recommendations"],
+            "landmarks_detected": True,
+            "scorer_version": face["scorer_version"],
+            "box": face.get("box"),
+            "faces": result.faces,
+            "analysis_timestamp": analysis.analysis_timestamp.isoformat(),
+        }
+
+    return await idempotent(http_request, idempotency_key, f"analyze-face:{current_user.id}", analyze, db, deadline)
+
+@router.get("/analysis-history/{user_id}")
+def get_analysis_history(
+    user_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+):
+    """The current user's analyses, oldest first; user_id is kept for older clients and ignored.
+
+    Responses carry an ETag; a request whose If-None-Match still matches gets
+    a 304 without the history being loaded.
+    """
+    headers = {
+        "ETag": history_versions.get(db, current_user.id),
+        "Cache-Control": "private, no-cache",
+    }
+    if if_none_match and etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    analyses = db.query(Analysis).filter(Analysis.user_id == current_user.id).order_by(Analysis.id).all()
+    return json_response([{
+        "id": analysis.id,
+        "scores": {
+            "symmetry": analysis.symmetry_score,
+            "jawline": analysis.jawline_score,
+            "facial_ratio": analysis.facial_ratio_score,
+            "skin_clarity": analysis.skin_clarity_score,
+            "overall": analysis.overall_score,
+        },
+        "improvement_tips": analysis.improvement_tips,
+        "scorer_version": analysis.scorer_version,
+        "image_url": analysis.image_url,
+        "thumbnail_url": storage_service.thumbnail_url(analysis.image_url),
+        "analysis_timestamp": analysis.analysis_timestamp.isoformat(),
+    } for analysis in analyses], headers=headers)
+
+@router.post("/analyze-face/batch")
+async def analyze_face_batch(
+    files: List[UploadFile] = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    x_request_timeout: Optional[float] = Header(None),
+):
+    """Analyze many images (files or zip archives) and stream one NDJSON line per result."""
+    tier = tier_for(current_user)
+    # Shed the whole batch up front rather than half-way through the stream
+    inference_scheduler.check_admission(tier)
+    images = await run_in_threadpool(_read_images, files)
+    return StreamingResponse(
+        _analyze_batch(images, current_user.id, db, tier, deadline_from_timeout(x_request_timeout)),
+        media_type="application/x-ndjson",
+    )
+
+@router.post("/jobs/analyze", status_code=202)
+async def submit_analysis_job(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Queue an analysis and return immediately; poll the job or listen on the WebSocket."""
+    image_url = await storage_service.save_image(file, db)
+    job = await run_in_threadpool(job_queue.enqueue, db, current_user, image_url)
+    job_worker_pool.notify()
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "image_url": image_url,
+        "thumbnail_url": storage_service.thumbnail_url(image_url),
+        "poll_url": f"/api/jobs/{job.id}",
+    }
+
+@router.get("/jobs/{job_id}")
+def get_analysis_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Current state of a job, including the analysis once it has succeeded."""
+    job = db.query(AnalysisJob).filter(
+        AnalysisJob.id == job_id,
+        AnalysisJob.user_id == current_user.id,
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_queue.to_dict(job)
+
+@router.get("/analyses/{analysis_id}/similar")
+def get_similar_analyses(
+    analysis_id: int,
+    k: int = Query(10, ge=1, le=settings.SIMILARITY_MAX_K),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Analyses whose face shape is closest to this one, most similar first."""
+    analysis = db.query(Analysis).filter(
+        Analysis.id == analysis_id,
+        Analysis.user_id == current_user.id,
+    ).first()
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    landmarks = load_landmarks(db, analysis_id)
+    if landmarks is None:
+        raise HTTPException(status_code=404, detail="No landmarks stored for this analysis")
+
+    neighbours = similarity_index.similar(db, landmarks, k, exclude=analysis_id)
+    analyses = {
+        a.id: a for a in db.query(Analysis).filter(Analysis.id.in_([n.analysis_id for n in neighbours]))
+    }
+    results = []
+    for neighbour in neighbours:
+        match = analyses.get(neighbour.analysis_id)
+        if match is None:
+            continue
+        own = match.user_id == current_user.id
+        results.append({
+            # Other users' analyses are described by their scores only
+            "analysis_id": match.id if own else None,
+            "own": own,
+            "similarity": neighbour.similarity,
+            "scores": {
+                "symmetry": match.symmetry_score,
+                "jawline": match.jawline_score,
+                "facial_ratio": match.facial_ratio_score,
+                "skin_clarity": match.skin_clarity_score,
+                "overall": match.overall_score,
+            },
+        })
+    return results
+
+@router.get("/metrics/similarity")
+def get_similarity_metrics():
+    """Size and kind of the similarity index and how many cross-account duplicates it has flagged."""
+    return similarity_index.snapshot()
+
+@router.get("/metrics/idempotency")
+def get_idempotency_metrics():
+    """Responses computed, replayed to retries, and duplicates that waited on an in-flight request."""
+    return idempotency_store.snapshot()
+
+@router.get("/metrics/scheduler")
+def get_scheduler_metrics():
+    """Per-tier queue depth, wait percentiles and shed/expired counts for the inference scheduler."""
+    return inference_scheduler.snapshot()
@@ -0,0 +1,74 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from ..models.base import get_db
+from ..models.user import User
+from ..services.auth import authenticate_user, create_access_token, get_current_user, get_password_hash
+from ..services.idempotency import idempotent
+
+router = APIRouter(prefix="/api", tags=["auth"])
+
+class UserCreate(BaseModel):
+    email: str
+    password: str
+    full_name: Optional[str] = None
+
+class UserLogin(BaseModel):
+    email: str
+    password: str
+
+def _user_dict(user: User) -> dict:
+    return {
+        "id": user.id,
+        "email": user.email,
+        "full_name": user.full_name
+    }
+
+@router.post("/auth/register")
+async def register(
+    user: UserCreate,
+    request: Request,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """Create an account; 400 if the email is already registered.
+
+    With an Idempotency-Key, a retry whose first attempt succeeded gets the
+    same 200 rather than "already registered".
+    """
+    async def create():
+        if db.query(User).filter(User.email == user.email).first():
+            raise HTTPException(status_code=400, detail="Email already registered")
+        new_user = User(
+            email=user.email,
+            password_hash=await run_in_threadpool(get_password_hash, user.password),
+            full_name=user.full_name
+        )
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+        return 200, _user_dict(new_user)
+
+    return await idempotent(request, idempotency_key, "register", create, db)
+
+@router.post("/auth/login")
+async def login(user: UserLogin, db: Session = Depends(get_db)):
+    """Exchange email and password for a bearer token."""
+    # Password hashing is deliberately slow: keep it off the event loop
+    authenticated = await run_in_threadpool(authenticate_user, db, user.email, user.password)
+    if not authenticated:
+        raise HTTPException(
+            status_code=401,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return {
+        "access_token": create_access_token(data={"sub": authenticated.email}),
+        "token_type": "bearer"
+    }
+
+@router.get("/user")
+def get_user(current_user: User = Depends(get_current_user)):
+    return _user_dict(current_user)
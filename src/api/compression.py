@@ -0,0 +1,185 @@
+"""Response compression: gzip, or brotli when the brotli package is installed.
+
+CompressionMiddleware negotiates the coding from Accept-Encoding and
+compresses JSON and text responses. A complete body under the size
+threshold goes out as is. A streamed body (NDJSON batch results) goes
+through one compressor that is flushed after every chunk, so each line
+still reaches the client when it is produced while later lines reuse the
+keys already seen. Responses that already carry a Content-Encoding, like
+the pre-compressed exercise catalog, are left alone.
+"""
+import zlib
+from typing import Dict, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ..config.settings import get_settings
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+settings = get_settings()
+
+# Codings in order of preference when a client accepts several equally
+CODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Appended inside a strong ETag's quotes for the compressed variant
+ENCODING_SUFFIXES = {"br": "-br", "gzip": "-gzip"}
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml")
+
+def _weights(accept_encoding: str) -> Dict[str, float]:
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            weights[coding.lower()] = q
+    return weights
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """The preferred coding the client accepts, by q-value; None if it accepts none of ours."""
+    weights = _weights(accept_encoding)
+    best, best_q = None, 0.0
+    for coding in CODINGS:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+def accepts_encoding(accept_encoding: str, coding: str) -> bool:
+    """Whether the client accepts coding at all (a q-value above zero)."""
+    weights = _weights(accept_encoding)
+    return weights.get(coding, weights.get("*", 0.0)) > 0
+
+def _opaque_tag(etag: str) -> str:
+    tag = etag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    for suffix in ENCODING_SUFFIXES.values():
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)]
+    return tag
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires; a compressed variant's tag matches its source's."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = _opaque_tag(etag)
+    return any(_opaque_tag(candidate) == opaque for candidate in if_none_match.split(","))
+
+def _compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "")
+    return "content-encoding" not in headers and (
+        content_type.startswith(COMPRESSIBLE_TYPES) or "+json" in content_type
+    )
+
+def _tag_variant(headers: MutableHeaders, coding: str) -> None:
+    # A weak tag already allows other encodings of the same content
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        tag = etag.strip('"')
+        if _opaque_tag(etag) == tag:
+            headers["etag"] = f'"{tag}{ENCODING_SUFFIXES[coding]}"'
+
+def _vary_on_encoding(headers: MutableHeaders) -> None:
+    vary = headers.get("vary")
+    if vary is None or "accept-encoding" not in vary.lower():
+        headers.add_vary_header("Accept-Encoding")
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class _Brotli:
+    def __init__(self, quality: int):
+        self._c = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._c.process(data) + (self._c.finish() if final else self._c.flush())
+
+class CompressionMiddleware:
+    """Compress HTTP responses with the coding the client prefers."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: Optional[int] = None,
+        gzip_level: Optional[int] = None,
+        brotli_quality: Optional[int] = None,
+    ):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MINIMUM_SIZE if minimum_size is None else minimum_size
+        self.gzip_level = settings.COMPRESSION_GZIP_LEVEL if gzip_level is None else gzip_level
+        self.brotli_quality = settings.COMPRESSION_BROTLI_QUALITY if brotli_quality is None else brotli_quality
+
+    def _compressor(self, coding: str):
+        return _Brotli(self.brotli_quality) if coding == "br" else _Gzip(self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        coding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start: Optional[Message] = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                if start is not None:
+                    await send(start)
+                    start = None
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is not None:
+                if body or not more_body:
+                    await send({
+                        "type": "http.response.body",
+                        "body": compressor.compress(body, not more_body),
+                        "more_body": more_body,
+                    })
+                return
+
+            # First body message: decide for the whole response
+            headers = MutableHeaders(scope=start)
+            passthrough = True
+            if start["status"] == 304 and coding is not None:
+                _tag_variant(headers, coding)
+            elif start["status"] >= 200 and start["status"] != 204 and _compressible(headers):
+                _vary_on_encoding(headers)
+                if coding is not None and (more_body or len(body) >= self.minimum_size):
+                    passthrough = False
+                    compressor = self._compressor(coding)
+                    body = compressor.compress(body, not more_body)
+                    headers["Content-Encoding"] = coding
+                    _tag_variant(headers, coding)
+                    if more_body:
+                        del headers["Content-Length"]
+                    else:
+                        headers["Content-Length"] = str(len(body))
+            await send(start)
+            start = None
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
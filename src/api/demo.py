@@ -0,0 +1,129 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime
+from typing import Dict, List
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from .serialization import json_response
+from ..config.settings import get_settings
+from ..services.engines import get_engine
+
+settings = get_settings()
+
+# Endpoints of the mock and simple modes: no database, so accounts and
+# history are stubs and only analysis does real work
+router = APIRouter(prefix="/api", tags=["demo"])
+
+class UserCreate(BaseModel):
+    email: str
+    username: str
+    password: str
+
+class UserLogin(BaseModel):
+    email: str
+    password: str
+
+class AnalysisRequest(BaseModel):
+    image: str
+    user_id: str = "user_123"
+    max_faces: int = 1
+
+class AnalysisResponse(BaseModel):
+    id: str
+    user_id: str
+    scores: Dict[str, float]
+    improvement_tips: List[str]
+    landmarks_detected: bool
+    analysis_timestamp: str
+    faces: List[Dict] = []
+
+class AnalysisEnvelope(BaseModel):
+    message: str
+    data: AnalysisResponse
+
+@router.post("/auth/register")
+async def register(user: UserCreate):
+    """Simple registration endpoint"""
+    return {
+        "message": "User registered successfully",
+        "data": {
+            "user": {
+                "id": str(uuid.uuid4()),
+                "email": user.email,
+                "username": user.username
+            },
+            "token": "sample-jwt-token"
+        }
+    }
+
+@router.post("/auth/login")
+async def login(user: UserLogin):
+    """Simple login endpoint"""
+    return {
+        "message": "Login successful",
+        "data": {
+            "user": {
+                "id": str(uuid.uuid4()),
+                "email": user.email
+            },
+            "token": "sample-jwt-token"
+        }
+    }
+
+@router.post("/analyze-face", response_model=AnalysisEnvelope)
+async def analyze_face(request: AnalysisRequest, engine=Depends(get_engine)):
+    """Facial analysis endpoint"""
+    if not 1 <= request.max_faces <= settings.ANALYSIS_MAX_FACES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"max_faces must be between 1 and {settings.ANALYSIS_MAX_FACES}"
+        )
+    try:
+        image_bytes = base64.b64decode(request.image)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid image data")
+
+    try:
+        result = await engine.analyze(image_bytes, request.max_faces)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    face = result.faces[0]
+
+    # Values are already the right types: build the model without validating it again
+    response = AnalysisResponse.model_construct(
+        id=str(uuid.uuid4()),
+        user_id=request.user_id,
+        scores=face["scores"],
+        improvement_tips=face["improvement_tips"],
+        landmarks_detected=face["landmarks_detected"],
+        analysis_timestamp=datetime.now().isoformat(),
+        faces=result.faces
+    )
+    return json_response({
+        "message": "Analysis completed successfully",
+        "data": response
+    })
+
+@router.get("/analysis-history/{user_id}")
+async def get_analysis_history(user_id: str):
+    """Get analysis history for a user"""
+    return {
+        "message": "Analysis history retrieved",
+        "data": [
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "scores": {"overall": 0.85, "symmetry": 0.80},
+                "timestamp": datetime.now().isoformat()
+            }
+        ]
+    }
+
+@router.post("/analysis-history")
+async def save_analysis(analysis_data: dict):
+    """Save analysis result"""
+    return {
+        "message": "Analysis saved successfully",
+        "data": {"id": str(uuid.uuid4())}
+    }
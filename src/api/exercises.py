@@ -0,0 +1,168 @@
+import json
+from datetime import datetime
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from .compression import accepts_encoding
+from ..config.settings import get_settings
+from ..models.base import get_db
+from ..models.exercise import Exercise, ExerciseHistory
+from ..models.user import User
+from ..services.achievements import achievement_service
+from ..services.auth import get_current_user
+from ..services.catalog import catalog_service
+from ..services.exercise_history import ExerciseHistoryCreate, ingest_batch
+
+settings = get_settings()
+
+router = APIRouter(prefix="/api/exercises", tags=["exercises"])
+
+@router.get("")
+def list_exercises(
+    db: Session = Depends(get_db),
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+):
+    """Get the exercise catalog, served from a cached pre-encoded snapshot."""
+    snapshot = catalog_service.get(db)
+    gzip_ok = accepts_encoding(accept_encoding or "", "gzip")
+    headers = {
+        "ETag": snapshot.gzip_etag if gzip_ok else snapshot.etag,
+        "Last-Modified": snapshot.last_modified,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+
+    if catalog_service.is_not_modified(snapshot, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+
+    if gzip_ok:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=snapshot.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+def _record_completion(db: Session, user_id: int, payload: ExerciseHistoryCreate):
+    if db.query(Exercise.id).filter(Exercise.id == payload.exercise_id).first() is None:
+        raise HTTPException(status_code=404, detail="Exercise not found")
+
+    history = ExerciseHistory(
+        user_id=user_id,
+        exercise_id=payload.exercise_id,
+        completed_at=payload.completed_at or datetime.utcnow(),
+        duration_seconds=payload.duration_seconds,
+        success_rate=payload.success_rate,
+        notes=payload.notes,
+    )
+    db.add(history)
+    unlocked = achievement_service.record_completions(db, user_id, [history])
+    db.commit()
+    return history, unlocked
+
+@router.post("/history")
+async def record_exercise(
+    payload: ExerciseHistoryCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Record an exercise completion and update streaks and achievements."""
+    history, unlocked = await run_in_threadpool(_record_completion, db, current_user.id, payload)
+    await achievement_service.notify(current_user.id, unlocked)
+
+    return {
+        "id": history.id,
+        "exercise_id": history.exercise_id,
+        "completed_at": history.completed_at.isoformat(),
+        "achievements_unlocked": [achievement.name for achievement in unlocked],
+    }
+
+async def _read_batch(request: Request) -> List[Any]:
+    """Parse a JSON array, or an NDJSON stream line by line, enforcing the batch caps.
+
+    The body is read in chunks and given up on (413) as soon as it passes
+    EXERCISE_HISTORY_BATCH_MAX_BYTES, or an NDJSON line passes
+    EXERCISE_HISTORY_LINE_MAX_BYTES; each line is joined from its chunks once.
+    """
+    limit = settings.EXERCISE_HISTORY_BATCH_MAX
+    max_bytes = settings.EXERCISE_HISTORY_BATCH_MAX_BYTES
+    max_line = settings.EXERCISE_HISTORY_LINE_MAX_BYTES
+    too_many = HTTPException(status_code=413, detail=f"Batch exceeds {limit} items")
+    too_large = HTTPException(status_code=413, detail=f"Batch exceeds {max_bytes} bytes")
+    line_too_long = HTTPException(status_code=413, detail=f"Batch line exceeds {max_line} bytes")
+    invalid = HTTPException(status_code=400, detail="Invalid batch body")
+
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes:
+        raise too_large
+
+    ndjson = request.headers.get("content-type", "").startswith("application/x-ndjson")
+    items: List[Any] = []
+    # Pieces of the current NDJSON line, or of the whole JSON body
+    pieces: List[bytes] = []
+    pending = 0
+    total = 0
+
+    def add_line(line: bytes) -> None:
+        if len(line) > max_line:
+            raise line_too_long
+        if not line.strip():
+            return
+        if len(items) >= limit:
+            raise too_many
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            raise invalid
+
+    async for chunk in request.stream():
+        total += len(chunk)
+        if total > max_bytes:
+            raise too_large
+        if not ndjson:
+            pieces.append(chunk)
+            continue
+        start = 0
+        while (end := chunk.find(b"\n", start)) >= 0:
+            pieces.append(chunk[start:end])
+            add_line(b"".join(pieces))
+            pieces, pending = [], 0
+            start = end + 1
+        if start < len(chunk):
+            pieces.append(chunk[start:])
+            pending += len(chunk) - start
+            if pending > max_line:
+                raise line_too_long
+
+    if ndjson:
+        add_line(b"".join(pieces))
+        return items
+
+    try:
+        items = json.loads(b"".join(pieces))
+    except ValueError:
+        raise invalid
+    if not isinstance(items, list):
+        raise invalid
+    if len(items) > limit:
+        raise too_many
+    return items
+
+@router.post("/history/batch")
+async def record_exercise_batch(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Record many completions at once (JSON array or NDJSON), deduplicated by client_key."""
+    items = await _read_batch(request)
+    results, unlocked = await run_in_threadpool(ingest_batch, db, current_user.id, items)
+    await achievement_service.notify(current_user.id, unlocked)
+
+    return {
+        "created": sum(1 for r in results if r["status"] == "created"),
+        "duplicates": sum(1 for r in results if r["status"] == "duplicate"),
+        "invalid": sum(1 for r in results if r["status"] == "invalid"),
+        "results": results,
+        "achievements_unlocked": [achievement.name for achievement in unlocked],
+    }
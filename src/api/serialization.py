@@ -0,0 +1,43 @@
+from typing import Any, Dict, Mapping, Optional
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.responses import Response
+
+# NumPy scalars and arrays come straight out of the scoring code
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content: Any) -> bytes:
+    """Encode content to JSON bytes with orjson; pydantic models are dumped without re-validation."""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson.
+
+    As an app's default_response_class it replaces the json module for every
+    route. Returned directly from an endpoint it also skips jsonable_encoder
+    and response_model validation, which cost more than the encoding itself.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None) -> FastJSONResponse:
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
+
+def encoded_response(body: bytes, status_code: int = 200, headers: Optional[Mapping[str, str]] = None) -> Response:
+    """Wrap JSON that is already encoded, e.g. a payload built once at import."""
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+def open_string_field(content: Dict, key: str) -> bytes:
+    """Encode content with a trailing string field left open.
+
+    For payloads that are static except for one last value: append the value
+    (which must not need escaping, like an ISO timestamp) and b'"}'.
+    """
+    return dumps(content)[:-1] + (b"," if content else b"") + dumps(key) + b':"'
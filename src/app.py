@@ -0,0 +1,247 @@
+"""Application factory shared by every entry point.
+
+create_app(settings) composes the app for settings.APP_MODE:
+
+- mock: placeholder scores, no models or database; for demos and API load tests
+- simple: real face analysis, stub accounts and history, no database
+- full: database, authentication, storage, background jobs and similarity search
+
+Each mode is a list of components with async start() and stop(timeout),
+started in order when the app starts serving and stopped in reverse order
+at shutdown. The first component with an analyze() method is the inference
+engine and is exposed as app.state.engine; tests and benchmarks can pass
+their own components to swap any of them out.
+"""
+import hmac
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Optional
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from .api.compression import CompressionMiddleware
+from .api.serialization import FastJSONResponse, dumps, encoded_response, open_string_field
+from .config.settings import Settings, get_settings
+from .server import worker_memory
+
+logger = logging.getLogger(__name__)
+
+MODES = ("mock", "simple", "full")
+
+class DatabaseComponent:
+    """Creates missing tables and upgrades existing ones at startup, and closes pooled connections at shutdown."""
+
+    def __init__(self, engine=None):
+        from .models import analysis, exercise, idempotency, job, media, user  # noqa: F401 - register tables for create_all
+        from .models.base import Base, engine as default_engine
+        self.metadata = Base.metadata
+        self.engine = engine or default_engine
+
+    async def start(self) -> None:
+        from .models.upgrade import upgrade
+        self.metadata.create_all(bind=self.engine)
+        # create_all leaves tables that already existed as they were
+        upgrade(self.engine)
+
+    async def stop(self, timeout: float) -> None:
+        self.engine.dispose()
+
+class StorageComponent:
+    """Lets queued thumbnail generation finish before shutdown."""
+
+    def __init__(self):
+        from .services.storage import storage_service
+        self.storage = storage_service
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self, timeout: float) -> None:
+        await self.storage.thumbnails.drain(timeout)
+
+class JobWorkersComponent:
+    """The in-process workers draining the analysis job queue."""
+
+    def __init__(self):
+        from .services.jobs import job_worker_pool
+        self.pool = job_worker_pool
+
+    async def start(self) -> None:
+        self.pool.start()
+
+    async def stop(self, timeout: float) -> None:
+        await self.pool.stop(timeout)
+
+class RecommendationsComponent:
+    """Builds the exercise recommendation index at startup instead of on the first analysis."""
+
+    def __init__(self, session_factory=None):
+        from .models.base import SessionLocal
+        from .services.recommendations import recommendation_service
+        self.session_factory = session_factory or SessionLocal
+        self.service = recommendation_service
+
+    async def start(self) -> None:
+        def load():
+            with self.session_factory() as db:
+                # A no-op when preload already built it before the fork
+                self.service.refresh_if_changed(db)
+        try:
+            await run_in_threadpool(load)
+        except Exception as e:
+            # The first analysis loads it instead
+            logger.error(f"Recommendation index load failed: {str(e)}")
+
+    async def stop(self, timeout: float) -> None:
+        pass
+
+class SimilarityComponent:
+    """Loads the similarity index in the background; searches fall back to loading it on demand."""
+
+    def __init__(self):
+        from .services.similarity import similarity_index
+        self.index = similarity_index
+
+    async def start(self) -> None:
+        self.index.start_loading()
+
+    async def stop(self, timeout: float) -> None:
+        pass
+
+def default_components(settings: Settings) -> List:
+    """The components settings.APP_MODE runs with, in start order."""
+    if settings.APP_MODE == "mock":
+        from .services.engines import MockEngine
+        return [MockEngine()]
+
+    from .services.face_engine import FaceMeshEngine
+    if settings.APP_MODE == "simple":
+        return [FaceMeshEngine(warm_up=settings.ANALYSIS_WARM_UP)]
+    return [
+        DatabaseComponent(),
+        FaceMeshEngine(warm_up=settings.ANALYSIS_WARM_UP),
+        RecommendationsComponent(),
+        StorageComponent(),
+        JobWorkersComponent(),
+        SimilarityComponent(),
+    ]
+
+def _lifespan(components: List, settings: Settings):
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        started = []
+        try:
+            for component in components:
+                await component.start()
+                started.append(component)
+            yield
+        finally:
+            # Reverse order: nothing is stopped while something started after it still uses it
+            for component in reversed(started):
+                try:
+                    await component.stop(settings.SHUTDOWN_DRAIN_SECONDS)
+                except Exception as e:
+                    logger.error(f"Stopping {type(component).__name__} failed: {str(e)}")
+    return lifespan
+
+def _add_health_routes(app: FastAPI, settings: Settings) -> None:
+    # Health check payloads never change, so they are encoded once
+    root_body = dumps({
+        "message": "Mafixy API is running!",
+        "status": "healthy",
+        "version": "1.0.0",
+        "environment": settings.ENVIRONMENT
+    })
+    status = {"status": "healthy", "environment": settings.ENVIRONMENT}
+    if settings.APP_MODE == "full":
+        status["database"] = "connected"
+    health_prefix = open_string_field(status, "timestamp")
+    ping_body = dumps({"message": "pong"})
+
+    @app.get("/")
+    async def root():
+        return encoded_response(root_body)
+
+    @app.get("/health")
+    async def health_check():
+        return encoded_response(health_prefix + datetime.now().isoformat().encode() + b'"}')
+
+    @app.get("/ping")
+    async def ping():
+        return encoded_response(ping_body)
+
+    # Pids and memory are for operators: in production only with the metrics token
+    if settings.ENVIRONMENT != "production" or settings.METRICS_TOKEN:
+        @app.get("/api/metrics/workers")
+        def get_worker_metrics(x_metrics_token: Optional[str] = Header(None)):
+            """Resident, shared and private memory of the server master and each worker process."""
+            if settings.ENVIRONMENT == "production" and not hmac.compare_digest(
+                (x_metrics_token or "").encode(), settings.METRICS_TOKEN.encode()
+            ):
+                raise HTTPException(status_code=403, detail="Invalid metrics token")
+            return worker_memory()
+
+    @app.get("/api/metrics/engine")
+    def get_engine_metrics():
+        """Inference processes and frame ring usage, for engines that have them."""
+        snapshot = getattr(app.state.engine, "snapshot", None)
+        return snapshot() if snapshot else {}
+
+def create_app(settings: Optional[Settings] = None, components: Optional[List] = None) -> FastAPI:
+    """Build the API for settings.APP_MODE; components replaces the mode's defaults."""
+    settings = settings or get_settings()
+    if settings.APP_MODE not in MODES:
+        raise ValueError(f"APP_MODE must be one of {', '.join(MODES)}, not {settings.APP_MODE!r}")
+    components = default_components(settings) if components is None else components
+    engines = [component for component in components if hasattr(component, "analyze")]
+    production = settings.ENVIRONMENT == "production"
+
+    app = FastAPI(
+        title="Mafixy API",
+        description="AI-powered facial analysis platform",
+        version="1.0.0",
+        docs_url=None if production else "/docs",
+        redoc_url=None if production else "/redoc",
+        default_response_class=FastJSONResponse,
+        lifespan=_lifespan(components, settings),
+    )
+    app.state.settings = settings
+    app.state.components = components
+    app.state.engine = engines[0] if engines else None
+
+    # Innermost: compresses what the routes return, before CORS adds its headers
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+    full = settings.APP_MODE == "full"
+    if full and production:
+        app.add_middleware(
+            TrustedHostMiddleware,
+            allowed_hosts=["*.onrender.com", "localhost"]
+        )
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"] if not full or settings.ENVIRONMENT == "development" else settings.CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    if full:
+        from middleware.error_handler import setup_error_handling
+        from .api import analysis, auth, exercises
+        setup_error_handling(app)
+        app.include_router(auth.router)
+        app.include_router(analysis.router)
+        app.include_router(exercises.router)
+    else:
+        from .api import demo
+        app.include_router(demo.router)
+
+    _add_health_routes(app, settings)
+    return app
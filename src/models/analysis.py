@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, JSON, Boolean, LargeBinary
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
@@ -8,7 +8,7 @@ class Analysis(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    image_url = Column(String)  # Stored in S3 or similar
+    image_url = Column(String, index=True)  # Stored in S3 or similar, shared by identical uploads
     analysis_timestamp = Column(DateTime, default=datetime.utcnow)
     
     # Scores
@@ -22,10 +22,27 @@ class Analysis(Base):
     landmarks_detected = Column(Boolean, default=False)
     face_detected = Column(Boolean, default=False)
     improvement_tips = Column(JSON)  # JSON array of tips
+    scorer_version = Column(String, index=True)  # scoring rules that produced the scores
     
     # Relationships
     user = relationship("User", back_populates="analyses")
     exercise_recommendations = relationship("ExerciseRecommendation", back_populates="analysis")
+    landmarks = relationship("AnalysisLandmarks", uselist=False, back_populates="analysis")
+
+class AnalysisLandmarks(Base):
+    """Quantized landmarks of an analysis, kept so scores can be recomputed without the image."""
+    __tablename__ = "analysis_landmarks"
+
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), primary_key=True)
+    landmark_count = Column(Integer, nullable=False)
+    # Points are stored as int16 offsets within the square (origin, origin + scale)
+    origin_x = Column(Float, nullable=False)
+    origin_y = Column(Float, nullable=False)
+    scale = Column(Float, nullable=False)
+    points = Column(LargeBinary, nullable=False)  # landmark_count x 2 little-endian int16
+    skin_clarity = Column(Float)  # measured on the image, which rescoring doesn't have
+
+    analysis = relationship("Analysis", back_populates="landmarks")
 
 class ExerciseRecommendation(Base):
     __tablename__ = "exercise_recommendations"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, JSON, Boolean, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
@@ -31,6 +31,9 @@ class ExerciseHistory(Base):
     duration_seconds = Column(Float)
     success_rate = Column(Float)  # 0.0 to 1.0
     notes = Column(String)
+    client_key = Column(String)  # Client-generated idempotency key for offline sync
+    
+    __table_args__ = (UniqueConstraint("user_id", "client_key", name="uq_exercise_history_client_key"),)
     
     user = relationship("User", back_populates="exercise_history")
     exercise = relationship("Exercise", back_populates="history")
@@ -44,6 +47,19 @@ class Achievement(Base):
     description = Column(String)
     type = Column(String)  # streak, milestone, etc.
     unlocked_at = Column(DateTime, default=datetime.utcnow)
-    metadata = Column(JSON)  # JSON for achievement-specific data
+    # "metadata" is reserved on declarative models, so map the column under another name
+    achievement_metadata = Column("metadata", JSON)  # JSON for achievement-specific data
     
     user = relationship("User", back_populates="achievements")
+
+class ExerciseStats(Base):
+    """Running per-user counters, updated in O(1) per exercise completion."""
+    __tablename__ = "exercise_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    current_streak = Column(Integer, default=0, nullable=False)
+    longest_streak = Column(Integer, default=0, nullable=False)
+    last_completion_day = Column(Date)
+    total_completions = Column(Integer, default=0, nullable=False)
+    total_seconds = Column(Float, default=0.0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from .base import Base
+
+class IdempotencyRecord(Base):
+    """The response stored for an Idempotency-Key, or a claim on the key while its first request runs."""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(320), primary_key=True)  # scope (route and user) plus the client's key
+    fingerprint = Column(LargeBinary(16), nullable=False)  # digest of the request body the key was first used with
+    status_code = Column(Integer)  # None while the first request is still running
+    body = Column(LargeBinary)  # encoded JSON response
+    # A claim expires after the lock timeout, a stored response after the TTL
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Index
+from datetime import datetime
+import uuid
+from .base import Base
+
+# Jobs in these states may still read their image
+PENDING_STATUSES = ("queued", "running")
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    image_url = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed
+    priority = Column(Integer, nullable=False, default=1)  # 0 = premium lane, 1 = free lane
+
+    # Claimable once available_at has passed; a claim pushes it out by the
+    # visibility timeout, so a crashed worker's job becomes claimable again
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    worker_id = Column(String)
+
+    analysis_id = Column(Integer, ForeignKey("analyses.id"))
+    result = Column(JSON)
+    error = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_analysis_jobs_claim", "status", "priority", "available_at"),
+    )
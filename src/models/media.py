@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, DateTime
+from .base import Base
+
+class MediaObject(Base):
+    """When a stored media object was last saved, and whether a delete of it is under way.
+
+    Shared by every process, so garbage collection spares objects an upload
+    has just reused, and an upload waits out a delete instead of trusting an
+    object that is about to go.
+    """
+    __tablename__ = "media_objects"
+
+    key = Column(String, primary_key=True)
+    saved_at = Column(DateTime, nullable=False)
+    deleting_since = Column(DateTime)  # None unless a delete holds the key
@@ -0,0 +1,92 @@
+"""Bring an existing database up to the current models.
+
+create_all only creates missing tables; it never alters one that exists.
+The columns and indexes below were added to tables that predate them, so
+databases created before them need this upgrade:
+
+    python -m src.models.upgrade [--database-url URL]
+
+DatabaseComponent also runs it after create_all at startup. Every step
+checks the live schema first, so running it again, or from several
+workers at once, changes nothing. The legacy models/database.py schema
+shares the analyses table name, so the same script upgrades its database
+(sqlite:///./mafixy.db) too.
+"""
+import argparse
+import logging
+from collections import namedtuple
+from typing import List
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from ..config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# kind is "column" (ddl is the column definition) or "index" (ddl is the column list)
+Step = namedtuple("Step", ["table", "kind", "name", "ddl", "unique"])
+
+STEPS = (
+    Step("analyses", "column", "scorer_version", "VARCHAR", False),
+    Step("analyses", "index", "ix_analyses_scorer_version", "scorer_version", False),
+    Step("analyses", "index", "ix_analyses_image_url", "image_url", False),
+    Step("exercise_history", "column", "client_key", "VARCHAR", False),
+    # A unique index rather than a constraint: SQLite can't add constraints to a table
+    Step("exercise_history", "index", "uq_exercise_history_client_key", "user_id, client_key", True),
+)
+
+def _present(engine: Engine, step: Step) -> bool:
+    inspector = inspect(engine)
+    if not inspector.has_table(step.table):
+        # Not in this schema: the legacy one has no exercise_history
+        return True
+    columns = {column["name"] for column in inspector.get_columns(step.table)}
+    if step.kind == "column":
+        return step.name in columns
+    if not {column.strip() for column in step.ddl.split(",")} <= columns:
+        # The legacy analyses table has no image_url to index
+        return True
+    names = {index["name"] for index in inspector.get_indexes(step.table)}
+    names |= {constraint["name"] for constraint in inspector.get_unique_constraints(step.table)}
+    return step.name in names
+
+def upgrade(engine: Engine) -> List[str]:
+    """Apply the steps missing from engine's database; returns the names of those applied."""
+    applied = []
+    for step in STEPS:
+        if _present(engine, step):
+            continue
+        if step.kind == "column":
+            ddl = f"ALTER TABLE {step.table} ADD COLUMN {step.name} {step.ddl}"
+        else:
+            ddl = f"CREATE {'UNIQUE ' if step.unique else ''}INDEX {step.name} ON {step.table} ({step.ddl})"
+        try:
+            with engine.begin() as connection:
+                connection.execute(text(ddl))
+        except DBAPIError:
+            # Another process may have applied it first
+            if not _present(engine, step):
+                raise
+            continue
+        logger.info(f"Schema upgrade: {ddl}")
+        applied.append(step.name)
+    return applied
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Add the columns and indexes that create_all doesn't add to existing tables.")
+    parser.add_argument("--database-url", help="Database to upgrade (default: DATABASE_URL)")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url or get_settings().DATABASE_URL)
+    try:
+        applied = upgrade(engine)
+    finally:
+        engine.dispose()
+    logger.info(f"Applied {len(applied)} schema upgrade steps")
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
@@ -25,6 +25,7 @@ class User(Base):
     analyses = relationship("Analysis", back_populates="user")
     achievements = relationship("Achievement", back_populates="user")
     exercise_history = relationship("ExerciseHistory", back_populates="user")
+    profile_settings = relationship("ProfileSetting", back_populates="user", uselist=False)
 
 class ProfileSetting(Base):
     __tablename__ = "profile_settings"
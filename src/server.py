@@ -0,0 +1,138 @@
+"""Process-level serving: worker count, pre-fork preloading and per-worker memory.
+
+Under gunicorn (see gunicorn.conf.py) the master imports the app, then
+preload() builds the heavy modules and read-only tables, and freeze_heap()
+takes them out of the garbage collector's reach. Workers forked after that
+share those pages copy-on-write instead of each holding its own copy.
+"""
+import gc
+import logging
+import os
+from typing import Dict, List, Optional
+from .config.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# smaps_rollup fields reported per process, in kB
+MEMORY_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+# Pid of the gunicorn master, set in each worker after the fork
+master_pid: Optional[int] = None
+
+def available_cpus() -> int:
+    """CPU cores this process may run on, which can be fewer than the machine has."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def worker_count(settings: Settings, cpus: Optional[int] = None) -> int:
+    """Worker processes for settings.APP_MODE on this machine.
+
+    Mock workers only wait on I/O, so they follow the usual 2 * cores + 1.
+    Inference workers each run ANALYSIS_WORKERS threads of CPU-bound work,
+    so there is one worker per that many cores instead.
+    """
+    if settings.SERVER_WORKERS:
+        return settings.SERVER_WORKERS
+    cpus = cpus or available_cpus()
+    if settings.APP_MODE == "mock":
+        count = 2 * cpus + 1
+    else:
+        count = cpus // max(1, settings.ANALYSIS_WORKERS)
+    return max(1, min(count, settings.SERVER_MAX_WORKERS))
+
+def preload(settings: Settings) -> None:
+    """Import heavy modules and build read-only tables in the master, before workers fork.
+
+    MediaPipe graphs are not built here: they own native threads, which
+    don't survive a fork. Each worker builds its own at startup instead.
+    """
+    if settings.APP_MODE == "mock":
+        return
+
+    # cv2, mediapipe and the compiled scorer index tables come with these
+    from .services.face_analysis import face_analysis_service  # noqa: F401
+    from .services.scoring import scorer_registry
+    scorer_registry.refresh_if_changed()
+
+    if settings.APP_MODE == "full":
+        from .models import analysis, exercise, idempotency, job, user  # noqa: F401 - resolve relationships before querying
+        from .models.base import SessionLocal, engine
+        from .services.catalog import catalog_service
+        from .services.recommendations import recommendation_service
+        from .services.similarity import similarity_index
+        try:
+            with SessionLocal() as db:
+                catalog_service.get(db)
+                recommendation_service.load(db)
+                # Read-mostly: workers append their own analyses and sync others'
+                similarity_index.load(db)
+        except Exception as e:
+            # Workers build the snapshot on first request instead
+            logger.warning(f"Catalog preload failed: {str(e)}")
+        finally:
+            # Forked workers must not inherit the master's pooled connections
+            engine.dispose()
+
+def freeze_heap() -> None:
+    """Collect garbage once, then exempt every surviving object from later collections.
+
+    A collection in a worker writes to the header of every object it visits,
+    which would copy each shared page the object sits on into that worker.
+    """
+    gc.collect()
+    gc.freeze()
+
+def process_memory(pid: int) -> Optional[Dict[str, int]]:
+    """Resident memory of pid in kB, split into shared and private pages; None where /proc has no smaps_rollup."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in MEMORY_FIELDS:
+                    fields[name] = int(value.split()[0])
+    except (OSError, ValueError):
+        return None
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        # Proportional share: shared pages divided among the processes mapping them
+        "pss_kb": fields.get("Pss", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+def child_pids(parent: int) -> List[int]:
+    """Pids whose parent is parent, found by scanning /proc."""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces; fields after it are fixed
+        if int(stat.rsplit(")", 1)[1].split()[1]) == parent:
+            children.append(int(entry))
+    return sorted(children)
+
+def worker_memory() -> Dict:
+    """Memory of the master and each of its workers; just this process when not under gunicorn."""
+    pid = os.getpid()
+    if master_pid is None:
+        return {"master": None, "workers": [{"pid": pid, "current": True, **(process_memory(pid) or {})}]}
+
+    workers = [
+        {"pid": worker, "current": worker == pid, **(process_memory(worker) or {})}
+        for worker in child_pids(master_pid)
+    ]
+    master = {"pid": master_pid, **(process_memory(master_pid) or {})}
+    return {
+        "master": master,
+        "workers": workers,
+        # What the whole server really costs: shared pages are counted once
+        "total_pss_kb": master.get("pss_kb", 0) + sum(worker.get("pss_kb", 0) for worker in workers),
+    }
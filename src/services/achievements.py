@@ -0,0 +1,186 @@
+import argparse
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .websocket import websocket_service
+from ..models.base import get_db_context
+from ..models.exercise import Achievement, ExerciseHistory, ExerciseStats
+
+logger = logging.getLogger(__name__)
+
+AchievementDefinition = namedtuple("AchievementDefinition", ["name", "description", "type", "threshold"])
+
+# Unlocked when longest_streak first reaches the threshold
+STREAK_ACHIEVEMENTS = (
+    AchievementDefinition("3-Day Streak", "Exercised three days in a row", "streak", 3),
+    AchievementDefinition("Week Warrior", "Exercised seven days in a row", "streak", 7),
+    AchievementDefinition("Monthly Master", "Exercised thirty days in a row", "streak", 30),
+)
+
+# Unlocked when total_completions first reaches the threshold
+MILESTONE_ACHIEVEMENTS = (
+    AchievementDefinition("First Step", "Completed your first exercise", "milestone", 1),
+    AchievementDefinition("Getting Serious", "Completed 10 exercises", "milestone", 10),
+    AchievementDefinition("Dedicated", "Completed 50 exercises", "milestone", 50),
+    AchievementDefinition("Centurion", "Completed 100 exercises", "milestone", 100),
+)
+
+STAT_FIELDS = ("current_streak", "longest_streak", "last_completion_day", "total_completions", "total_seconds")
+
+def new_stats(user_id: int) -> ExerciseStats:
+    return ExerciseStats(
+        user_id=user_id,
+        current_streak=0,
+        longest_streak=0,
+        last_completion_day=None,
+        total_completions=0,
+        total_seconds=0.0,
+    )
+
+def apply_completion(stats: ExerciseStats, completed_at: datetime, duration_seconds: Optional[float]) -> List[AchievementDefinition]:
+    """Fold one completion into stats and return the achievements it unlocks.
+
+    Constant time: only the previous completion day is needed for the streak.
+    Completions older than the last recorded day (late offline syncs) still
+    count towards totals but leave the streak alone; rebuild_stats() recomputes
+    it exactly from history.
+    """
+    day = completed_at.date()
+    previous_longest = stats.longest_streak
+    previous_total = stats.total_completions
+
+    stats.total_completions += 1
+    stats.total_seconds += duration_seconds or 0.0
+
+    last_day = stats.last_completion_day
+    if last_day is None or day > last_day:
+        if last_day is not None and day - last_day == timedelta(days=1):
+            stats.current_streak += 1
+        else:
+            stats.current_streak = 1
+        stats.last_completion_day = day
+        stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+
+    unlocked = [
+        definition for definition in STREAK_ACHIEVEMENTS
+        if previous_longest < definition.threshold <= stats.longest_streak
+    ]
+    unlocked.extend(
+        definition for definition in MILESTONE_ACHIEVEMENTS
+        if previous_total < definition.threshold <= stats.total_completions
+    )
+    return unlocked
+
+class AchievementService:
+    """Event-driven streak and milestone tracking on top of ExerciseStats."""
+
+    def _locked(self, db: Session, user_id: int) -> Optional[ExerciseStats]:
+        return (
+            db.query(ExerciseStats)
+            .filter(ExerciseStats.user_id == user_id)
+            .with_for_update()
+            .first()
+        )
+
+    def get_stats(self, db: Session, user_id: int) -> ExerciseStats:
+        """Load a user's stats row for update, creating it on first use."""
+        stats = self._locked(db, user_id)
+        if stats is None:
+            # A missing row can't be locked, so two first completions can both get
+            # here; the loser's insert fails inside the savepoint and it locks the winner's row
+            try:
+                with db.begin_nested():
+                    db.add(new_stats(user_id))
+            except IntegrityError:
+                pass
+            stats = self._locked(db, user_id)
+        return stats
+
+    def record_completions(self, db: Session, user_id: int, completions: Iterable[ExerciseHistory]) -> List[Achievement]:
+        """Apply completions in time order and add any unlocked achievements.
+
+        The caller owns the transaction and commits it.
+        """
+        stats = self.get_stats(db, user_id)
+        unlocked: List[Achievement] = []
+        for history in sorted(completions, key=lambda h: h.completed_at):
+            for definition in apply_completion(stats, history.completed_at, history.duration_seconds):
+                unlocked.append(Achievement(
+                    user_id=user_id,
+                    name=definition.name,
+                    description=definition.description,
+                    type=definition.type,
+                    unlocked_at=history.completed_at,
+                    achievement_metadata={"threshold": definition.threshold},
+                ))
+        db.add_all(unlocked)
+        return unlocked
+
+    async def notify(self, user_id: int, achievements: List[Achievement]) -> None:
+        """Push achievement_unlocked events to the user's WebSocket clients."""
+        for achievement in achievements:
+            await websocket_service.broadcast({
+                "type": "achievement_unlocked",
+                "data": {
+                    "id": achievement.id,
+                    "name": achievement.name,
+                    "description": achievement.description,
+                    "achievement_type": achievement.type,
+                    "unlocked_at": achievement.unlocked_at.isoformat(),
+                },
+            }, str(user_id))
+
+    def rebuild_stats(self, db: Session, user_id: int) -> ExerciseStats:
+        """Recompute a user's stats from the full exercise history."""
+        stats = new_stats(user_id)
+        history = (
+            db.query(ExerciseHistory.completed_at, ExerciseHistory.duration_seconds)
+            .filter(ExerciseHistory.user_id == user_id)
+            .order_by(ExerciseHistory.completed_at)
+        )
+        for completed_at, duration_seconds in history:
+            apply_completion(stats, completed_at, duration_seconds)
+        return stats
+
+    def check_consistency(self, db: Session, user_id: int, fix: bool = False) -> Dict[str, Tuple]:
+        """Compare stored stats with a rebuild; return {field: (stored, rebuilt)} for mismatches."""
+        rebuilt = self.rebuild_stats(db, user_id)
+        stored = db.query(ExerciseStats).filter(ExerciseStats.user_id == user_id).first() or new_stats(user_id)
+        mismatches = {
+            field: (getattr(stored, field), getattr(rebuilt, field))
+            for field in STAT_FIELDS
+            if getattr(stored, field) != getattr(rebuilt, field)
+        }
+        if mismatches and fix:
+            db.merge(rebuilt)
+            db.commit()
+        return mismatches
+
+achievement_service = AchievementService()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild exercise stats from history and report drift.")
+    parser.add_argument("--user-id", type=int, help="Only check this user")
+    parser.add_argument("--fix", action="store_true", help="Overwrite drifted stats with the rebuilt values")
+    args = parser.parse_args()
+
+    with get_db_context() as db:
+        if args.user_id is not None:
+            user_ids = [args.user_id]
+        else:
+            user_ids = [user_id for (user_id,) in db.query(ExerciseHistory.user_id).distinct()]
+        for user_id in user_ids:
+            mismatches = achievement_service.check_consistency(db, user_id, fix=args.fix)
+            if mismatches:
+                logger.warning(f"User {user_id} stats drifted: {mismatches}")
+        logger.info(f"Checked {len(user_ids)} users")
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
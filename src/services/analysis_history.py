@@ -0,0 +1,74 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..config.settings import get_settings
+from ..models.analysis import Analysis
+
+settings = get_settings()
+
+def history_signature(db: Session, user_id: int) -> Tuple:
+    """Cheap fingerprint of a user's analyses: count, newest analysis_timestamp and the scorer versions."""
+    return tuple(db.query(
+        func.count(Analysis.id),
+        func.max(Analysis.analysis_timestamp),
+        func.min(Analysis.scorer_version),
+        func.max(Analysis.scorer_version),
+    ).filter(Analysis.user_id == user_id).one())
+
+class HistoryVersions:
+    """Per-user ETags of the analysis history, so an unchanged history is answered with 304 without loading it.
+
+    A user's tag comes from history_signature and is trusted for
+    ANALYSIS_HISTORY_VERSION_SECONDS. save_analyses invalidates the user's
+    tag at once; new analyses saved by other processes, and rescoring (which
+    changes the scorer versions), show up once the tag is re-checked.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl = settings.ANALYSIS_HISTORY_VERSION_SECONDS if ttl is None else ttl
+        self.max_entries = max_entries or settings.ANALYSIS_HISTORY_VERSION_ENTRIES
+        self._versions: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+        # Bumped by every invalidation, so a tag computed before one isn't cached after it
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: int) -> str:
+        """The user's current history ETag."""
+        with self._lock:
+            entry = self._versions.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._versions.move_to_end(user_id)
+                return entry[0]
+            generation = self._generation
+
+        count, latest, oldest_version, newest_version = history_signature(db, user_id)
+        latest = latest or datetime(1970, 1, 1)
+        tag = hashlib.sha256(
+            f"{user_id}:{count}:{latest.isoformat()}:{oldest_version}:{newest_version}".encode()
+        ).hexdigest()[:32]
+        # Weak: the same history may be sent compressed or not
+        etag = f'W/"{tag}"'
+
+        with self._lock:
+            if generation == self._generation:
+                self._versions[user_id] = (etag, time.monotonic() + self.ttl)
+                self._versions.move_to_end(user_id)
+                while len(self._versions) > self.max_entries:
+                    self._versions.popitem(last=False)
+        return etag
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Forget user_id's tag, or every user's with None."""
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._versions.clear()
+            else:
+                self._versions.pop(user_id, None)
+
+history_versions = HistoryVersions()
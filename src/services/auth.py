@@ -5,7 +5,8 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from .models.user import User
+from ..models.user import User
+from ..models.base import get_db
 from ..config.settings import get_settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
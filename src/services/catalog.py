@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Optional, Tuple
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from ..api.compression import etag_matches
+from ..config.settings import get_settings
+from ..models.exercise import Exercise
+
+settings = get_settings()
+
+CatalogSnapshot = namedtuple("CatalogSnapshot", ["body", "gzip_body", "etag", "gzip_etag", "last_modified", "signature"])
+
+def catalog_signature(db: Session) -> Tuple:
+    """Cheap fingerprint of the exercises table: row count and newest updated_at."""
+    return tuple(db.query(func.count(Exercise.id), func.max(Exercise.updated_at)).one())
+
+def on_catalog_change(callback: Callable[[], None]) -> None:
+    """Call callback whenever an Exercise is inserted, updated or deleted via the ORM."""
+    for name in ("after_insert", "after_update", "after_delete"):
+        event.listen(Exercise, name, lambda mapper, connection, target: callback())
+
+def serialize_exercise(exercise: Exercise) -> dict:
+    return {
+        "id": exercise.id,
+        "name": exercise.name,
+        "description": exercise.description,
+        "category": exercise.category,
+        "difficulty": exercise.difficulty,
+        "duration": exercise.duration_minutes,
+        "video_url": exercise.video_url,
+        "instructions": exercise.instructions,
+    }
+
+class CatalogService:
+    """Serves the exercise catalog from a pre-encoded, pre-compressed snapshot.
+
+    The snapshot is rebuilt only when the catalog changes: ORM writes in this
+    process invalidate it immediately, and a count/max(updated_at) check every
+    CATALOG_REFRESH_SECONDS catches writes from other processes.
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        on_catalog_change(self.invalidate)
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+
+    def _build(self, db: Session) -> CatalogSnapshot:
+        signature = catalog_signature(db)
+        exercises = db.query(Exercise).order_by(Exercise.id).all()
+        body = json.dumps(
+            [serialize_exercise(exercise) for exercise in exercises],
+            separators=(",", ":"),
+            ensure_ascii=False,
+        ).encode("utf-8")
+
+        count, updated_at = signature
+        updated_at = updated_at or datetime(1970, 1, 1)
+        tag = hashlib.sha256(f"{count}:{updated_at.isoformat()}".encode()).hexdigest()[:32]
+        return CatalogSnapshot(
+            body=body,
+            gzip_body=gzip.compress(body, compresslevel=9),
+            etag=f'"{tag}"',
+            gzip_etag=f'"{tag}-gzip"',
+            last_modified=format_datetime(updated_at.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True),
+            signature=signature,
+        )
+
+    def get(self, db: Session) -> CatalogSnapshot:
+        """Current snapshot, rebuilt if the catalog changed."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            if time.monotonic() - self._checked_at < settings.CATALOG_REFRESH_SECONDS:
+                return snapshot
+            if catalog_signature(db) == snapshot.signature:
+                self._checked_at = time.monotonic()
+                return snapshot
+
+        with self._lock:
+            if self._snapshot is None or self._snapshot is snapshot:
+                self._snapshot = self._build(db)
+                self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def is_not_modified(self, snapshot: CatalogSnapshot, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        """Evaluate conditional request headers against a snapshot."""
+        if if_none_match:
+            return etag_matches(if_none_match, snapshot.etag)
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(snapshot.last_modified)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+catalog_service = CatalogService()
@@ -0,0 +1,50 @@
+from collections import namedtuple
+from typing import Optional
+from fastapi import Request
+
+# What an engine returns for one image: per-face results (scores, tips, box)
+# largest first, and the raw detection when the engine has one
+EngineResult = namedtuple("EngineResult", ["faces", "detection"])
+
+MOCK_SCORES = {
+    "symmetry": 0.85,
+    "jawline": 0.80,
+    "facial_ratio": 0.88,
+    "skin_clarity": 0.82,
+    "overall": 0.84
+}
+
+MOCK_TIPS = [
+    "Great facial structure detected!",
+    "Consider good lighting for better analysis",
+    "Maintain a neutral expression for accurate results"
+]
+
+class MockEngine:
+    """Placeholder scores without loading any model, for demos and load tests of the API itself."""
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self, timeout: float) -> None:
+        pass
+
+    async def analyze(
+        self,
+        image_bytes: bytes,
+        max_faces: int = 1,
+        tier: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> EngineResult:
+        face = {
+            "scores": dict(MOCK_SCORES),
+            "improvement_tips": list(MOCK_TIPS),
+            "landmarks_detected": True,
+            "scorer_version": "mock",
+            "quality_warnings": [],
+        }
+        return EngineResult([face], None)
+
+def get_engine(request: Request):
+    """Dependency returning the inference engine the app was built with."""
+    return request.app.state.engine
@@ -0,0 +1,129 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .achievements import achievement_service
+from ..models.exercise import Achievement, Exercise, ExerciseHistory
+
+class ExerciseHistoryCreate(BaseModel):
+    exercise_id: int
+    duration_seconds: Optional[float] = Field(None, ge=0)
+    success_rate: Optional[float] = Field(None, ge=0, le=1)
+    notes: Optional[str] = None
+    completed_at: Optional[datetime] = None
+
+    @field_validator("completed_at")
+    @classmethod
+    def _naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Stored and compared as naive UTC, like the utcnow() default
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+class ExerciseHistoryBatchItem(ExerciseHistoryCreate):
+    client_key: str = Field(..., min_length=1, max_length=64)
+
+def _validate(raw_items: List[Any]) -> Tuple[List[Dict], List[Tuple[int, ExerciseHistoryBatchItem]]]:
+    """Validate every item; return per-item results (None for valid) and the valid items."""
+    results: List[Dict] = [None] * len(raw_items)
+    valid: List[Tuple[int, ExerciseHistoryBatchItem]] = []
+    seen = set()
+    for index, raw in enumerate(raw_items):
+        try:
+            item = ExerciseHistoryBatchItem.model_validate(raw)
+        except ValidationError as e:
+            results[index] = {
+                "index": index,
+                "client_key": raw.get("client_key") if isinstance(raw, dict) else None,
+                "status": "invalid",
+                "errors": [error["msg"] for error in e.errors()],
+            }
+            continue
+        if item.client_key in seen:
+            results[index] = {"index": index, "client_key": item.client_key, "status": "duplicate"}
+            continue
+        seen.add(item.client_key)
+        valid.append((index, item))
+    return results, valid
+
+def ingest_batch(db: Session, user_id: int, raw_items: List[Any]) -> Tuple[List[Dict], List[Achievement]]:
+    """Insert a batch of completions in one statement, deduplicated by client_key.
+
+    Returns one result per input item, in input order, with status created,
+    duplicate (already stored or repeated in the batch) or invalid.
+    """
+    results, valid = _validate(raw_items)
+
+    # One query each for known exercises and already-synced keys
+    exercise_ids = {item.exercise_id for _, item in valid}
+    known_exercises = {
+        exercise_id for (exercise_id,) in
+        db.query(Exercise.id).filter(Exercise.id.in_(exercise_ids))
+    } if exercise_ids else set()
+
+    for attempt in range(2):
+        keys = [item.client_key for _, item in valid]
+        existing = dict(
+            db.query(ExerciseHistory.client_key, ExerciseHistory.id)
+            .filter(ExerciseHistory.user_id == user_id, ExerciseHistory.client_key.in_(keys))
+        ) if keys else {}
+
+        rows, row_indexes = [], []
+        for index, item in valid:
+            if item.client_key in existing:
+                results[index] = {
+                    "index": index,
+                    "client_key": item.client_key,
+                    "status": "duplicate",
+                    "id": existing[item.client_key],
+                }
+            elif item.exercise_id not in known_exercises:
+                results[index] = {
+                    "index": index,
+                    "client_key": item.client_key,
+                    "status": "invalid",
+                    "errors": ["Exercise not found"],
+                }
+            else:
+                rows.append({
+                    "user_id": user_id,
+                    "exercise_id": item.exercise_id,
+                    "completed_at": item.completed_at or datetime.utcnow(),
+                    "duration_seconds": item.duration_seconds,
+                    "success_rate": item.success_rate,
+                    "notes": item.notes,
+                    "client_key": item.client_key,
+                })
+                row_indexes.append(index)
+
+        if not rows:
+            return results, []
+
+        try:
+            inserted = dict(
+                (client_key, id) for id, client_key in db.execute(
+                    insert(ExerciseHistory).returning(ExerciseHistory.id, ExerciseHistory.client_key),
+                    rows,
+                )
+            )
+            unlocked = achievement_service.record_completions(
+                db, user_id, [ExerciseHistory(**row) for row in rows]
+            )
+            db.commit()
+            break
+        except IntegrityError:
+            # A concurrent sync stored some of these keys first; re-check and retry once
+            db.rollback()
+            if attempt:
+                raise
+
+    for index, row in zip(row_indexes, rows):
+        results[index] = {
+            "index": index,
+            "client_key": row["client_key"],
+            "status": "created",
+            "id": inserted[row["client_key"]],
+        }
+    return results, unlocked
@@ -0,0 +1,318 @@
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+import cv2
+import numpy as np
+import mediapipe as mp
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from .analysis_history import history_versions
+from .scoring import face_boxes, scorer_registry
+from .recommendations import recommendation_service
+from .quality import REJECT, QualityError, assess_face, assess_image, issue_dicts
+from .landmark_store import save_landmarks
+from .similarity import similarity_index
+from .skin import skin_clarity
+from ..config.settings import get_settings
+from ..models.analysis import Analysis
+
+settings = get_settings()
+
+# Everything the worker threads measure on the image; scoring only needs these
+Detection = namedtuple("Detection", ["landmarks", "skin_clarity", "warnings"])
+
+# A face found by the detector: box is x, y, width, height in frame pixels
+FaceCandidate = namedtuple("FaceCandidate", ["box", "right_eye", "left_eye", "nose", "score"])
+
+def decode_image(image_bytes: bytes) -> Optional[np.ndarray]:
+    """Decode encoded image bytes to a BGR array, or None if they aren't an image."""
+    return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+def align_face(image: np.ndarray, candidate: FaceCandidate, size: int, margin: float):
+    """Rotate the eyes level and scale the padded face box into a size x size crop.
+
+    Returns the crop and the 2x3 affine transform from frame to crop pixels.
+    """
+    x, y, width, height = candidate.box
+    center = (float(x + width / 2), float(y + height / 2))
+    dx, dy = candidate.left_eye - candidate.right_eye
+    side = max(width, height) * (1 + 2 * margin)
+    transform = cv2.getRotationMatrix2D(center, float(np.degrees(np.arctan2(dy, dx))), size / side)
+    transform[:, 2] += (size / 2 - center[0], size / 2 - center[1])
+    crop = cv2.warpAffine(image, transform, (size, size), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return crop, transform
+
+def map_to_frame(points: np.ndarray, transform: np.ndarray) -> np.ndarray:
+    """Map (N, 2) crop pixel coordinates back to the frame through the inverse transform."""
+    inverse = cv2.invertAffineTransform(transform)
+    return (points @ inverse[:, :2].T + inverse[:, 2]).astype(np.float32)
+
+class FaceAnalysisService:
+    """Landmark detection and scoring shared by the analysis endpoints.
+
+    Detection runs in two stages: a light face detector on a downscaled copy
+    of the frame finds and orients each face, then FaceMesh runs only on an
+    aligned crop around it. Frames without a face never reach the mesh.
+
+    MediaPipe graphs are not thread-safe, so each worker thread lazily builds
+    its own graphs; the worker pool bounds how many run at once.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or settings.ANALYSIS_WORKERS
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="face-analysis",
+        )
+        self._local = threading.local()
+
+    def prepare_thread(self) -> None:
+        """Build the calling thread's detector and mesh graphs now rather than on first use."""
+        self._face_detector()
+        self._face_mesh()
+
+    def warm_up(self) -> None:
+        """Build the detector and mesh graphs on every worker thread before the first request."""
+        barrier = threading.Barrier(self.max_workers)
+
+        def build():
+            try:
+                self.prepare_thread()
+            finally:
+                # Hold this thread until all tasks are running, so each lands on its own thread
+                barrier.wait()
+
+        for future in [self.executor.submit(build) for _ in range(self.max_workers)]:
+            future.result()
+
+    def _face_mesh(self, max_faces: int = 1):
+        # One graph per face limit: FaceMesh runs the mesh model once per detected face
+        meshes = getattr(self._local, "face_meshes", None)
+        if meshes is None:
+            meshes = self._local.face_meshes = {}
+        face_mesh = meshes.get(max_faces)
+        if face_mesh is None:
+            face_mesh = meshes[max_faces] = mp.solutions.face_mesh.FaceMesh(
+                static_image_mode=True,
+                max_num_faces=max_faces,
+                refine_landmarks=True,
+                min_detection_confidence=0.5
+            )
+        return face_mesh
+
+    def _face_detector(self):
+        detector = getattr(self._local, "face_detector", None)
+        if detector is None:
+            # Full-range model: faces are small once the frame is downscaled
+            detector = self._local.face_detector = mp.solutions.face_detection.FaceDetection(
+                model_selection=1,
+                min_detection_confidence=0.5
+            )
+        return detector
+
+    def detect_faces(self, image: np.ndarray, max_faces: int = 1) -> np.ndarray:
+        """Return up to max_faces faces as an (F, N, 2) array of pixel coordinates, largest first."""
+        return self._detect(image, max_faces)[0]
+
+    def _detect(self, image: np.ndarray, max_faces: int):
+        """Detect and mesh faces, returning them with the faces' quality warnings.
+
+        Faces the detector output already shows to be unusable (tiny or turned
+        away) are dropped before the mesh; if that leaves none, QualityError.
+        """
+        if not settings.ANALYSIS_TWO_STAGE:
+            return self.mesh_full_frame(image, max_faces), []
+        faces, warnings, rejected = [], [], []
+        for candidate in self.find_faces(image, max_faces):
+            issues = assess_face(candidate.box, candidate.right_eye, candidate.left_eye, candidate.nose)
+            if any(issue.severity == REJECT for issue in issues):
+                rejected.extend(issues)
+                continue
+            crop, transform = self.align_crop(image, candidate)
+            landmarks = self.mesh_crop(crop, transform)
+            if landmarks is not None:
+                faces.append(landmarks)
+                warnings.extend(issues)
+        if not faces:
+            if rejected:
+                raise QualityError(rejected)
+            return np.empty((0, 0, 2), dtype=np.float32), warnings
+        return np.stack(faces), warnings
+
+    def find_faces(self, image: np.ndarray, max_faces: int = 1) -> List[FaceCandidate]:
+        """Stage 1: detect faces on a downscaled frame, largest first."""
+        height, width = image.shape[:2]
+        scale = min(1.0, settings.ANALYSIS_DETECT_SIZE / max(height, width))
+        small = image if scale == 1.0 else cv2.resize(
+            image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA
+        )
+        results = self._face_detector().process(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+        if not results.detections:
+            return []
+
+        size = np.array([width, height], dtype=np.float32)
+        candidates = []
+        for detection in results.detections:
+            location = detection.location_data
+            box = location.relative_bounding_box
+            keypoints = location.relative_keypoints
+            candidates.append(FaceCandidate(
+                box=np.array([box.xmin, box.ymin, box.width, box.height], dtype=np.float32) * np.tile(size, 2),
+                right_eye=np.array([keypoints[0].x, keypoints[0].y], dtype=np.float32) * size,
+                left_eye=np.array([keypoints[1].x, keypoints[1].y], dtype=np.float32) * size,
+                nose=np.array([keypoints[2].x, keypoints[2].y], dtype=np.float32) * size,
+                score=float(detection.score[0]),
+            ))
+        candidates.sort(key=lambda candidate: -candidate.box[2] * candidate.box[3])
+        return candidates[:max_faces]
+
+    def align_crop(self, image: np.ndarray, candidate: FaceCandidate):
+        """Stage 2: cut an upright, fixed-size crop around a face; returns the crop and its affine transform."""
+        return align_face(image, candidate, settings.ANALYSIS_CROP_SIZE, settings.ANALYSIS_CROP_MARGIN)
+
+    def mesh_crop(self, crop: np.ndarray, transform: np.ndarray) -> Optional[np.ndarray]:
+        """Stage 3: run FaceMesh on an aligned crop and map the landmarks back to frame pixels."""
+        results = self._face_mesh(1).process(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))
+        if not results.multi_face_landmarks:
+            return None
+        points = np.array(
+            [(landmark.x, landmark.y) for landmark in results.multi_face_landmarks[0].landmark],
+            dtype=np.float32,
+        ) * np.array([crop.shape[1], crop.shape[0]], dtype=np.float32)
+        return map_to_frame(points, transform)
+
+    def mesh_full_frame(self, image: np.ndarray, max_faces: int = 1) -> np.ndarray:
+        """Single-stage path: FaceMesh over the whole frame."""
+        results = self._face_mesh(max_faces).process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        if not results.multi_face_landmarks:
+            return np.empty((0, 0, 2), dtype=np.float32)
+        height, width = image.shape[:2]
+        faces = np.array(
+            [[(landmark.x, landmark.y) for landmark in face.landmark] for face in results.multi_face_landmarks],
+            dtype=np.float32,
+        ) * np.array([width, height], dtype=np.float32)
+        boxes = face_boxes(faces)
+        return faces[np.argsort(-boxes[:, 2] * boxes[:, 3], kind="stable")]
+
+    def detect_landmarks(self, image: np.ndarray) -> Optional[np.ndarray]:
+        """Return the first face's landmarks as an (N, 2) array of pixel coordinates."""
+        faces = self.detect_faces(image)
+        return faces[0] if len(faces) else None
+
+    def landmarks_from_bytes(self, image_bytes: bytes) -> Detection:
+        """Decode and analyze the largest face; raises ValueError for unusable images."""
+        faces = self.faces_from_bytes(image_bytes)
+        return Detection(faces.landmarks[0], faces.skin_clarity[0], faces.warnings)
+
+    def faces_from_bytes(self, image_bytes: bytes, max_faces: int = 1) -> Detection:
+        """Decode, gate, detect up to max_faces faces and measure their skin.
+
+        Raises ValueError for unusable images; QualityError (a ValueError)
+        carries the structured reasons when the quality gate rejects one.
+        """
+        image = decode_image(image_bytes)
+        if image is None:
+            raise ValueError("Invalid image format")
+        return self.faces_from_image(image, max_faces)
+
+    def faces_from_image(self, image: np.ndarray, max_faces: int = 1) -> Detection:
+        """Gate, detect and measure an already decoded BGR frame; the frame is only read."""
+        issues = assess_image(image)
+        if any(issue.severity == REJECT for issue in issues):
+            raise QualityError([issue for issue in issues if issue.severity == REJECT])
+        faces, face_warnings = self._detect(image, max_faces)
+        if not len(faces):
+            raise ValueError("No face detected in the image")
+        return Detection(faces, skin_clarity(image, faces), issue_dicts(issues + face_warnings))
+
+    def score(self, detections: List[Detection]) -> List[Dict]:
+        """Score several single-face detections together; returns scores and tips per face."""
+        if not detections:
+            return []
+        results = self._score(
+            np.stack([detection.landmarks for detection in detections]),
+            np.array([detection.skin_clarity for detection in detections]),
+        )
+        for result, detection in zip(results, detections):
+            result["quality_warnings"] = detection.warnings
+        return results
+
+    def score_faces(self, faces: Detection) -> List[Dict]:
+        """Score all faces from one image, adding each face's bounding box."""
+        results = self._score(faces.landmarks, faces.skin_clarity)
+        for result, box in zip(results, face_boxes(faces.landmarks)):
+            result["box"] = dict(zip(("x", "y", "width", "height"), map(float, box)))
+            result["quality_warnings"] = faces.warnings
+        return results
+
+    def _score(self, landmarks: np.ndarray, skin: np.ndarray) -> List[Dict]:
+        # One scorer for the whole call, even if a reload lands meanwhile
+        scorer_registry.refresh_if_changed()
+        scorer = scorer_registry.active
+        results = []
+        for scores in scorer.split(scorer.score(landmarks, skin)):
+            results.append({
+                "scores": scores,
+                "improvement_tips": scorer.improvement_tips(scores),
+                "landmarks_detected": True,
+                "scorer_version": scorer.version,
+            })
+        return results
+
+def save_analyses(
+    db: Session,
+    user_id: int,
+    results: List[Dict],
+    image_urls: Optional[List[str]] = None,
+    landmarks: Optional[List[np.ndarray]] = None,
+    skin: Optional[Sequence[float]] = None,
+    before_commit: Optional[Callable[[List[int]], bool]] = None,
+) -> Optional[List[int]]:
+    """Insert one Analysis row per result with a single statement, plus its landmarks if given.
+
+    skin is the measured skin clarity stored with the landmarks, NaN where it
+    couldn't be measured; without it the scored value is stored.
+
+    Each result also gets its ranked exercises, stored as ExerciseRecommendation
+    rows and added to the result as exercise_recommendations.
+
+    before_commit runs in the same transaction with the new ids; if it returns
+    False everything is rolled back and None is returned.
+    """
+    image_urls = image_urls or [None] * len(results)
+    rows = [{
+        "user_id": user_id,
+        "image_url": image_url,
+        "symmetry_score": result["scores"]["symmetry"],
+        "jawline_score": result["scores"]["jawline"],
+        "facial_ratio_score": result["scores"]["facial_ratio"],
+        "skin_clarity_score": result["scores"]["skin_clarity"],
+        "overall_score": result["scores"]["overall"],
+        "landmarks_detected": True,
+        "face_detected": True,
+        "improvement_tips": result["improvement_tips"],
+        "scorer_version": result["scorer_version"],
+    } for result, image_url in zip(results, image_urls)]
+    # A batched RETURNING only comes back in parameter order when asked to,
+    # and every list below is matched to the ids by position
+    ids = [id for (id,) in db.execute(insert(Analysis).returning(Analysis.id, sort_by_parameter_order=True), rows)]
+    recommendations = recommendation_service.recommend_for_analyses(db, ids, [result["scores"] for result in results])
+    if landmarks is not None:
+        if skin is None:
+            skin = [result["scores"]["skin_clarity"] for result in results]
+        save_landmarks(db, ids, landmarks, skin)
+    for result, ranked in zip(results, recommendations):
+        result["exercise_recommendations"] = [rec._asdict() for rec in ranked]
+    if before_commit is not None and not before_commit(ids):
+        db.rollback()
+        return None
+    db.commit()
+    history_versions.invalidate(user_id)
+    if landmarks is not None:
+        # Other workers' recent analyses first, so duplicates of theirs are caught too
+        similarity_index.sync(db)
+        similarity_index.add(ids, user_id, landmarks)
+    return ids
+
+face_analysis_service = FaceAnalysisService()
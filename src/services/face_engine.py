@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from .engines import EngineResult
+from .face_analysis import Detection, FaceAnalysisService, decode_image, face_analysis_service
+from .frame_ring import FrameRing, FrameSlot, attach, frame_view
+from .scheduler import FREE, DeadlineExceeded, InferenceScheduler, Overloaded, inference_scheduler
+from .single_flight import SingleFlight
+from ..config.settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# In an inference process: the attached frame ring block and its slot size
+_frames = None
+
+def _init_process(ring_name: str, slot_bytes: int, warm_up: bool) -> None:
+    global _frames
+    _frames = (attach(ring_name), slot_bytes)
+    if warm_up:
+        try:
+            face_analysis_service.prepare_thread()
+        except Exception as e:
+            logger.error(f"Analysis warm-up failed: {str(e)}")
+
+def _analyze_frame(slot: FrameSlot, max_faces: int) -> Detection:
+    shm, slot_bytes = _frames
+    return face_analysis_service.faces_from_image(frame_view(shm.buf, slot, slot_bytes), max_faces)
+
+def _analyze_bytes(image_bytes: bytes, max_faces: int) -> Detection:
+    return face_analysis_service.faces_from_bytes(image_bytes, max_faces)
+
+class InferenceProcessFailed(HTTPException):
+    """Raised when an inference process died while running the request; the pool is replaced."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=503,
+            detail="Analysis failed unexpectedly, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+class FaceMeshEngine:
+    """Face detection, mesh and scoring on the analysis workers, admitted by the scheduler.
+
+    With processes > 0 the mesh runs in that many worker processes instead
+    of threads. Each admitted request decodes its image on its analysis
+    thread and copies the frame into a slot of a shared memory frame ring;
+    the process reads the frame in place and sends back only the landmarks.
+    Frames too large for a slot, or arriving while every slot is held, are
+    sent encoded instead. If a process dies (a native crash, the OOM killer),
+    the requests it broke get a 503 and a fresh pool attached to the same
+    ring takes over.
+
+    Identical images analyzed concurrently (retries, several tabs) share one
+    detection, keyed by the bytes' digest. A duplicate whose leader was shed
+    or ran out of time tries again under its own tier and deadline, and
+    stops waiting on a leader once its own deadline passes.
+    """
+
+    def __init__(
+        self,
+        service: Optional[FaceAnalysisService] = None,
+        scheduler: Optional[InferenceScheduler] = None,
+        warm_up: Optional[bool] = None,
+        processes: Optional[int] = None,
+    ):
+        self.service = service or face_analysis_service
+        self.scheduler = scheduler or inference_scheduler
+        self.warm_up = settings.ANALYSIS_WARM_UP if warm_up is None else warm_up
+        self.processes = settings.ANALYSIS_PROCESSES if processes is None else processes
+        self.ring: Optional[FrameRing] = None
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self.encoded_fallbacks = 0
+        self.pool_restarts = 0
+        self.flights = SingleFlight(retry_on=(Overloaded, DeadlineExceeded), timeout_error=DeadlineExceeded)
+
+    async def start(self) -> None:
+        if self.processes:
+            # One slot per analysis thread: each holds at most one frame at a time
+            self.ring = FrameRing(self.scheduler.slots, 3 * settings.FRAME_SLOT_MAX_PIXELS)
+            self.pool = self._new_pool()
+            return
+        if not self.warm_up:
+            return
+        try:
+            await run_in_threadpool(self.service.warm_up)
+        except Exception as e:
+            # Workers build their graphs on first use instead
+            logger.error(f"Analysis warm-up failed: {str(e)}")
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            # Not fork: this process already runs threads and an event loop
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process,
+            initargs=(self.ring.name, self.ring.slot_bytes, self.warm_up),
+        )
+
+    def _run_in_process(self, fn, *args):
+        pool = self.pool
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            with self._pool_lock:
+                # Every request the dead process broke lands here; replace the pool once
+                if self.pool is pool:
+                    logger.error("Inference process died; starting a new pool")
+                    self.pool = self._new_pool()
+                    self.pool_restarts += 1
+                    pool.shutdown(wait=False, cancel_futures=True)
+            raise InferenceProcessFailed()
+
+    async def stop(self, timeout: float) -> None:
+        if not await self.scheduler.drain(timeout):
+            logger.warning(f"Inference still running after {timeout}s at shutdown")
+        if self.pool is not None:
+            await run_in_threadpool(self.pool.shutdown, True, cancel_futures=True)
+            self.ring.close()
+            self.pool = self.ring = None
+
+    async def analyze(
+        self,
+        image_bytes: bytes,
+        max_faces: int = 1,
+        tier: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> EngineResult:
+        """Detect and score up to max_faces faces; raises ValueError (or QualityError) for unusable images."""
+        detect = self.service.faces_from_bytes if self.pool is None else self._detect_in_process
+        faces, _ = await self.flights.do(
+            (hashlib.sha256(image_bytes).digest(), max_faces),
+            lambda: self.scheduler.run(tier or FREE, detect, image_bytes, max_faces, deadline=deadline),
+            deadline=deadline,
+        )
+        # Each caller scores its own copy: the results are per-request dicts
+        return EngineResult(self.service.score_faces(faces), faces)
+
+    def _detect_in_process(self, image_bytes: bytes, max_faces: int) -> Detection:
+        # Runs on an analysis thread, which waits for the process; the slot is
+        # released here even if the request was cancelled meanwhile
+        self.ring.check_leaks(settings.FRAME_SLOT_LEAK_SECONDS)
+        image = decode_image(image_bytes)
+        if image is None:
+            raise ValueError("Invalid image format")
+        slot = self.ring.write(image, owner=threading.current_thread().name)
+        del image
+        if slot is None:
+            self.encoded_fallbacks += 1
+            return self._run_in_process(_analyze_bytes, image_bytes, max_faces)
+        try:
+            return self._run_in_process(_analyze_frame, slot, max_faces)
+        finally:
+            self.ring.release(slot)
+
+    def snapshot(self) -> dict:
+        return {
+            "processes": self.processes if self.pool is not None else 0,
+            "encoded_fallbacks": self.encoded_fallbacks,
+            "pool_restarts": self.pool_restarts,
+            # Detections shared with a concurrent identical request instead of run again
+            "inferences_saved": self.flights.shared,
+            "single_flight": self.flights.snapshot(),
+            "frame_ring": self.ring.snapshot() if self.ring is not None else None,
+        }
@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from multiprocessing import shared_memory
+from typing import Deque, Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# A leased slot and the shape of the uint8 frame written into it
+FrameSlot = namedtuple("FrameSlot", ["index", "shape"])
+
+def frame_view(buffer, slot: FrameSlot, slot_bytes: int) -> np.ndarray:
+    """A NumPy array over slot's frame in buffer, without copying it."""
+    return np.ndarray(slot.shape, dtype=np.uint8, buffer=buffer, offset=slot.index * slot_bytes)
+
+class FrameRing:
+    """Preallocated frame slots in one shared memory block, for handing decoded
+    frames to inference processes without pickling them.
+
+    The owning process leases a slot, writes a frame into it and sends the
+    small FrameSlot to a worker process, which attaches to the block by name
+    (see attach) and reads the frame in place. The owner releases the slot
+    once the worker's result is back. Slots held longer than the leak age are
+    reported: a slot is only ever freed by release(), since a worker may
+    still be reading it.
+    """
+
+    def __init__(self, slots: int, slot_bytes: int):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self.name = self.shm.name
+        self._free: Deque[int] = deque(range(slots))
+        self._held: Dict[int, Tuple[float, str]] = {}
+        self._reported = set()
+        self._lock = threading.Lock()
+        self.leases = 0
+        self.exhausted = 0
+        self.leaks = 0
+
+    def acquire(self, shape: Tuple[int, ...], owner: str = "") -> Optional[FrameSlot]:
+        """Lease a free slot for a frame of shape; None if it doesn't fit or every slot is held."""
+        if int(np.prod(shape)) > self.slot_bytes:
+            return None
+        with self._lock:
+            if not self._free:
+                self.exhausted += 1
+                return None
+            index = self._free.popleft()
+            self._held[index] = (time.monotonic(), owner)
+            self.leases += 1
+        return FrameSlot(index, tuple(shape))
+
+    def view(self, slot: FrameSlot) -> np.ndarray:
+        return frame_view(self.shm.buf, slot, self.slot_bytes)
+
+    def write(self, frame: np.ndarray, owner: str = "") -> Optional[FrameSlot]:
+        """Lease a slot and copy frame into it; None if no slot can take it."""
+        slot = self.acquire(frame.shape, owner)
+        if slot is not None:
+            np.copyto(self.view(slot), frame)
+        return slot
+
+    def release(self, slot: FrameSlot) -> None:
+        with self._lock:
+            if self._held.pop(slot.index, None) is None:
+                raise ValueError(f"Frame slot {slot.index} released twice")
+            self._reported.discard(slot.index)
+            self._free.append(slot.index)
+
+    def check_leaks(self, max_age: float) -> List[Dict]:
+        """Slots held longer than max_age seconds; each is logged once per lease."""
+        now = time.monotonic()
+        with self._lock:
+            leaked = [
+                {"slot": index, "owner": owner, "held_seconds": round(now - since, 1)}
+                for index, (since, owner) in self._held.items()
+                if now - since > max_age
+            ]
+            new = [leak for leak in leaked if leak["slot"] not in self._reported]
+            self._reported.update(leak["slot"] for leak in new)
+            self.leaks += len(new)
+        for leak in new:
+            logger.warning(f"Frame slot {leak['slot']} held for {leak['held_seconds']}s by {leak['owner'] or 'unknown'}")
+        return leaked
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            held = len(self._held)
+        return {
+            "slots": self.slots,
+            "slot_mb": round(self.slot_bytes / 2 ** 20, 1),
+            "held": held,
+            "leases": self.leases,
+            "exhausted": self.exhausted,
+            "leaks": self.leaks,
+        }
+
+    def close(self) -> None:
+        """Free the block; call once the worker processes are gone."""
+        if self._held:
+            logger.warning(f"Closing frame ring with {len(self._held)} slots still held")
+        self.shm.close()
+        self.shm.unlink()
+
+def attach(name: str) -> shared_memory.SharedMemory:
+    """Open a ring's block from a worker process; the owner keeps responsibility for unlinking it."""
+    return shared_memory.SharedMemory(name=name)
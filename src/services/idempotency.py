@@ -0,0 +1,257 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import Response
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .scheduler import DeadlineExceeded
+from .single_flight import SingleFlight
+from ..api.serialization import dumps, encoded_response, json_response
+from ..config.settings import get_settings
+from ..models.idempotency import IdempotencyRecord
+
+settings = get_settings()
+
+# A response as it is replayed: status, encoded JSON body, and the digest of
+# the request body that produced it
+StoredResponse = namedtuple("StoredResponse", ["status_code", "body", "fingerprint"])
+
+# What a computation returns: status code and JSON-serializable content
+Computation = Callable[[], Awaitable[Tuple[int, Any]]]
+
+# Expired rows are deleted after every this many stored responses
+PURGE_EVERY = 1000
+
+class IdempotencyConflict(HTTPException):
+    """The key was already used with a different request body."""
+
+    def __init__(self):
+        super().__init__(status_code=422, detail="Idempotency-Key was already used with a different request")
+
+def request_fingerprint(body: bytes) -> bytes:
+    return hashlib.sha256(body).digest()[:16]
+
+def check_key(key: str) -> None:
+    if not key or len(key) > settings.IDEMPOTENCY_MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Idempotency-Key must be 1 to {settings.IDEMPOTENCY_MAX_KEY_LENGTH} characters"
+        )
+
+class IdempotencyStore:
+    """Responses by Idempotency-Key, so a retried request replays the first one's response.
+
+    Two tiers: a bounded in-memory LRU per process, and a table shared by
+    every process (SQLite or Postgres, whichever the app uses). A request
+    first claims its key with a row insert; a duplicate that arrives while
+    the first is still running waits for it instead of redoing the work,
+    through a SingleFlight when both landed in the same process and by
+    polling the row otherwise. Client errors (4xx) are stored and replayed
+    like successes; server errors are not, so those requests can be retried.
+    """
+
+    def __init__(self, ttl: Optional[int] = None, max_entries: Optional[int] = None):
+        self.ttl = ttl or settings.IDEMPOTENCY_TTL_SECONDS
+        self.max_entries = max_entries or settings.IDEMPOTENCY_MEMORY_ENTRIES
+        self._memory: "OrderedDict[str, Tuple[StoredResponse, float]]" = OrderedDict()
+        self._flights = SingleFlight(timeout_error=DeadlineExceeded)
+        self.computed = 0
+        self.replayed = 0
+        self.coalesced = 0
+
+    def _recall(self, key: str) -> Optional[StoredResponse]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        stored, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return stored
+
+    def _remember(self, key: str, stored: StoredResponse) -> None:
+        self._memory[key] = (stored, time.monotonic() + self.ttl)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _claim(self, db: Session, key: str, fingerprint: bytes, insert: bool = True) -> Optional[IdempotencyRecord]:
+        """Claim key for this request; returns the existing row instead if another request holds it.
+
+        With insert=False, for polling a claim already seen, the row is read
+        first and an insert is only tried if it has gone.
+        """
+        now = datetime.utcnow()
+        lock_until = now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+        record = None if insert else db.get(IdempotencyRecord, key, populate_existing=True)
+        if record is None:
+            try:
+                db.add(IdempotencyRecord(key=key, fingerprint=fingerprint, expires_at=lock_until))
+                db.commit()
+                return None
+            except IntegrityError:
+                db.rollback()
+            record = db.get(IdempotencyRecord, key, populate_existing=True)
+            if record is None:
+                # Deleted since the insert failed: the caller tries again
+                return IdempotencyRecord(key=key, fingerprint=fingerprint, expires_at=now)
+        if record.expires_at > now:
+            return record
+        # An expired response, or a claim whose request died: take it over,
+        # unless another request got there first
+        taken = db.execute(
+            update(IdempotencyRecord)
+            .where(IdempotencyRecord.key == key, IdempotencyRecord.expires_at == record.expires_at)
+            .values(fingerprint=fingerprint, status_code=None, body=None, expires_at=lock_until)
+        ).rowcount
+        db.commit()
+        return None if taken else IdempotencyRecord(key=key, fingerprint=fingerprint, expires_at=now)
+
+    def _complete(self, db: Session, key: str, stored: StoredResponse) -> None:
+        db.execute(
+            update(IdempotencyRecord)
+            .where(IdempotencyRecord.key == key)
+            .values(
+                status_code=stored.status_code,
+                body=stored.body,
+                expires_at=datetime.utcnow() + timedelta(seconds=self.ttl),
+            )
+        )
+        db.commit()
+
+    def _release(self, db: Session, key: str) -> None:
+        db.rollback()
+        db.execute(delete(IdempotencyRecord).where(
+            IdempotencyRecord.key == key,
+            IdempotencyRecord.status_code.is_(None),
+        ))
+        db.commit()
+
+    def purge_expired(self, db: Session) -> int:
+        """Delete expired rows; returns how many went."""
+        deleted = db.execute(
+            delete(IdempotencyRecord).where(IdempotencyRecord.expires_at <= datetime.utcnow())
+        ).rowcount
+        db.commit()
+        return deleted
+
+    async def run(
+        self,
+        key: str,
+        fingerprint: bytes,
+        compute: Computation,
+        db: Optional[Session] = None,
+        deadline: Optional[float] = None,
+    ) -> Tuple[StoredResponse, bool]:
+        """The response for key, computing it only if no request with this key has; also whether it was replayed.
+
+        A duplicate waits for the request holding the key at most until its
+        own deadline (a time.monotonic() value), then raises DeadlineExceeded.
+        """
+        stored = self._recall(key)
+        if stored is not None:
+            self.replayed += 1
+            replayed = True
+        else:
+            (stored, replayed), shared = await self._flights.do(
+                key, lambda: self._lead(key, fingerprint, compute, db, deadline), deadline=deadline
+            )
+            if shared:
+                self.coalesced += 1
+                replayed = True
+        self._check(stored.fingerprint, fingerprint)
+        return stored, replayed
+
+    async def _lead(
+        self,
+        key: str,
+        fingerprint: bytes,
+        compute: Computation,
+        db: Optional[Session],
+        deadline: Optional[float],
+    ) -> Tuple[StoredResponse, bool]:
+        if db is not None:
+            insert = True
+            while True:
+                record = await run_in_threadpool(self._claim, db, key, fingerprint, insert)
+                if record is None:
+                    break
+                # Poll a row that exists by reading it; a stand-in for one that
+                # vanished means inserting again
+                insert = record not in db
+                if record.status_code is not None:
+                    self._check(record.fingerprint, fingerprint)
+                    stored = StoredResponse(record.status_code, record.body, record.fingerprint)
+                    self._remember(key, stored)
+                    self.replayed += 1
+                    return stored, True
+                # Another process is running this request
+                self._check(record.fingerprint, fingerprint)
+                if deadline is not None and time.monotonic() + settings.IDEMPOTENCY_POLL_INTERVAL > deadline:
+                    raise DeadlineExceeded()
+                await asyncio.sleep(settings.IDEMPOTENCY_POLL_INTERVAL)
+
+        try:
+            try:
+                status_code, content = await compute()
+            except HTTPException as e:
+                if e.status_code >= 500:
+                    raise
+                status_code, content = e.status_code, {"detail": e.detail}
+        except BaseException:
+            if db is not None:
+                await run_in_threadpool(self._release, db, key)
+            raise
+
+        stored = StoredResponse(status_code, dumps(content), fingerprint)
+        self.computed += 1
+        if db is not None:
+            await run_in_threadpool(self._complete, db, key, stored)
+            if self.computed % PURGE_EVERY == 0:
+                await run_in_threadpool(self.purge_expired, db)
+        self._remember(key, stored)
+        return stored, False
+
+    @staticmethod
+    def _check(stored_fingerprint: bytes, fingerprint: bytes) -> None:
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyConflict()
+
+    def snapshot(self) -> Dict:
+        return {
+            "computed": self.computed,
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+            "in_flight": self._flights.snapshot()["in_flight"],
+            "memory_entries": len(self._memory),
+        }
+
+idempotency_store = IdempotencyStore()
+
+async def idempotent(
+    request: Request,
+    key: Optional[str],
+    scope: str,
+    compute: Computation,
+    db: Optional[Session] = None,
+    deadline: Optional[float] = None,
+) -> Response:
+    """Respond with compute's result, once per Idempotency-Key within scope; without a key, just compute.
+
+    Replayed and coalesced responses carry an Idempotent-Replayed header.
+    """
+    if key is None:
+        status_code, content = await compute()
+        return json_response(content, status_code)
+    check_key(key)
+    stored, replayed = await idempotency_store.run(
+        f"{scope}:{key}", request_fingerprint(await request.body()), compute, db, deadline
+    )
+    return encoded_response(stored.body, stored.status_code, {"Idempotent-Replayed": "true"} if replayed else None)
@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+from .face_analysis import face_analysis_service, save_analyses
+from .scheduler import FREE, PREMIUM, inference_scheduler
+from .storage import storage_service
+from .websocket import websocket_service
+from ..config.settings import get_settings
+from ..models.base import SessionLocal
+from ..models.job import AnalysisJob
+from ..models.user import User
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+PREMIUM_PRIORITY = 0
+FREE_PRIORITY = 1
+
+class JobQueue:
+    """Durable analysis queue stored in the analysis_jobs table.
+
+    Workers claim the oldest available job in the highest-priority lane with
+    SELECT ... FOR UPDATE SKIP LOCKED on Postgres; the claim itself is a
+    conditional UPDATE, so it is also safe on SQLite where row locks don't
+    exist. A claim leases the job for JOB_VISIBILITY_TIMEOUT seconds: if the
+    worker dies, the lease lapses and another worker retries the job.
+    """
+
+    def enqueue(self, db: Session, user: User, image_url: str) -> AnalysisJob:
+        job = AnalysisJob(
+            user_id=user.id,
+            image_url=image_url,
+            priority=PREMIUM_PRIORITY if user.is_premium else FREE_PRIORITY,
+            max_attempts=settings.JOB_MAX_ATTEMPTS,
+            available_at=datetime.utcnow(),
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def claim(self, db: Session, worker_id: str) -> Optional[AnalysisJob]:
+        """Lease the next job for worker_id, or return None if nothing is available."""
+        while True:
+            now = datetime.utcnow()
+            candidate = (
+                db.query(AnalysisJob)
+                .filter(
+                    AnalysisJob.status.in_(("queued", "running")),
+                    AnalysisJob.available_at <= now,
+                )
+                .order_by(AnalysisJob.priority, AnalysisJob.available_at)
+                .with_for_update(skip_locked=True)
+                .first()
+            )
+            if candidate is None:
+                db.commit()
+                return None
+
+            if candidate.attempts >= candidate.max_attempts:
+                # Lease expired on the final attempt: the worker crashed every time
+                candidate.status = "failed"
+                candidate.error = candidate.error or "Worker did not finish the job"
+                candidate.finished_at = now
+                db.commit()
+                continue
+
+            claimed = db.execute(
+                update(AnalysisJob)
+                .where(
+                    AnalysisJob.id == candidate.id,
+                    AnalysisJob.attempts == candidate.attempts,
+                    or_(AnalysisJob.status == "queued", AnalysisJob.status == "running"),
+                )
+                .values(
+                    status="running",
+                    attempts=AnalysisJob.attempts + 1,
+                    worker_id=worker_id,
+                    available_at=now + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT),
+                )
+            ).rowcount
+            db.commit()
+            if claimed:
+                db.refresh(candidate)
+                return candidate
+
+    def _finish(self, db: Session, job: AnalysisJob, commit: bool, **values) -> bool:
+        """Update job only if its lease still belongs to the attempt that holds it.
+
+        A worker whose lease lapsed may finish after another worker reclaimed
+        the job; the worker_id/attempts fence makes its update match no rows.
+        """
+        finished = db.execute(
+            update(AnalysisJob)
+            .where(
+                AnalysisJob.id == job.id,
+                AnalysisJob.worker_id == job.worker_id,
+                AnalysisJob.attempts == job.attempts,
+                AnalysisJob.status == "running",
+            )
+            .values(**values)
+        ).rowcount
+        if commit:
+            db.commit()
+        return bool(finished)
+
+    def complete(self, db: Session, job: AnalysisJob, analysis_id: int, result: dict, commit: bool = True) -> bool:
+        """Record the result; False if the job's lease was lost and nothing was written.
+
+        With commit=False the caller commits, so the analysis row and the job
+        update can share one transaction.
+        """
+        return self._finish(
+            db, job, commit,
+            status="succeeded",
+            analysis_id=analysis_id,
+            result=result,
+            error=None,
+            finished_at=datetime.utcnow(),
+        )
+
+    def fail(self, db: Session, job: AnalysisJob, error: str, retryable: bool = True) -> bool:
+        """Record a failure; retryable errors go back to the queue with backoff.
+
+        Returns False if the job's lease was lost and nothing was written.
+        """
+        now = datetime.utcnow()
+        if retryable and job.attempts < job.max_attempts:
+            values = {"status": "queued", "available_at": now + timedelta(seconds=settings.JOB_RETRY_BACKOFF * job.attempts)}
+        else:
+            values = {"status": "failed", "finished_at": now}
+        return self._finish(db, job, True, error=error, **values)
+
+    def to_dict(self, job: AnalysisJob) -> dict:
+        return {
+            "id": job.id,
+            "status": job.status,
+            "attempts": job.attempts,
+            "analysis_id": job.analysis_id,
+            "image_url": job.image_url,
+            "thumbnail_url": storage_service.thumbnail_url(job.image_url),
+            "result": job.result,
+            "error": job.error if job.status == "failed" else None,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+job_queue = JobQueue()
+
+class JobWorkerPool:
+    """Bounded pool of in-process workers draining the analysis queue."""
+
+    def __init__(self, queue: JobQueue = job_queue):
+        self.queue = queue
+        self.worker_prefix = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    def start(self, workers: Optional[int] = None) -> None:
+        self._stopping = False
+        for i in range(workers or settings.JOB_WORKERS):
+            self._tasks.append(asyncio.ensure_future(self._run(f"{self.worker_prefix}-{i}")))
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Stop claiming new jobs and give in-flight ones time to finish."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                # Their leases lapse and another worker retries the jobs
+                task.cancel()
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wake idle workers after an enqueue instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    async def _run(self, worker_id: str) -> None:
+        while not self._stopping:
+            try:
+                job = await run_in_threadpool(self._claim, worker_id)
+            except Exception as e:
+                logger.error(f"Job claim failed: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._process(job)
+
+    def _claim(self, worker_id: str) -> Optional[AnalysisJob]:
+        db = SessionLocal()
+        try:
+            job = self.queue.claim(db, worker_id)
+            if job is not None:
+                db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    async def _process(self, job: AnalysisJob) -> None:
+        db = SessionLocal()
+        try:
+            job = db.merge(job)
+            try:
+                key = storage_service.backend.key_from_url(job.image_url)
+                if key is None:
+                    raise ValueError("Image is not in media storage")
+                image_bytes = await run_in_threadpool(storage_service.backend.get_bytes, key)
+                # Queued jobs have already been admitted: wait for a slot rather than shed
+                tier = PREMIUM if job.priority == PREMIUM_PRIORITY else FREE
+                detection = await inference_scheduler.run(
+                    tier, face_analysis_service.landmarks_from_bytes, image_bytes, shed=False
+                )
+            except ValueError as e:
+                # Bad image or no face: retrying won't help
+                recorded = await run_in_threadpool(self.queue.fail, db, job, str(e), False)
+            except Exception as e:
+                logger.error(f"Analysis job {job.id} failed: {str(e)}")
+                recorded = await run_in_threadpool(self.queue.fail, db, job, str(e))
+            else:
+                result = face_analysis_service.score([detection])[0]
+                # The analysis commits only together with the fenced completion
+                recorded = await run_in_threadpool(
+                    save_analyses, db, job.user_id, [result], [job.image_url], [detection.landmarks],
+                    [detection.skin_clarity], lambda ids: self.queue.complete(db, job, ids[0], result, commit=False),
+                )
+
+            if not recorded:
+                logger.warning(f"Analysis job {job.id} was reclaimed by another worker; dropped this attempt")
+                return
+            await run_in_threadpool(db.refresh, job)
+            if job.status in ("succeeded", "failed"):
+                await websocket_service.broadcast({
+                    "type": "analysis_update",
+                    "data": self.queue.to_dict(job),
+                }, str(job.user_id))
+        except Exception as e:
+            logger.error(f"Analysis job {job.id} could not be recorded: {str(e)}")
+        finally:
+            db.close()
+
+job_worker_pool = JobWorkerPool()
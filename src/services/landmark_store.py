@@ -0,0 +1,145 @@
+import argparse
+import logging
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+from .scoring import Scorer, scorer_registry
+from ..models.analysis import Analysis, AnalysisLandmarks
+from ..models.base import get_db_context
+
+logger = logging.getLogger(__name__)
+
+# int16 codes span the face's bounding square; for a 2000px face one step is ~0.03px
+QUANT_STEPS = 65535
+QUANT_OFFSET = 32768
+POINT_DTYPE = np.dtype("<i2")
+
+def encode_landmarks(points: np.ndarray) -> Tuple[float, float, float, bytes]:
+    """Quantize (N, 2) pixel landmarks to int16 within their bounding square."""
+    points = np.asarray(points, dtype=np.float64)
+    origin = points.min(axis=0)
+    scale = float(max((points.max(axis=0) - origin).max(), 1e-6))
+    codes = np.rint((points - origin) / scale * QUANT_STEPS) - QUANT_OFFSET
+    return float(origin[0]), float(origin[1]), scale, codes.astype(POINT_DTYPE).tobytes()
+
+def decode_batch(origins: np.ndarray, scales: np.ndarray, blobs: Sequence[bytes], count: int) -> np.ndarray:
+    """Dequantize equally sized blobs into a (B, count, 2) array of pixel coordinates."""
+    codes = np.frombuffer(b"".join(blobs), dtype=POINT_DTYPE).reshape(len(blobs), count, 2)
+    return (
+        (codes.astype(np.float64) + QUANT_OFFSET) / QUANT_STEPS * np.asarray(scales)[:, None, None]
+        + np.asarray(origins)[:, None, :]
+    )
+
+def landmark_rows(analysis_ids: Sequence[int], landmarks: Sequence[np.ndarray], skin: Sequence[float]) -> List[Dict]:
+    """Side-table rows for a bulk insert."""
+    rows = []
+    for analysis_id, points, skin_clarity in zip(analysis_ids, landmarks, skin):
+        origin_x, origin_y, scale, blob = encode_landmarks(points)
+        rows.append({
+            "analysis_id": analysis_id,
+            "landmark_count": len(points),
+            "origin_x": origin_x,
+            "origin_y": origin_y,
+            "scale": scale,
+            "points": blob,
+            # Unmeasured skin stays NULL so rescoring applies the scorer's default
+            "skin_clarity": None if skin_clarity is None or np.isnan(skin_clarity) else float(skin_clarity),
+        })
+    return rows
+
+def save_landmarks(db: Session, analysis_ids: Sequence[int], landmarks: Sequence[np.ndarray], skin: Sequence[float]) -> None:
+    """Insert the side-table rows with one statement; the caller commits."""
+    if analysis_ids:
+        db.execute(insert(AnalysisLandmarks), landmark_rows(analysis_ids, landmarks, skin))
+
+def load_landmarks(db: Session, analysis_id: int) -> Optional[np.ndarray]:
+    """One analysis's landmarks as an (N, 2) array, or None if none were stored."""
+    row = db.get(AnalysisLandmarks, analysis_id)
+    if row is None:
+        return None
+    return decode_batch(np.array([[row.origin_x, row.origin_y]]), np.array([row.scale]), [row.points], row.landmark_count)[0]
+
+def iter_landmark_batches(db: Session, batch_size: int, after_id: int = 0) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """Stream (analysis_ids, user_ids, (B, N, 2) landmarks, skin clarity) in id order with keyset pagination."""
+    columns = (
+        AnalysisLandmarks.analysis_id,
+        Analysis.user_id,
+        AnalysisLandmarks.landmark_count,
+        AnalysisLandmarks.origin_x,
+        AnalysisLandmarks.origin_y,
+        AnalysisLandmarks.scale,
+        AnalysisLandmarks.points,
+        AnalysisLandmarks.skin_clarity,
+    )
+    while True:
+        rows = db.execute(
+            select(*columns)
+            .join(Analysis, Analysis.id == AnalysisLandmarks.analysis_id)
+            .where(AnalysisLandmarks.analysis_id > after_id)
+            .order_by(AnalysisLandmarks.analysis_id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        after_id = rows[-1][0]
+        ids, user_ids, counts, origin_x, origin_y, scales, blobs, skin = zip(*rows)
+        ids = np.array(ids)
+        user_ids = np.array(user_ids)
+        counts = np.array(counts)
+        origins = np.stack([origin_x, origin_y], axis=1)
+        skin = np.array([np.nan if value is None else value for value in skin])
+        # Meshes of different sizes (e.g. with or without iris points) decode separately
+        for count in np.unique(counts):
+            group = np.flatnonzero(counts == count)
+            yield (
+                ids[group],
+                user_ids[group],
+                decode_batch(origins[group], np.array(scales)[group], [blobs[i] for i in group], int(count)),
+                skin[group],
+            )
+
+def rescore(db: Session, scorer: Scorer, batch_size: int = 10000, dry_run: bool = False) -> int:
+    """Recompute stored analyses' scores from their landmarks with scorer; returns how many."""
+    total = 0
+    started = time.monotonic()
+    for ids, _, landmarks, skin in iter_landmark_batches(db, batch_size):
+        skin = np.where(np.isnan(skin), scorer.default_skin_clarity, skin)
+        faces = scorer.split(scorer.score(landmarks, skin))
+        if not dry_run:
+            db.execute(update(Analysis), [{
+                "id": int(analysis_id),
+                "symmetry_score": scores["symmetry"],
+                "jawline_score": scores["jawline"],
+                "facial_ratio_score": scores["facial_ratio"],
+                "skin_clarity_score": scores["skin_clarity"],
+                "overall_score": scores["overall"],
+                "improvement_tips": scorer.improvement_tips(scores),
+                "scorer_version": scorer.version,
+            } for analysis_id, scores in zip(ids, faces)])
+            db.commit()
+        total += len(ids)
+        elapsed = time.monotonic() - started
+        logger.info(f"Rescored {total} analyses ({total / max(elapsed, 1e-9):.0f}/s)")
+    return total
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recompute analysis scores from stored landmarks.")
+    parser.add_argument("--version", help="Scorer version to apply (default: the active one)")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--dry-run", action="store_true", help="Score without writing anything")
+    args = parser.parse_args()
+
+    scorer_registry.refresh_if_changed()
+    scorer = scorer_registry.get(args.version) if args.version else scorer_registry.active
+    with get_db_context() as db:
+        total = rescore(db, scorer, args.batch_size, args.dry_run)
+    logger.info(f"Rescored {total} analyses with scorer {scorer.version}")
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
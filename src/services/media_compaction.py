@@ -0,0 +1,83 @@
+import hashlib
+import logging
+from typing import Dict
+from sqlalchemy.orm import Session
+from .storage import StorageService, storage_service, sniff_image_type, content_key, CONTENT_KEY_PATTERN
+from ..models.analysis import Analysis
+from ..models.base import get_db_context
+from ..models.job import PENDING_STATUSES, AnalysisJob
+
+logger = logging.getLogger(__name__)
+
+def compact_media(db: Session, storage: StorageService = storage_service) -> Dict[str, int]:
+    """Move legacy uuid-named media to content-addressed keys, deduplicating as it goes.
+
+    For each legacy image referenced by an analysis or an unfinished job, the
+    content is hashed and written to its content key unless an identical
+    image is already there. Referencing rows are repointed and committed
+    before the legacy object is removed, so a crash mid-run never leaves a row
+    pointing at nothing. A job already running on the old URL fails to read
+    it and is retried with the new one.
+    """
+    backend = storage.backend
+    stats = {"scanned": 0, "migrated": 0, "deduplicated": 0, "bytes_freed": 0, "missing": 0}
+
+    urls = sorted(
+        {url for (url,) in db.query(Analysis.image_url).filter(Analysis.image_url.isnot(None))}
+        | {url for (url,) in db.query(AnalysisJob.image_url).filter(AnalysisJob.status.in_(PENDING_STATUSES))}
+    )
+    for url in urls:
+        key = backend.key_from_url(url)
+        if key is None or CONTENT_KEY_PATTERN.match(key):
+            continue
+        stats["scanned"] += 1
+
+        if not backend.exists(key):
+            stats["missing"] += 1
+            logger.warning(f"Analysis image missing from storage: {url}")
+            continue
+
+        data = backend.get_bytes(key)
+        content_type = sniff_image_type(data[:16])
+        if content_type is None:
+            logger.warning(f"Skipping non-image media object: {key}")
+            continue
+
+        new_key = content_key(hashlib.sha256(data).hexdigest(), content_type)
+        # Like an upload: a concurrent delete_image can't take new_key while the rows move to it
+        storage.claim(db, new_key)
+        if backend.exists(new_key):
+            stats["deduplicated"] += 1
+            stats["bytes_freed"] += len(data)
+        else:
+            backend.put_bytes(data, new_key, content_type)
+            stats["migrated"] += 1
+            try:
+                storage.thumbnails.generate_sync(new_key)
+            except Exception as e:
+                logger.warning(f"Thumbnail generation failed for {new_key}: {str(e)}")
+
+        new_url = backend.url(new_key)
+        db.query(Analysis).filter(Analysis.image_url == url).update(
+            {Analysis.image_url: new_url},
+            synchronize_session=False,
+        )
+        db.query(AnalysisJob).filter(
+            AnalysisJob.image_url == url,
+            AnalysisJob.status.in_(PENDING_STATUSES),
+        ).update({AnalysisJob.image_url: new_url}, synchronize_session=False)
+        db.commit()
+
+        backend.delete(key)
+        storage.thumbnails.delete_derivatives(key)
+
+    logger.info(f"Media compaction finished: {stats}")
+    return stats
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    with get_db_context() as db:
+        compact_media(db)
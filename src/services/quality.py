@@ -0,0 +1,84 @@
+from collections import namedtuple
+from typing import Dict, List
+import cv2
+import numpy as np
+
+REJECT = "reject"
+WARN = "warn"
+
+QualityIssue = namedtuple("QualityIssue", ["code", "severity", "message", "value"])
+
+# The gate looks at a grey copy with this longest side; thresholds below are tuned for it
+GATE_SIZE = 256
+
+MIN_IMAGE_SIDE = 128
+BLUR_REJECT = 15.0  # Laplacian variance
+BLUR_WARN = 50.0
+DARK_REJECT, DARK_WARN = 35.0, 60.0  # mean brightness
+BRIGHT_REJECT, BRIGHT_WARN = 225.0, 200.0
+CLIPPED_REJECT, CLIPPED_WARN = 0.5, 0.25  # fraction of pixels at either end of the histogram
+LOW_CONTRAST_WARN = 40.0  # spread between the 5th and 95th percentile
+
+MIN_FACE_SIDE = 64
+# Nose offset from the eye midline, relative to eye distance: a rough yaw estimate
+YAW_REJECT, YAW_WARN = 0.45, 0.25
+
+class QualityError(ValueError):
+    """Raised when an image fails the quality gate; issues says why."""
+
+    def __init__(self, issues: List[QualityIssue]):
+        self.issues = issues
+        super().__init__("; ".join(issue.message for issue in issues))
+
+    def __reduce__(self):
+        # Rebuild from the issues, not the message, when sent back from a worker process
+        return type(self), (self.issues,)
+
+def issue_dicts(issues: List[QualityIssue]) -> List[Dict]:
+    return [issue._asdict() for issue in issues]
+
+def _grade(code: str, value: float, reject: bool, warn: bool, message: str) -> List[QualityIssue]:
+    if reject:
+        return [QualityIssue(code, REJECT, message, round(float(value), 3))]
+    if warn:
+        return [QualityIssue(code, WARN, message, round(float(value), 3))]
+    return []
+
+def assess_image(image: np.ndarray) -> List[QualityIssue]:
+    """Cheap whole-image checks (size, blur, exposure) run before any model."""
+    height, width = image.shape[:2]
+    if min(height, width) < MIN_IMAGE_SIDE:
+        return [QualityIssue("too_small", REJECT, f"Image is smaller than {MIN_IMAGE_SIDE}px", min(height, width))]
+
+    scale = GATE_SIZE / max(height, width)
+    small = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    sharpness = cv2.Laplacian(gray, cv2.CV_32F).var()
+    histogram = np.bincount(gray.ravel(), minlength=256) / gray.size
+    cumulative = np.cumsum(histogram)
+    brightness = float(np.dot(histogram, np.arange(256)))
+    clipped = float(histogram[:6].sum() + histogram[250:].sum())
+    spread = float(np.searchsorted(cumulative, 0.95) - np.searchsorted(cumulative, 0.05))
+
+    return (
+        _grade("blurry", sharpness, sharpness < BLUR_REJECT, sharpness < BLUR_WARN, "Image is blurry")
+        + _grade("too_dark", brightness, brightness < DARK_REJECT, brightness < DARK_WARN, "Image is too dark")
+        + _grade("too_bright", brightness, brightness > BRIGHT_REJECT, brightness > BRIGHT_WARN, "Image is overexposed")
+        + _grade("clipped", clipped, clipped > CLIPPED_REJECT, clipped > CLIPPED_WARN, "Large areas are pure black or white")
+        + _grade("low_contrast", spread, False, spread < LOW_CONTRAST_WARN, "Image has very low contrast")
+    )
+
+def assess_face(box: np.ndarray, right_eye: np.ndarray, left_eye: np.ndarray, nose: np.ndarray) -> List[QualityIssue]:
+    """Per-face checks from detector output, run before the mesh."""
+    side = float(min(box[2], box[3]))
+    if side < MIN_FACE_SIDE:
+        return [QualityIssue("face_too_small", REJECT, f"Face is smaller than {MIN_FACE_SIDE}px", side)]
+
+    axis = left_eye - right_eye
+    eye_distance = float(np.linalg.norm(axis))
+    if eye_distance == 0:
+        return [QualityIssue("off_angle", REJECT, "Face is turned too far from the camera", 1.0)]
+    # Signed distance of the nose along the eye axis from the eye midpoint
+    yaw = abs(float(np.dot(nose - (left_eye + right_eye) / 2, axis))) / eye_distance ** 2
+    return _grade("off_angle", yaw, yaw > YAW_REJECT, yaw > YAW_WARN, "Face is turned too far from the camera")
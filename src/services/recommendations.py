@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from .catalog import catalog_signature, on_catalog_change
+from ..config.settings import get_settings
+from ..models.analysis import ExerciseRecommendation
+from ..models.exercise import Exercise
+
+settings = get_settings()
+
+# Score keys, which double as Exercise.category values
+SCORE_CATEGORIES = ("symmetry", "jawline", "facial_ratio", "skin_clarity")
+DIFFICULTIES = ("easy", "medium", "hard")
+
+# Difficulty -> lookup order: the same level first, then the nearest ones
+DIFFICULTY_FALLBACKS = {
+    level: tuple(sorted(DIFFICULTIES, key=lambda d: (abs(DIFFICULTIES.index(d) - i), DIFFICULTIES.index(d))))
+    for i, level in enumerate(DIFFICULTIES)
+}
+
+# Scores at or above this need no exercises for that category
+TARGET_SCORE = 85.0
+
+ExerciseEntry = namedtuple("ExerciseEntry", ["id", "name", "difficulty", "duration_minutes"])
+Recommendation = namedtuple("Recommendation", ["exercise_id", "name", "priority", "reason"])
+
+def difficulty_for_score(score: float) -> str:
+    """Weak areas start easy; near-target areas get the harder refinements."""
+    if score < 60:
+        return "easy"
+    if score < 75:
+        return "medium"
+    return "hard"
+
+class RecommendationService:
+    """Ranks exercises for an analysis from an in-memory catalog index.
+
+    The catalog is loaded once into ranked lists keyed by (category,
+    difficulty), each already extended with the nearest other difficulties,
+    so ranking a score vector is a handful of dict lookups with no queries.
+    Exercise inserts/updates/deletes in this process mark the index stale;
+    changes made by other processes are picked up by a cheap signature check
+    every CATALOG_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self._index: Dict[Tuple[str, str], Tuple[ExerciseEntry, ...]] = {}
+        self._signature: Optional[Tuple] = None
+        self._checked_at = 0.0
+        self._stale = True
+        self._lock = threading.Lock()
+
+        on_catalog_change(self._mark_stale)
+
+    def _mark_stale(self) -> None:
+        self._stale = True
+
+    def load(self, db: Session) -> None:
+        """(Re)build the index from the exercises table."""
+        index: Dict[Tuple[str, str], List[ExerciseEntry]] = {}
+        rows = db.query(
+            Exercise.id, Exercise.name, Exercise.category, Exercise.difficulty, Exercise.duration_minutes
+        ).order_by(Exercise.duration_minutes, Exercise.id)
+        for id, name, category, difficulty, duration in rows:
+            index.setdefault((category, difficulty), []).append(
+                ExerciseEntry(id, name, difficulty, duration)
+            )
+
+        # Precompute each (category, difficulty) list with its fallbacks appended
+        ranked = {
+            (category, difficulty): tuple(
+                entry
+                for level in DIFFICULTY_FALLBACKS[difficulty]
+                for entry in index.get((category, level), ())
+            )
+            for category in {category for category, _ in index}
+            for difficulty in DIFFICULTIES
+        }
+
+        with self._lock:
+            self._index = ranked
+            self._signature = catalog_signature(db)
+            self._checked_at = time.monotonic()
+            self._stale = False
+
+    def refresh_if_changed(self, db: Session) -> None:
+        """Reload when the catalog changed here or, periodically, elsewhere."""
+        if self._stale:
+            self.load(db)
+            return
+        if time.monotonic() - self._checked_at < settings.CATALOG_REFRESH_SECONDS:
+            return
+        if catalog_signature(db) != self._signature:
+            self.load(db)
+        else:
+            self._checked_at = time.monotonic()
+
+    def recommend(self, scores: Dict[str, float], limit: int = 5, per_category: int = 2) -> List[Recommendation]:
+        """Rank exercises for a score vector, weakest category first."""
+        deficits = sorted(
+            (
+                (TARGET_SCORE - scores[category], category)
+                for category in SCORE_CATEGORIES
+                if scores.get(category) is not None and scores[category] < TARGET_SCORE
+            ),
+            reverse=True,
+        )
+
+        recommendations: List[Recommendation] = []
+        for _, category in deficits:
+            score = scores[category]
+            label = category.replace("_", " ")
+            for entry in self._index.get((category, difficulty_for_score(score)), ())[:per_category]:
+                recommendations.append(Recommendation(
+                    exercise_id=entry.id,
+                    name=entry.name,
+                    priority=len(recommendations) + 1,
+                    reason=f"{label.capitalize()} score {score:.0f} is below {TARGET_SCORE:.0f}",
+                ))
+                if len(recommendations) >= limit:
+                    return recommendations
+        return recommendations
+
+    def recommend_for_analysis(self, db: Session, analysis_id: int, scores: Dict[str, float], limit: int = 5) -> List[Recommendation]:
+        """Rank exercises for an analysis and store them with one bulk insert."""
+        return self.recommend_for_analyses(db, [analysis_id], [scores], limit=limit)[0]
+
+    def recommend_for_analyses(
+        self,
+        db: Session,
+        analysis_ids: Sequence[int],
+        scores: Sequence[Dict[str, float]],
+        limit: int = 5,
+    ) -> List[List[Recommendation]]:
+        """Rank exercises for each analysis and store them all with one bulk insert; the caller commits."""
+        self.refresh_if_changed(db)
+        ranked = [self.recommend(face_scores, limit=limit) for face_scores in scores]
+        rows = [
+            {
+                "analysis_id": analysis_id,
+                "exercise_id": rec.exercise_id,
+                "priority": rec.priority,
+                "reason": rec.reason,
+            }
+            for analysis_id, recommendations in zip(analysis_ids, ranked)
+            for rec in recommendations
+        ]
+        if rows:
+            db.execute(insert(ExerciseRecommendation), rows)
+        return ranked
+
+recommendation_service = RecommendationService()
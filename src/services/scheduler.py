@@ -0,0 +1,238 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional
+from fastapi import HTTPException
+from .face_analysis import face_analysis_service
+from ..config.settings import get_settings
+
+settings = get_settings()
+
+PREMIUM = "premium"
+FREE = "free"
+
+# How many recent waits per tier feed the percentiles in snapshot()
+WAIT_SAMPLES = 1024
+
+class Overloaded(HTTPException):
+    """Raised when a tier's expected queue wait is over its SLO."""
+
+    def __init__(self, tier: str, expected_wait: float):
+        super().__init__(
+            status_code=503,
+            detail=f"Analysis is busy for {tier} requests, please retry shortly",
+            headers={"Retry-After": str(max(1, round(expected_wait)))},
+        )
+
+class DeadlineExceeded(HTTPException):
+    """Raised when a request's client deadline passes before it gets a slot."""
+
+    def __init__(self):
+        super().__init__(status_code=504, detail="Request deadline passed before analysis could start")
+
+def tier_for(user: Any) -> str:
+    # The legacy models/ package has no is_premium column
+    return PREMIUM if getattr(user, "is_premium", False) else FREE
+
+def deadline_from_timeout(timeout: Optional[float]) -> Optional[float]:
+    """Turn a client's X-Request-Timeout (seconds from now) into a monotonic deadline."""
+    if timeout is None or timeout <= 0:
+        return None
+    return time.monotonic() + timeout
+
+class TierMetrics:
+    def __init__(self):
+        self.admitted = 0
+        self.shed = 0
+        self.expired = 0
+        self.completed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    def record_wait(self, wait: float) -> None:
+        self.admitted += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.waits.append(wait)
+
+    def snapshot(self) -> Dict:
+        waits = sorted(self.waits)
+
+        def percentile(p: float) -> float:
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        return {
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "expired": self.expired,
+            "completed": self.completed,
+            "wait_avg": self.wait_total / self.admitted if self.admitted else 0.0,
+            "wait_p50": percentile(0.5),
+            "wait_p95": percentile(0.95),
+            "wait_max": self.wait_max,
+        }
+
+class InferenceScheduler:
+    """Weighted-fair admission in front of the face analysis workers.
+
+    There are as many slots as inference workers. When slots are busy,
+    requests queue per tier and freed slots go to the backlogged tier with
+    the lowest virtual time, which advances by 1/weight per dispatch, so
+    under contention each tier gets slots in proportion to its weight.
+    New requests are shed when their tier's expected wait exceeds its SLO;
+    the free tier has the tighter SLO so it is shed first. Requests whose
+    client deadline passes while queued are dropped instead of run.
+    """
+
+    def __init__(
+        self,
+        slots: Optional[int] = None,
+        weights: Optional[Dict[str, float]] = None,
+        wait_slo: Optional[Dict[str, float]] = None,
+        executor: Optional[Executor] = None,
+    ):
+        self.slots = slots or settings.ANALYSIS_WORKERS
+        self.weights = weights or {
+            PREMIUM: settings.ANALYSIS_PREMIUM_WEIGHT,
+            FREE: settings.ANALYSIS_FREE_WEIGHT,
+        }
+        self.wait_slo = wait_slo or {
+            PREMIUM: settings.ANALYSIS_PREMIUM_WAIT_SLO,
+            FREE: settings.ANALYSIS_FREE_WAIT_SLO,
+        }
+        self.executor = executor or face_analysis_service.executor
+        self.metrics = {tier: TierMetrics() for tier in self.weights}
+        self._queues: Dict[str, Deque[List]] = {tier: deque() for tier in self.weights}
+        self._virtual = {tier: 0.0 for tier in self.weights}
+        self._clock = 0.0
+        self._running = 0
+        self._service_time = 0.5  # EWMA of seconds per inference, seeded with a guess
+
+    def expected_wait(self, tier: str) -> float:
+        """Estimate how long a new request in tier would queue."""
+        if self._running < self.slots:
+            return 0.0
+        backlogged = sum(weight for t, weight in self.weights.items() if self._queues[t] or t == tier)
+        share = self.weights[tier] / backlogged
+        queue = self._queues[tier]
+        estimate = (len(queue) + 1) / (self.slots * share) * self._service_time
+        # The oldest waiter has already waited at least this long
+        oldest = time.monotonic() - queue[0][2] if queue else 0.0
+        return max(estimate, oldest)
+
+    def check_admission(self, tier: str) -> None:
+        """Shed the request now if its tier is over its wait SLO."""
+        expected = self.expected_wait(tier)
+        if expected > self.wait_slo[tier]:
+            self.metrics[tier].shed += 1
+            raise Overloaded(tier, expected)
+
+    async def acquire(self, tier: str, deadline: Optional[float] = None, shed: bool = True) -> None:
+        now = time.monotonic()
+        if deadline is not None and deadline <= now:
+            self.metrics[tier].expired += 1
+            raise DeadlineExceeded()
+        if self._running < self.slots and not any(self._queues.values()):
+            self._running += 1
+            self.metrics[tier].record_wait(0.0)
+            return
+        if shed:
+            self.check_admission(tier)
+
+        queue = self._queues[tier]
+        if not queue:
+            # Idle tiers don't bank credit while they weren't competing
+            self._virtual[tier] = max(self._virtual[tier], self._clock)
+        future = asyncio.get_running_loop().create_future()
+        waiter = [future, deadline, now]
+        queue.append(waiter)
+        try:
+            await asyncio.wait_for(future, None if deadline is None else deadline - now)
+        except asyncio.TimeoutError:
+            self._abandon(tier, waiter)
+            self.metrics[tier].expired += 1
+            raise DeadlineExceeded()
+        except asyncio.CancelledError:
+            self._abandon(tier, waiter)
+            raise
+
+    def release(self, tier: str, service_time: Optional[float] = None) -> None:
+        self._running -= 1
+        self.metrics[tier].completed += 1
+        if service_time is not None:
+            self._service_time = 0.8 * self._service_time + 0.2 * service_time
+        self._dispatch()
+
+    def _abandon(self, tier: str, waiter: List) -> None:
+        future = waiter[0]
+        if future.done() and not future.cancelled() and future.exception() is None:
+            # Granted a slot just as the caller gave up: hand it on
+            self._running -= 1
+            self._dispatch()
+        elif waiter in self._queues[tier]:
+            self._queues[tier].remove(waiter)
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        while self._running < self.slots:
+            backlogged = [tier for tier, queue in self._queues.items() if queue]
+            if not backlogged:
+                return
+            tier = min(backlogged, key=lambda t: self._virtual[t])
+            future, deadline, enqueued_at = self._queues[tier].popleft()
+            if future.done():
+                continue
+            if deadline is not None and deadline <= now:
+                self.metrics[tier].expired += 1
+                future.set_exception(DeadlineExceeded())
+                continue
+            self._clock = self._virtual[tier]
+            self._virtual[tier] += 1.0 / self.weights[tier]
+            self._running += 1
+            self.metrics[tier].record_wait(now - enqueued_at)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, tier: str, deadline: Optional[float] = None, shed: bool = True):
+        await self.acquire(tier, deadline, shed)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(tier, time.monotonic() - started)
+
+    async def run(self, tier: str, fn: Callable, *args, deadline: Optional[float] = None, shed: bool = True):
+        """Wait for a slot in tier, then run fn on the inference workers."""
+        async with self.slot(tier, deadline, shed):
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait for queued and running inferences to finish; False if timeout ran out first."""
+        deadline = time.monotonic() + timeout
+        while self._running or any(self._queues.values()):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    def snapshot(self) -> Dict:
+        return {
+            "slots": self.slots,
+            "running": self._running,
+            "service_time": self._service_time,
+            "tiers": {
+                tier: {
+                    "weight": self.weights[tier],
+                    "wait_slo": self.wait_slo[tier],
+                    "queued": len(self._queues[tier]),
+                    "expected_wait": self.expected_wait(tier),
+                    **self.metrics[tier].snapshot(),
+                }
+                for tier in self.weights
+            },
+        }
+
+inference_scheduler = InferenceScheduler()
@@ -0,0 +1,222 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from ..config.settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+SCORE_NAMES = ("symmetry", "jawline", "facial_ratio", "skin_clarity")
+
+# The original scoring rules. Config files override these per version.
+DEFAULT_SCORER_CONFIG = {
+    "version": "v1",
+    # Number of landmarks in FaceMesh (478 with refine_landmarks)
+    "min_landmarks": 468,
+    # Left half [:234] is compared with the right half [234:468]
+    "symmetry_split": 234,
+    "symmetry_scale": 100.0,
+    "jawline": [174, 197],
+    "jawline_scale": 10.0,
+    "forehead": 10,
+    "chin": 152,
+    "left_cheek": 234,
+    "right_cheek": 454,
+    # Ideal ratio is around 1.618 (golden ratio)
+    "ideal_ratio": 1.618,
+    # Used when only landmarks are available, e.g. when no image is at hand
+    "default_skin_clarity": 85.0,
+    "overall_weights": {"symmetry": 1.0, "jawline": 1.0, "facial_ratio": 1.0, "skin_clarity": 1.0},
+    "tip_threshold": 70.0,
+    "tips": {
+        "symmetry": "Consider facial symmetry exercises to improve balance",
+        "jawline": "Strengthen jawline muscles with specific exercises",
+        "facial_ratio": "Consider facial exercises to enhance proportions",
+        "skin_clarity": "Follow a consistent skincare routine to improve skin clarity",
+    },
+}
+
+class Scorer:
+    """One immutable scoring version.
+
+    Index tables and thresholds are compiled into read-only arrays when the
+    scorer is built, so scoring a batch is pure array math and a scorer can
+    be shared by any number of in-flight requests.
+    """
+
+    def __init__(self, config: Dict):
+        config = {**DEFAULT_SCORER_CONFIG, **config}
+        split = int(config["symmetry_split"])
+        jaw_start, jaw_stop = config["jawline"]
+        weights = np.array([config["overall_weights"].get(name, 0.0) for name in SCORE_NAMES], dtype=np.float64)
+        if weights.sum() <= 0:
+            raise ValueError(f"Scorer {config['version']}: overall_weights must not all be zero")
+
+        values = {
+            "version": str(config["version"]),
+            "config": json.loads(json.dumps(config)),
+            "min_landmarks": int(config["min_landmarks"]),
+            "left": np.arange(0, split),
+            "right": np.arange(split, 2 * split),
+            "jaw": np.arange(jaw_start, jaw_stop),
+            "ratio_points": np.array([config["forehead"], config["chin"], config["left_cheek"], config["right_cheek"]]),
+            "symmetry_scale": float(config["symmetry_scale"]),
+            "jawline_scale": float(config["jawline_scale"]),
+            "ideal_ratio": float(config["ideal_ratio"]),
+            "default_skin_clarity": float(config["default_skin_clarity"]),
+            "weights": weights / weights.sum(),
+            "tip_threshold": float(config["tip_threshold"]),
+            "tips": tuple((name, config["tips"][name]) for name in SCORE_NAMES if name in config["tips"]),
+        }
+        for name, value in values.items():
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Scorer versions are immutable; register a new version instead")
+
+    def score(self, landmarks: np.ndarray, skin_clarity: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """Score a batch of faces in one vectorized pass.
+
+        landmarks is a (B, N, 2) array of pixel coordinates; every score is
+        returned as a (B,) array on a 0-100 scale. Skin clarity needs the image,
+        so it is measured by the caller (see skin.py) and passed through;
+        without it, or where it is NaN, the neutral default_skin_clarity is used.
+        """
+        landmarks = np.asarray(landmarks, dtype=np.float64)
+        if landmarks.ndim != 3 or landmarks.shape[1] < self.min_landmarks:
+            zeros = np.zeros(len(landmarks))
+            return {name: zeros for name in SCORE_NAMES}
+        if skin_clarity is None:
+            skin_clarity = np.full(len(landmarks), self.default_skin_clarity)
+        skin_clarity = np.asarray(skin_clarity, dtype=np.float64)
+        skin_clarity = np.where(np.isnan(skin_clarity), self.default_skin_clarity, skin_clarity)
+
+        # Symmetry: average distance between corresponding left/right points
+        avg_distance = np.linalg.norm(landmarks[:, self.left] - landmarks[:, self.right], axis=2).mean(axis=1)
+        symmetry = np.clip((1 - avg_distance / self.symmetry_scale) * 100, 0, 100)
+
+        # Jawline: smoothness as the spread of consecutive segment lengths
+        segments = np.linalg.norm(np.diff(landmarks[:, self.jaw], axis=1), axis=2)
+        jawline = np.clip((1 - segments.std(axis=1) / self.jawline_scale) * 100, 0, 100)
+
+        # Facial ratio: face height over width compared with the ideal ratio
+        forehead, chin, left_cheek, right_cheek = np.moveaxis(landmarks[:, self.ratio_points], 1, 0)
+        vertical = np.linalg.norm(forehead - chin, axis=1)
+        horizontal = np.linalg.norm(left_cheek - right_cheek, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = vertical / horizontal
+        facial_ratio = np.nan_to_num(
+            np.clip((1 - np.abs(ratio - self.ideal_ratio) / self.ideal_ratio) * 100, 0, 100)
+        )
+
+        return {
+            "symmetry": symmetry,
+            "jawline": jawline,
+            "facial_ratio": facial_ratio,
+            "skin_clarity": skin_clarity,
+        }
+
+    def improvement_tips(self, scores: Dict[str, float]) -> List[str]:
+        """Generate improvement tips based on scores."""
+        return [tip for name, tip in self.tips if scores.get(name, 100) < self.tip_threshold]
+
+    def split(self, batch_scores: Dict[str, np.ndarray]) -> List[Dict[str, float]]:
+        """Turn batched score arrays into one plain dict per face, with an overall score."""
+        table = np.stack([batch_scores[name] for name in SCORE_NAMES], axis=1)
+        overall = table @ self.weights
+        return [
+            {**dict(zip(SCORE_NAMES, map(float, row))), "overall": float(total)}
+            for row, total in zip(table, overall)
+        ]
+
+class ScorerRegistry:
+    """Scorer versions by name, plus the one new analyses use.
+
+    Callers take `active` once per request and keep that object, so a reload
+    swaps the reference for later requests without touching in-flight ones.
+    A version is immutable: a config that redefines an existing version
+    differently is rejected and the previous scorers stay in place.
+    """
+
+    def __init__(self, config_path: Optional[str] = None):
+        self.config_path = config_path
+        default = Scorer(DEFAULT_SCORER_CONFIG)
+        self._scorers: Dict[str, Scorer] = {default.version: default}
+        self.active = default
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked_at: Optional[float] = None
+
+    def get(self, version: str) -> Scorer:
+        scorer = self._scorers.get(version)
+        if scorer is None:
+            raise KeyError(f"Unknown scorer version: {version}")
+        return scorer
+
+    def versions(self) -> List[str]:
+        return list(self._scorers)
+
+    def load(self, config: Dict) -> None:
+        """Register the scorers in a config and switch to its active version, all or nothing."""
+        scorers = dict(self._scorers)
+        for entry in config.get("scorers", []):
+            scorer = Scorer(entry)
+            existing = scorers.get(scorer.version)
+            if existing is not None and existing.config != scorer.config:
+                raise ValueError(f"Scorer {scorer.version} already exists with different settings")
+            scorers.setdefault(scorer.version, scorer)
+        active = config.get("active", self.active.version)
+        if active not in scorers:
+            raise ValueError(f"Active scorer {active} is not defined")
+        self._scorers = scorers
+        self.active = scorers[active]
+
+    def refresh_if_changed(self) -> None:
+        """Reload the config file if it changed; checked at most every SCORER_RELOAD_SECONDS."""
+        if not self.config_path:
+            return
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < settings.SCORER_RELOAD_SECONDS:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < settings.SCORER_RELOAD_SECONDS:
+                return
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.config_path).st_mtime
+                if mtime == self._mtime:
+                    return
+                with open(self.config_path) as f:
+                    self.load(json.load(f))
+                self._mtime = mtime
+                logger.info(f"Scorer config loaded, active version {self.active.version}")
+            except Exception as e:
+                # Keep serving with the scorers we already have
+                logger.error(f"Scorer config reload failed: {str(e)}")
+
+scorer_registry = ScorerRegistry(settings.SCORER_CONFIG_PATH)
+
+def score_landmarks(landmarks: np.ndarray, skin_clarity: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """Score a batch with the active scorer."""
+    return scorer_registry.active.score(landmarks, skin_clarity)
+
+def improvement_tips(scores: Dict[str, float]) -> List[str]:
+    return scorer_registry.active.improvement_tips(scores)
+
+def split_scores(batch_scores: Dict[str, np.ndarray]) -> List[Dict[str, float]]:
+    return scorer_registry.active.split(batch_scores)
+
+def face_boxes(landmarks: np.ndarray) -> np.ndarray:
+    """Axis-aligned bounding boxes of a (B, N, 2) batch as (B, 4) rows of x, y, width, height."""
+    landmarks = np.asarray(landmarks)
+    if not landmarks.size:
+        return np.zeros((len(landmarks), 4))
+    low = landmarks.min(axis=1)
+    high = landmarks.max(axis=1)
+    return np.concatenate([low, high - low], axis=1)
@@ -0,0 +1,428 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from .landmark_store import iter_landmark_batches
+from ..config.settings import get_settings
+from ..models.base import get_db_context
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Iris points (468+) only exist with refine_landmarks, so vectors use the base mesh
+MESH_POINTS = 468
+VECTOR_DIM = 2 * MESH_POINTS
+# Outer eye corners; the line between them is rotated level
+EYE_CORNERS = (33, 263)
+
+PQ_CODES = 256  # one uint8 code per subspace
+TRAIN_SAMPLE = 20000
+LOAD_BATCH_SIZE = 10000
+
+Neighbour = namedtuple("Neighbour", ["analysis_id", "user_id", "similarity"])
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+def landmark_vectors(landmarks: np.ndarray, mean_shape: Optional[np.ndarray] = None) -> np.ndarray:
+    """Normalize (B, N, 2) landmarks for position, roll and scale into unit (B, VECTOR_DIM) vectors.
+
+    Every face is mostly the average face, so aligned shapes alone are all
+    about 0.99 alike. With mean_shape (the mean of aligned shapes) that is
+    subtracted first, and the dot product of two vectors is the cosine
+    similarity of how each face departs from the average.
+    """
+    points = np.asarray(landmarks, dtype=np.float64)[:, :MESH_POINTS]
+    points = points - points.mean(axis=1, keepdims=True)
+    eyes = points[:, EYE_CORNERS[1]] - points[:, EYE_CORNERS[0]]
+    angle = np.arctan2(eyes[:, 1], eyes[:, 0])
+    cos, sin = np.cos(angle), np.sin(angle)
+    rotation = np.stack([np.stack([cos, -sin], axis=-1), np.stack([sin, cos], axis=-1)], axis=-2)
+    vectors = _unit((points @ rotation).reshape(len(points), -1))
+    if mean_shape is None:
+        return vectors
+    return _unit(vectors - mean_shape)
+
+def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (L2) for every row of data."""
+    return ((centroids * centroids).sum(axis=1) - 2 * data @ centroids.T).argmin(axis=1)
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means; returns (k, dim) centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assign = _nearest(data, centroids)
+        order = np.argsort(assign, kind="stable")
+        clusters, starts, counts = np.unique(assign[order], return_index=True, return_counts=True)
+        centroids[clusters] = np.add.reduceat(data[order], starts, axis=0) / counts[:, None]
+        # Clusters that lost every point restart from a random one
+        empty = np.setdiff1d(np.arange(k), clusters)
+        centroids[empty] = data[rng.choice(len(data), len(empty))]
+    return centroids
+
+def _top_k(scores: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Best k (ids, scores) per row of a (Q, M) score matrix, padded with -1 / -inf."""
+    queries, count = scores.shape
+    if count > k:
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        best = np.broadcast_to(np.arange(count), (queries, count))
+    top = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-top, axis=1, kind="stable")
+    best = np.take_along_axis(best, order, axis=1)
+    top_ids = np.full((queries, k), -1, dtype=np.int64)
+    top_scores = np.full((queries, k), -np.inf, dtype=np.float32)
+    top_ids[:, :best.shape[1]] = ids[best]
+    top_scores[:, :best.shape[1]] = np.take_along_axis(top, order, axis=1)
+    return top_ids, top_scores
+
+class _Rows:
+    """Append-only array with amortized growth, so inserts don't copy the whole index."""
+
+    def __init__(self, shape: Tuple[int, ...], dtype):
+        self._data = np.empty((64, *shape), dtype=dtype)
+        self.size = 0
+
+    def append(self, rows: np.ndarray) -> None:
+        needed = self.size + len(rows)
+        if needed > len(self._data):
+            grown = np.empty((max(needed, 2 * len(self._data)), *self._data.shape[1:]), dtype=self._data.dtype)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:needed] = rows
+        self.size = needed
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._data[:self.size]
+
+class FlatIndex:
+    """Exact search: one matrix product against every stored vector."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._ids = _Rows((), np.int64)
+        self._vectors = _Rows((dim,), np.float32)
+
+    def __len__(self) -> int:
+        return self._ids.size
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        self._ids.append(ids)
+        self._vectors.append(vectors)
+
+    def items(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self._ids.view, self._vectors.view
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (ids, cosine similarities) for each query vector."""
+        return _top_k(queries @ self._vectors.view.T, self._ids.view, k)
+
+class IVFPQIndex:
+    """Approximate search for large collections.
+
+    Vectors are projected onto their top principal components (face shapes
+    vary along far fewer directions than there are coordinates), bucketed by
+    the nearest coarse centroid, and only the residual from it is kept,
+    product-quantized to one byte per subspace. A query scans its nprobe
+    closest buckets, scoring codes through per-bucket distance tables
+    instead of reconstructing vectors. For unit vectors, squared distance d
+    maps back to cosine similarity as 1 - d / 2.
+    """
+
+    def __init__(self, dim: int, components: int, lists: int, subspaces: int, nprobe: int):
+        if components % subspaces:
+            raise ValueError(f"{subspaces} subspaces do not divide {components} components")
+        self.dim = dim
+        self.components = components
+        self.lists = lists
+        self.subspaces = subspaces
+        self.nprobe = nprobe
+        self.mean: Optional[np.ndarray] = None
+        self.projection: Optional[np.ndarray] = None  # (dim, components)
+        self.centroids: Optional[np.ndarray] = None
+        self.codebooks: Optional[np.ndarray] = None  # (subspaces, PQ_CODES, components // subspaces)
+        self._buckets = [(_Rows((), np.int64), _Rows((subspaces,), np.uint8)) for _ in range(lists)]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _project(self, vectors: np.ndarray) -> np.ndarray:
+        return ((vectors - self.mean) @ self.projection).astype(np.float32)
+
+    def train(self, vectors: np.ndarray, seed: int = 0) -> None:
+        """Learn the projection, coarse centroids and residual codebooks from a sample of vectors."""
+        if len(vectors) < max(self.lists, PQ_CODES):
+            raise ValueError(f"Need at least {max(self.lists, PQ_CODES)} vectors to train")
+        rng = np.random.default_rng(seed)
+        if len(vectors) > TRAIN_SAMPLE:
+            vectors = vectors[rng.choice(len(vectors), TRAIN_SAMPLE, replace=False)]
+        vectors = vectors.astype(np.float64)
+        self.mean = vectors.mean(axis=0)
+        centered = vectors - self.mean
+        # eigh sorts ascending; keep the largest components
+        _, eigenvectors = np.linalg.eigh(centered.T @ centered)
+        self.projection = eigenvectors[:, ::-1][:, :self.components].copy()
+
+        projected = self._project(vectors)
+        centroids = kmeans(projected, self.lists, seed=seed)
+        residuals = projected - centroids[_nearest(projected, centroids)]
+        self.codebooks = np.stack([
+            kmeans(part, PQ_CODES, seed=seed) for part in np.split(residuals, self.subspaces, axis=1)
+        ])
+        self.centroids = centroids
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(residuals), self.subspaces), dtype=np.uint8)
+        for j, part in enumerate(np.split(residuals, self.subspaces, axis=1)):
+            codes[:, j] = _nearest(part, self.codebooks[j])
+        return codes
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        projected = self._project(vectors)
+        assign = _nearest(projected, self.centroids)
+        codes = self._encode(projected - self.centroids[assign])
+        for bucket in np.unique(assign):
+            rows = assign == bucket
+            bucket_ids, bucket_codes = self._buckets[bucket]
+            bucket_ids.append(ids[rows])
+            bucket_codes.append(codes[rows])
+        self._size += len(ids)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k (ids, cosine similarities) for each query vector."""
+        projected = self._project(queries)
+        distances = (self.centroids * self.centroids).sum(axis=1) - 2 * projected @ self.centroids.T
+        probes = np.argsort(distances, axis=1)[:, :self.nprobe]
+        subspaces = np.arange(self.subspaces)
+
+        top_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        top_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, buckets in enumerate(probes):
+            ids, scores = [], []
+            for bucket in buckets:
+                bucket_ids, bucket_codes = self._buckets[bucket]
+                if not bucket_ids.size:
+                    continue
+                # tables[j, c]: squared distance from the query's j-th residual subvector to code c
+                residual = (projected[q] - self.centroids[bucket]).reshape(self.subspaces, 1, -1)
+                tables = ((residual - self.codebooks) ** 2).sum(axis=2)
+                ids.append(bucket_ids.view)
+                scores.append(1 - tables[subspaces, bucket_codes.view].sum(axis=1) / 2)
+            if ids:
+                top_ids[q], top_scores[q] = (
+                    row[0] for row in _top_k(np.concatenate(scores)[None], np.concatenate(ids), k)
+                )
+        return top_ids, top_scores
+
+class SimilarityIndex:
+    """Stored analyses searchable by face shape.
+
+    Loaded from the persisted landmarks (see landmark_store.py) and kept
+    current by save_analyses. Vectors are taken relative to a mean shape,
+    fixed from the stored faces at load, or from the first
+    SIMILARITY_MEAN_MIN_SIZE faces added after an empty load. Until then
+    similarities barely tell faces apart, so no duplicates are flagged.
+
+    Search is exact while the collection is small; once it reaches
+    SIMILARITY_IVF_MIN_SIZE vectors it is retrained into an IVFPQIndex,
+    which keeps ~40 bytes per face instead of ~3.7 KB. Past the load that
+    training runs in a background thread while searches keep using the
+    exact index; rows added meanwhile are carried over at the swap.
+
+    Under gunicorn the master loads it before forking (see server.preload),
+    so workers share the loaded arrays copy-on-write. Each worker then adds
+    its own analyses at once and, through sync(), those of other workers
+    once SIMILARITY_SYNC_SECONDS have passed since it last looked.
+    """
+
+    def __init__(self):
+        self._index = None
+        self._owners: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.mean_shape: Optional[np.ndarray] = None
+        self._upgrade_thread: Optional[threading.Thread] = None
+        # Highest analysis id read from the database, and when to read past it again
+        self._synced_id = 0
+        self._next_sync = 0.0
+        self.duplicates_found = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    def _needs_upgrade(self, index) -> bool:
+        return isinstance(index, FlatIndex) and len(index) >= settings.SIMILARITY_IVF_MIN_SIZE
+
+    def _train(self, ids: np.ndarray, vectors: np.ndarray) -> IVFPQIndex:
+        started = time.monotonic()
+        upgraded = IVFPQIndex(
+            VECTOR_DIM,
+            settings.SIMILARITY_PCA_COMPONENTS,
+            settings.SIMILARITY_IVF_LISTS,
+            settings.SIMILARITY_PQ_SUBSPACES,
+            settings.SIMILARITY_NPROBE,
+        )
+        upgraded.train(vectors)
+        upgraded.add(ids, vectors)
+        logger.info(f"Similarity index switched to IVF-PQ at {len(ids)} vectors in {time.monotonic() - started:.1f}s")
+        return upgraded
+
+    def _start_upgrade(self) -> None:
+        """Retrain into an IVFPQIndex in the background; call with the lock held."""
+        if not self._needs_upgrade(self._index) or (self._upgrade_thread and self._upgrade_thread.is_alive()):
+            return
+        flat = self._index
+        # Views of rows already written; later appends don't touch them
+        ids, vectors = flat.items()
+
+        def run():
+            try:
+                upgraded = self._train(ids, vectors)
+                with self._lock:
+                    if self._index is not flat:
+                        return
+                    all_ids, all_vectors = flat.items()
+                    if len(all_ids) > len(ids):
+                        upgraded.add(all_ids[len(ids):], all_vectors[len(ids):])
+                    self._index = upgraded
+            except Exception as e:
+                logger.error(f"Similarity index upgrade failed: {str(e)}")
+
+        self._upgrade_thread = threading.Thread(target=run, name="similarity-upgrade", daemon=True)
+        self._upgrade_thread.start()
+
+    def _fix_mean(self) -> None:
+        """Fix the mean shape from the aligned shapes indexed so far and re-express them; call with the lock held."""
+        ids, shapes = self._index.items()
+        self.mean_shape = shapes.mean(axis=0)
+        index = FlatIndex(VECTOR_DIM)
+        index.add(ids, _unit(shapes - self.mean_shape))
+        self._index = index
+
+    def load(self, db: Session) -> None:
+        """Build the index from every stored analysis's landmarks, unless already built."""
+        with self._lock:
+            if self._index is not None:
+                return
+            started = time.monotonic()
+            # First pass: the mean shape, unless there are too few faces to tell
+            total, count = np.zeros(VECTOR_DIM), 0
+            for _, _, landmarks, _ in iter_landmark_batches(db, LOAD_BATCH_SIZE):
+                if landmarks.shape[1] >= MESH_POINTS:
+                    total += landmark_vectors(landmarks).sum(axis=0)
+                    count += len(landmarks)
+            mean_shape = total / count if count >= settings.SIMILARITY_MEAN_MIN_SIZE else None
+
+            index = FlatIndex(VECTOR_DIM)
+            owners = {}
+            for ids, user_ids, landmarks, _ in iter_landmark_batches(db, LOAD_BATCH_SIZE):
+                self._synced_id = max(self._synced_id, int(ids.max()))
+                if landmarks.shape[1] < MESH_POINTS:
+                    continue
+                index.add(ids, landmark_vectors(landmarks, mean_shape))
+                owners.update(zip(ids.tolist(), user_ids.tolist()))
+                if self._needs_upgrade(index):
+                    # Nothing is searching yet, so train in place
+                    all_ids, vectors = index.items()
+                    index = self._train(all_ids, vectors)
+            self._owners = owners
+            self.mean_shape = mean_shape
+            self._index = index
+            self._next_sync = time.monotonic() + settings.SIMILARITY_SYNC_SECONDS
+        logger.info(f"Similarity index loaded {len(owners)} analyses in {time.monotonic() - started:.1f}s")
+
+    def start_loading(self) -> None:
+        """Load in a background thread so startup isn't held up."""
+        def run():
+            try:
+                with get_db_context() as db:
+                    self.load(db)
+            except Exception as e:
+                logger.error(f"Similarity index load failed: {str(e)}")
+        threading.Thread(target=run, name="similarity-index", daemon=True).start()
+
+    def _search(self, landmarks: np.ndarray, k: int) -> Tuple[np.ndarray, List[List[Neighbour]]]:
+        with self._lock:
+            vectors = landmark_vectors(landmarks, self.mean_shape)
+            ids, scores = self._index.search(vectors, k)
+            return vectors, [
+                [Neighbour(int(i), self._owners.get(int(i)), float(s)) for i, s in zip(row_ids, row_scores) if i >= 0]
+                for row_ids, row_scores in zip(ids, scores)
+            ]
+
+    def similar(self, db: Session, landmarks: np.ndarray, k: int, exclude: Optional[int] = None) -> List[Neighbour]:
+        """The k stored analyses whose face shape is closest to these (N, 2) landmarks."""
+        self.load(db)
+        self.sync(db)
+        _, (neighbours,) = self._search(landmarks[None], k + 1)
+        return [neighbour for neighbour in neighbours if neighbour.analysis_id != exclude][:k]
+
+    def add(self, analysis_ids: Sequence[int], user_id: int, landmarks: Sequence[np.ndarray]) -> None:
+        """Index new analyses and log any that duplicate another account's.
+
+        Does nothing before the index is loaded; the load reads them from the database.
+        """
+        if self._index is None:
+            return
+        _, results = self._search(np.stack(landmarks), 10)
+        for analysis_id, neighbours in zip(analysis_ids, results):
+            others = [n for n in neighbours if n.user_id != user_id and n.similarity >= settings.SIMILARITY_DUPLICATE_THRESHOLD]
+            if others and self.mean_shape is not None:
+                self.duplicates_found += 1
+                logger.warning(
+                    f"Analysis {analysis_id} of user {user_id} duplicates analyses "
+                    f"{[n.analysis_id for n in others]} of users {sorted({n.user_id for n in others})}"
+                )
+        self._insert(np.asarray(analysis_ids, dtype=np.int64), np.full(len(analysis_ids), user_id), np.stack(landmarks))
+
+    def _insert(self, ids: np.ndarray, user_ids: np.ndarray, landmarks: np.ndarray) -> int:
+        """Index the analyses not indexed yet; returns how many were."""
+        with self._lock:
+            # The load or a sync may already have read these rows
+            new = [i for i, analysis_id in enumerate(ids.tolist()) if analysis_id not in self._owners]
+            if not new:
+                return 0
+            # The mean may have been fixed since the caller searched; until
+            # it is, these are plain aligned shapes
+            self._index.add(ids[new], landmark_vectors(landmarks[new], self.mean_shape))
+            self._owners.update(zip(ids[new].tolist(), user_ids[new].tolist()))
+            if self.mean_shape is None and len(self._index) >= settings.SIMILARITY_MEAN_MIN_SIZE:
+                self._fix_mean()
+            self._start_upgrade()
+            return len(new)
+
+    def sync(self, db: Session) -> int:
+        """Index analyses saved since the last load or sync, e.g. by other workers; returns how many.
+
+        Reads the database at most every SIMILARITY_SYNC_SECONDS. Does nothing
+        before the index is loaded.
+        """
+        now = time.monotonic()
+        if self._index is None or now < self._next_sync:
+            return 0
+        self._next_sync = now + settings.SIMILARITY_SYNC_SECONDS
+        added = 0
+        for ids, user_ids, landmarks, _ in iter_landmark_batches(db, LOAD_BATCH_SIZE, after_id=self._synced_id):
+            self._synced_id = max(self._synced_id, int(ids.max()))
+            if landmarks.shape[1] >= MESH_POINTS:
+                added += self._insert(ids, user_ids, landmarks)
+        return added
+
+    def snapshot(self) -> Dict:
+        index = self._index
+        return {
+            "loaded": index is not None,
+            "kind": type(index).__name__ if index is not None else None,
+            "size": len(index) if index is not None else 0,
+            "mean_shape": self.mean_shape is not None,
+            "duplicates_found": self.duplicates_found,
+        }
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,88 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, Type
+
+class SingleFlight:
+    """At most one call per key in flight; concurrent callers with the same key share its outcome.
+
+    The first caller (the leader) runs its own function; later ones await the
+    leader's result or exception. The call runs in the leader's task, so it
+    sees the leader's request state. If the leader is cancelled, or fails
+    with one of the retry_on exceptions (ones that say something about the
+    leader's request rather than the key, like its deadline), one of the
+    waiters takes over and runs its own function instead.
+
+    A waiter with a deadline (a time.monotonic() value) gives up waiting when
+    it passes and raises timeout_error, whatever the leader's own deadline.
+    """
+
+    def __init__(
+        self,
+        retry_on: Tuple[Type[BaseException], ...] = (),
+        timeout_error: Callable[[], BaseException] = asyncio.TimeoutError,
+    ):
+        self.retry_on = retry_on
+        self.timeout_error = timeout_error
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.shared = 0
+        self.takeovers = 0
+        self.timeouts = 0
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        deadline: Optional[float] = None,
+    ) -> Tuple[Any, bool]:
+        """fn's result, or that of the call for key already in flight; also whether it was shared."""
+        while True:
+            future = self._flights.get(key)
+            if future is None:
+                break
+            try:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                result = await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                # The leader carries on for any other waiters
+                self.timeouts += 1
+                raise self.timeout_error() from None
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    # This caller was cancelled, not the leader
+                    raise
+                self.takeovers += 1
+                continue
+            except self.retry_on:
+                self.takeovers += 1
+                continue
+            self.shared += 1
+            return result, True
+
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting on it; don't warn about an unretrieved exception
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._flights[key] = future
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._flights[key]
+
+    def snapshot(self) -> Dict:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "takeovers": self.takeovers,
+            "timeouts": self.timeouts,
+        }
@@ -0,0 +1,82 @@
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+
+# FaceMesh landmark polygons for the skin regions that are scored
+FOREHEAD = (67, 109, 10, 338, 297, 299, 337, 151, 108, 69)
+LEFT_CHEEK = (117, 118, 101, 36, 205, 187, 123)
+RIGHT_CHEEK = (346, 347, 330, 266, 425, 411, 352)
+SKIN_REGIONS = (FOREHEAD, LEFT_CHEEK, RIGHT_CHEEK)
+SKIN_LANDMARKS = np.array(sorted(set(FOREHEAD + LEFT_CHEEK + RIGHT_CHEEK)))
+
+# The ROI is resampled to this width, so cost per face doesn't grow with resolution
+ROI_WIDTH = 128
+CONTRAST_WINDOW = 5
+BLEMISH_WINDOW = 15
+
+# Metric values at which each penalty saturates, and their weights
+TEXTURE_REF = 40.0  # std of the Laplacian
+CONTRAST_REF = 25.0  # mean local standard deviation
+BLEMISH_REF = 0.1  # fraction of pixels much darker than their surroundings
+BLEMISH_DELTA = 18.0  # intensity drop that counts as a blemish
+WEIGHTS = (0.4, 0.3, 0.3)
+
+def _roi(image: np.ndarray, landmarks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Crop, resample and grey the skin regions; returns the ROI and its region mask."""
+    points = landmarks[SKIN_LANDMARKS]
+    height, width = image.shape[:2]
+    x0, y0 = np.clip(np.floor(points.min(axis=0)).astype(int), 0, [width - 1, height - 1])
+    x1, y1 = np.clip(np.ceil(points.max(axis=0)).astype(int) + 1, 1, [width, height])
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return np.empty((0, 0), np.float32), np.empty((0, 0), np.uint8)
+
+    scale = ROI_WIDTH / (x1 - x0)
+    size = (ROI_WIDTH, max(2, int(round((y1 - y0) * scale))))
+    # Skip rows/columns first on large faces so the area filter reads ~2x the output
+    step = max(1, (x1 - x0) // (2 * ROI_WIDTH))
+    roi = cv2.resize(image[y0:y1:step, x0:x1:step], size, interpolation=cv2.INTER_AREA)
+    if roi.ndim == 3:
+        roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    roi = roi.astype(np.float32)
+
+    mask = np.zeros(roi.shape, np.uint8)
+    polygons = [np.round((landmarks[list(region)] - [x0, y0]) * scale).astype(np.int32) for region in SKIN_REGIONS]
+    cv2.fillPoly(mask, polygons, 255)
+    return roi, mask
+
+def skin_metrics(image: np.ndarray, landmarks: np.ndarray) -> Optional[Tuple[float, float, float]]:
+    """Texture, local contrast and blemish fraction over one face's skin regions."""
+    roi, mask = _roi(image, landmarks)
+    inside = mask > 0
+    if inside.sum() < 16:
+        return None
+
+    # Normalise exposure so the metrics measure variation, not brightness
+    roi *= 128.0 / max(float(roi[inside].mean()), 1.0)
+
+    texture = float(cv2.Laplacian(roi, cv2.CV_32F)[inside].std())
+
+    mean = cv2.blur(roi, (CONTRAST_WINDOW, CONTRAST_WINDOW))
+    mean_sq = cv2.blur(roi * roi, (CONTRAST_WINDOW, CONTRAST_WINDOW))
+    contrast = float(np.sqrt(np.maximum(mean_sq - mean * mean, 0))[inside].mean())
+
+    background = cv2.blur(roi, (BLEMISH_WINDOW, BLEMISH_WINDOW))
+    blemishes = float(((background - roi)[inside] > BLEMISH_DELTA).mean())
+    return texture, contrast, blemishes
+
+def skin_clarity(image: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """Score skin clarity 0-100 for each face of an (F, N, 2) stack in a BGR or gray image.
+
+    Only each face's skin ROI is touched, never the full frame. Faces whose
+    skin can't be measured get NaN, which the scorer replaces with its default.
+    """
+    scores = np.full(len(faces), np.nan)
+    for i, landmarks in enumerate(faces):
+        metrics = skin_metrics(image, landmarks)
+        if metrics is None:
+            # Skin regions too small or off-frame to measure
+            continue
+        texture, contrast, blemishes = metrics
+        penalties = np.minimum([texture / TEXTURE_REF, contrast / CONTRAST_REF, blemishes / BLEMISH_REF], 1.0)
+        scores[i] = 100 * (1 - np.dot(WEIGHTS, penalties))
+    return scores
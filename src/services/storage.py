@@ -1,61 +1,266 @@
 import os
-import uuid
-from typing import Optional
+import re
+import time
+import hashlib
+import tempfile
+from datetime import datetime, timedelta
+from typing import BinaryIO, Optional, Tuple
 from fastapi import UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .storage_backends import StorageBackend, get_storage_backend
+from .thumbnails import ThumbnailService
 from ..config.settings import get_settings
+from ..models.analysis import Analysis
+from ..models.job import PENDING_STATUSES, AnalysisJob
+from ..models.media import MediaObject
 
 settings = get_settings()
 
+ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp"}
+IMAGE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+}
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """Return the image MIME type from its leading magic bytes, if recognised."""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+# A delete that has held its key this long is taken to have crashed
+DELETE_STALE_SECONDS = 60
+DELETE_POLL_INTERVAL = 0.05
+
+CONTENT_KEY_PATTERN = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z]+$")
+
+def content_key(digest: str, content_type: str) -> str:
+    """Content-addressed key sharded by hash prefix, e.g. ab/cd/abcd...ef.jpg."""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{IMAGE_EXTENSIONS[content_type]}"
+
 class StorageService:
-    def __init__(self):
-        self.media_path = settings.MEDIA_PATH
-        os.makedirs(self.media_path, exist_ok=True)
+    """Content-addressed image storage shared by every process.
+
+    Identical uploads share one object. Each save records itself in the
+    media_objects table before checking whether the object exists, and a
+    delete marks the row before deciding: a save that finds the mark waits
+    until the delete is done and then writes the object again, so it never
+    relies on an object that is about to disappear.
+    """
+
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        self.backend = backend or get_storage_backend()
+        self.thumbnails = ThumbnailService(self.backend)
+        self.max_size = settings.MAX_UPLOAD_SIZE
+        self.chunk_size = settings.UPLOAD_CHUNK_SIZE
 
-    async def save_image(self, file: UploadFile) -> str:
+    async def save_image(self, file: UploadFile, db: Session) -> str:
         """Save an uploaded image and return its URL."""
         try:
-            # Generate unique filename
-            file_extension = os.path.splitext(file.filename)[1]
-            file_name = f"{uuid.uuid4()}{file_extension}"
-            file_path = os.path.join(self.media_path, file_name)
-            
-            # Save file
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
-            
+            # Stream the upload to a temp file off the event loop
+            tmp_path, content_type, digest = await run_in_threadpool(self._spool_upload, file.file)
+            key = content_key(digest, content_type)
+            try:
+                await run_in_threadpool(self.claim, db, key)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+            # Identical bytes are stored once; repeats skip the write entirely
+            stored = await run_in_threadpool(self._store, tmp_path, key, content_type)
+
+            # Thumbnails are produced in the background, once per original
+            if stored:
+                self.thumbnails.schedule(key)
+
             # Return URL
-            return f"{settings.MEDIA_URL}{file_name}"
-            
+            return self.backend.url(key)
+
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Error saving file: {str(e)}"
             )
 
-    def delete_image(self, file_path: str) -> None:
-        """Delete an image file."""
+    def _spool_upload(self, source: BinaryIO) -> Tuple[str, str, str]:
+        """Copy an upload to a temp file in fixed-size chunks.
+
+        Enforces the size limit while streaming, sniffs the image type from
+        the first chunk and hashes the content on the way through, so memory
+        use stays at one chunk regardless of size.
+        """
+        fd, tmp_path = tempfile.mkstemp(prefix=".upload-", dir=self.backend.spool_dir)
+        try:
+            with os.fdopen(fd, "wb") as buffer:
+                chunk = source.read(self.chunk_size)
+                content_type = sniff_image_type(chunk)
+                if content_type is None:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Invalid file type. Only JPEG, PNG, and WebP are allowed"
+                    )
+
+                size = 0
+                digest = hashlib.sha256()
+                while chunk:
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"File size exceeds {self.max_size // (1024 * 1024)}MB limit"
+                        )
+                    digest.update(chunk)
+                    buffer.write(chunk)
+                    chunk = source.read(self.chunk_size)
+            return tmp_path, content_type, digest.hexdigest()
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def claim(self, db: Session, key: str) -> None:
+        """Record that key is being saved now, first waiting out any delete of it.
+
+        Until STORAGE_GC_GRACE_SECONDS have passed, delete_image leaves the
+        object alone, which gives the caller that long to commit the row
+        that references it.
+        """
+        deadline = time.monotonic() + settings.STORAGE_DELETE_WAIT_SECONDS
+        while True:
+            now = datetime.utcnow()
+            claimed = db.execute(
+                update(MediaObject)
+                .where(MediaObject.key == key, or_(
+                    MediaObject.deleting_since.is_(None),
+                    MediaObject.deleting_since < now - timedelta(seconds=DELETE_STALE_SECONDS),
+                ))
+                .values(saved_at=now, deleting_since=None)
+            ).rowcount
+            db.commit()
+            if claimed:
+                return
+            if db.get(MediaObject, key, populate_existing=True) is None:
+                try:
+                    db.add(MediaObject(key=key, saved_at=now))
+                    db.commit()
+                    return
+                except IntegrityError:
+                    db.rollback()
+                    continue
+            if time.monotonic() > deadline:
+                raise HTTPException(status_code=503, detail="Storage is busy, please retry")
+            # A delete of this content is under way
+            time.sleep(DELETE_POLL_INTERVAL)
+
+    def _begin_delete(self, db: Session, key: str) -> bool:
+        """Mark key as being deleted, unless it was saved within the grace period or another delete holds it."""
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=settings.STORAGE_GC_GRACE_SECONDS)
+        started = db.execute(
+            update(MediaObject)
+            .where(MediaObject.key == key, MediaObject.saved_at < cutoff, or_(
+                MediaObject.deleting_since.is_(None),
+                MediaObject.deleting_since < now - timedelta(seconds=DELETE_STALE_SECONDS),
+            ))
+            .values(deleting_since=now)
+        ).rowcount
+        db.commit()
+        if started:
+            return True
+        if db.get(MediaObject, key, populate_existing=True) is not None:
+            return False
+        # Stored before saves were recorded
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            db.add(MediaObject(key=key, saved_at=cutoff, deleting_since=now))
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+
+    def _end_delete(self, db: Session, key: str, deleted: bool) -> None:
+        db.rollback()
+        if deleted:
+            db.execute(delete(MediaObject).where(MediaObject.key == key))
+        else:
+            db.execute(update(MediaObject).where(MediaObject.key == key).values(deleting_since=None))
+        db.commit()
+
+    def _store(self, tmp_path: str, key: str, content_type: str) -> bool:
+        """Move a spooled upload to key unless that content is already stored."""
+        if self.backend.exists(key):
+            os.remove(tmp_path)
+            return False
+        self.backend.put_file(tmp_path, key, content_type)
+        return True
+
+    def delete_image(self, image_url: str, db: Session) -> bool:
+        """Release an image, deleting it and its derivatives once unreferenced.
+
+        Images are shared between analyses with identical uploads, so call this
+        after the referencing Analysis row has been deleted or repointed and
+        the change committed. The blob is kept while any Analysis.image_url or
+        queued or running AnalysisJob.image_url still points at it, or while
+        any process saved it within STORAGE_GC_GRACE_SECONDS and its row may
+        not be committed yet. Returns True if the image was deleted.
+        """
+        try:
+            key = self.backend.key_from_url(image_url)
+            if key is None or not self._begin_delete(db, key):
+                return False
+
+            # Saves of this key now wait, so nothing can start relying on it
+            deleted = False
+            try:
+                if not self.references(db, image_url):
+                    self.backend.delete(key)
+                    self.thumbnails.delete_derivatives(key)
+                    deleted = True
+            finally:
+                self._end_delete(db, key, deleted)
+            return deleted
         except Exception as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Error deleting file: {str(e)}"
             )
 
+    def references(self, db: Session, image_url: str) -> int:
+        """Analyses and unfinished jobs pointing at image_url."""
+        analyses = db.query(func.count(Analysis.id)).filter(Analysis.image_url == image_url).scalar()
+        jobs = db.query(func.count(AnalysisJob.id)).filter(
+            AnalysisJob.image_url == image_url,
+            AnalysisJob.status.in_(PENDING_STATUSES),
+        ).scalar()
+        return analyses + jobs
+
+    def thumbnail_url(self, image_url: Optional[str]) -> Optional[str]:
+        """URL of the downscaled variant to show in history views; None without an image."""
+        if image_url is None:
+            return None
+        return self.thumbnails.derivative_url(image_url, "thumb")
+
     async def validate_image(self, file: UploadFile) -> None:
         """Validate uploaded image file."""
-        # Check file size
-        if file.size > 5 * 1024 * 1024:  # 5MB limit
+        # Check file size when the client declared it; save_image enforces
+        # the limit on the actual bytes either way
+        if file.size is not None and file.size > self.max_size:
             raise HTTPException(
                 status_code=400,
-                detail="File size exceeds 5MB limit"
+                detail=f"File size exceeds {self.max_size // (1024 * 1024)}MB limit"
             )
-        
+
         # Check file type
-        allowed_types = {"image/jpeg", "image/png", "image/webp"}
-        if file.content_type not in allowed_types:
+        if file.content_type not in ALLOWED_IMAGE_TYPES:
             raise HTTPException(
                 status_code=400,
                 detail="Invalid file type. Only JPEG, PNG, and WebP are allowed"
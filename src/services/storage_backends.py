@@ -0,0 +1,190 @@
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Optional
+from ..config.settings import get_settings
+
+settings = get_settings()
+
+class StorageBackend(ABC):
+    """Where media objects live. Keys are relative, slash-separated paths."""
+
+    # Directory uploads are spooled to before put_file() takes them over
+    spool_dir: str
+
+    @abstractmethod
+    def put_file(self, local_path: str, key: str, content_type: str) -> None:
+        """Store a local file under key. The backend takes ownership of local_path."""
+
+    @abstractmethod
+    def put_bytes(self, data: bytes, key: str, content_type: str) -> None:
+        """Store a small in-memory object under key."""
+
+    @abstractmethod
+    def get_bytes(self, key: str) -> bytes:
+        """Read an object's content."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Check whether an object exists."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Delete an object if it exists."""
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """Public URL for an object."""
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        """Map a URL produced by url() back to its key."""
+        base = self.url("")
+        if url.startswith(base):
+            return url[len(base):]
+        return None
+
+class LocalStorageBackend(StorageBackend):
+    """Stores media under a directory served at MEDIA_URL."""
+
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url
+
+    @property
+    def spool_dir(self) -> str:
+        # Next to the media so the final rename stays on one filesystem; the
+        # root is made on first use rather than whenever the module is imported
+        os.makedirs(self.root, exist_ok=True)
+        return self.root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def put_file(self, local_path: str, key: str, content_type: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Atomic rename, readers never see a partial file
+        os.replace(local_path, path)
+
+    def put_bytes(self, data: bytes, key: str, content_type: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".upload-", dir=self.spool_dir)
+        with os.fdopen(fd, "wb") as buffer:
+            buffer.write(data)
+        os.replace(tmp_path, path)
+
+    def get_bytes(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}{key}"
+
+class S3StorageBackend(StorageBackend):
+    """Stores media in an S3-compatible bucket (AWS S3, MinIO, R2, ...).
+
+    One client is shared per process; botocore pools connections up to
+    S3_MAX_POOL_CONNECTIONS and upload_file() switches to concurrent
+    multipart uploads above S3_MULTIPART_THRESHOLD.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        public_url: Optional[str] = None,
+    ):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 to be installed")
+
+        self.bucket = bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            config=Config(
+                max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                retries={"max_attempts": 3, "mode": "standard"},
+                # MinIO-style stand-ins don't resolve virtual-hosted buckets
+                s3={"addressing_style": "path" if endpoint_url else "auto"},
+            ),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=4,
+        )
+        if public_url:
+            self.base_url = public_url.rstrip("/") + "/"
+        elif endpoint_url:
+            self.base_url = f"{endpoint_url.rstrip('/')}/{bucket}/"
+        else:
+            self.base_url = f"https://{bucket}.s3.amazonaws.com/"
+        self.spool_dir = tempfile.gettempdir()
+
+    def put_file(self, local_path: str, key: str, content_type: str) -> None:
+        try:
+            self.client.upload_file(
+                local_path,
+                self.bucket,
+                key,
+                ExtraArgs={"ContentType": content_type},
+                Config=self.transfer_config,
+            )
+        finally:
+            os.remove(local_path)
+
+    def put_bytes(self, data: bytes, key: str, content_type: str) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type)
+
+    def get_bytes(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}{key}"
+
+def get_storage_backend(media_path: Optional[str] = None) -> StorageBackend:
+    """Build the backend selected by STORAGE_BACKEND."""
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorageBackend(media_path or settings.MEDIA_PATH, settings.MEDIA_URL)
+    if settings.STORAGE_BACKEND == "s3":
+        return S3StorageBackend(
+            bucket=settings.S3_BUCKET,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            public_url=settings.S3_PUBLIC_URL,
+        )
+    raise ValueError(f"Unknown storage backend: {settings.STORAGE_BACKEND}")
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Set
+import cv2
+import numpy as np
+from .storage_backends import StorageBackend
+from ..config.settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Derivative name -> longest side in pixels. All variants are WebP.
+DERIVATIVES: Dict[str, int] = {
+    "thumb": 256,
+    "medium": 1024,
+}
+WEBP_QUALITY = 80
+
+def derivative_key(key: str, name: str) -> str:
+    """Key of a derivative, stored next to its original."""
+    stem, _ = posixpath.splitext(key)
+    return f"{stem}_{name}.webp"
+
+def _decode_reduced(data: bytes, longest_side: int) -> np.ndarray:
+    """Decode an image at the smallest 1/8, 1/4 or 1/2 scale still covering longest_side.
+
+    libjpeg downscales during decoding, so the coarse attempts are much
+    cheaper than a full-resolution decode followed by a resize.
+    """
+    buf = np.frombuffer(data, np.uint8)
+    for flag in (cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_COLOR_2):
+        reduced = cv2.imdecode(buf, flag)
+        if reduced is not None and max(reduced.shape[:2]) >= longest_side:
+            return reduced
+    image = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Invalid image data")
+    return image
+
+def render_derivative(image: np.ndarray, longest_side: int) -> bytes:
+    """Downscale an image to fit longest_side and encode it as WebP."""
+    height, width = image.shape[:2]
+    scale = longest_side / max(height, width)
+    if scale < 1:
+        image = cv2.resize(
+            image,
+            (max(1, round(width * scale)), max(1, round(height * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+    ok, encoded = cv2.imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, WEBP_QUALITY])
+    if not ok:
+        raise ValueError("WebP encoding failed")
+    return encoded.tobytes()
+
+class ThumbnailService:
+    """Generates downscaled WebP variants of stored images, once per original.
+
+    Work runs on a small dedicated thread pool so thumbnailing never competes
+    with request handling for the default executor.
+    """
+
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix="thumbnails",
+        )
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, key: str) -> None:
+        """Queue derivative generation for key without waiting for it."""
+        task = asyncio.ensure_future(self.generate(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self, timeout: float) -> None:
+        """Wait for scheduled derivative generation to finish, e.g. before shutdown."""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    async def generate(self, key: str) -> None:
+        """Generate all missing derivatives for key, sharing in-flight work."""
+        if key not in self._pending:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, self.generate_sync, key)
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        try:
+            await asyncio.shield(self._pending[key])
+        except Exception as e:
+            logger.error(f"Thumbnail generation failed for {key}: {str(e)}")
+
+    def generate_sync(self, key: str) -> None:
+        """Generate missing derivatives for key on the calling thread."""
+        missing = {
+            name: side for name, side in DERIVATIVES.items()
+            if not self.backend.exists(derivative_key(key, name))
+        }
+        if not missing:
+            return
+
+        # Decode once, at the smallest resolution any missing variant needs
+        image = _decode_reduced(self.backend.get_bytes(key), max(missing.values()))
+        for name, side in sorted(missing.items(), key=lambda item: -item[1]):
+            self.backend.put_bytes(render_derivative(image, side), derivative_key(key, name), "image/webp")
+
+    def derivative_url(self, image_url: str, name: str = "thumb") -> str:
+        """URL of a derivative for an image URL, for history and list views."""
+        key = self.backend.key_from_url(image_url)
+        if key is None:
+            return image_url
+        return self.backend.url(derivative_key(key, name))
+
+    def delete_derivatives(self, key: str) -> None:
+        """Delete every derivative of key."""
+        for name in DERIVATIVES:
+            self.backend.delete(derivative_key(key, name))
@@ -0,0 +1,32 @@
+import os
+import unittest
+
+# Keep the test run off the production database; src.models.base builds its
+# engine from DATABASE_URL at import time.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+from src.models.base import Base  # noqa: E402
+from src.models import analysis, exercise, idempotency, job, media, user  # noqa: E402,F401 - register tables for create_all
+
+def memory_engine(create_tables: bool = True) -> Engine:
+    """A private in-memory SQLite database, shared by every session and thread that uses the engine."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    if create_tables:
+        Base.metadata.create_all(engine)
+    return engine
+
+class DatabaseTestCase(unittest.TestCase):
+    """Gives each test a fresh database with every table: self.engine, self.Session and an open self.db."""
+
+    def setUp(self):
+        self.engine = memory_engine()
+        self.Session = sessionmaker(bind=self.engine)
+        self.db = self.Session()
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
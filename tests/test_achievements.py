@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime, timedelta
+from conftest import DatabaseTestCase
+from src.models.exercise import Achievement, ExerciseHistory, ExerciseStats
+from src.services.achievements import AchievementService, apply_completion, new_stats
+
+class TestAchievements(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = AchievementService()
+        self.start = datetime(2025, 7, 1, 9, 0)
+
+    def _complete(self, *day_offsets):
+        for offset in day_offsets:
+            history = ExerciseHistory(
+                user_id=1,
+                exercise_id=1,
+                completed_at=self.start + timedelta(days=offset),
+                duration_seconds=60,
+            )
+            self.db.add(history)
+            unlocked = self.service.record_completions(self.db, 1, [history])
+            self.db.commit()
+        return unlocked
+
+    def test_streak_counting(self):
+        """Test consecutive days, same-day repeats and streak resets."""
+        stats = new_stats(1)
+        for offset in (0, 0, 1, 2, 4):
+            apply_completion(stats, self.start + timedelta(days=offset), 30)
+        self.assertEqual(stats.current_streak, 1)
+        self.assertEqual(stats.longest_streak, 3)
+        self.assertEqual(stats.total_completions, 5)
+        self.assertEqual(stats.total_seconds, 150)
+
+    def test_achievements_unlock_once(self):
+        """Test that thresholds unlock achievements exactly once."""
+        self._complete(0, 1, 2, 5, 6, 7)
+        names = [a.name for a in self.db.query(Achievement).order_by(Achievement.id)]
+        self.assertEqual(names, ["First Step", "3-Day Streak"])
+
+    def test_rebuild_matches_incremental_state(self):
+        """Test that incremental stats agree with a full rebuild."""
+        self._complete(0, 1, 3, 4, 5)
+        self.assertEqual(self.service.check_consistency(self.db, 1), {})
+
+        # A late offline completion is counted but leaves the streak for rebuild to fix
+        self._complete(2)
+        mismatches = self.service.check_consistency(self.db, 1, fix=True)
+        self.assertEqual(mismatches["longest_streak"], (3, 6))
+        self.assertEqual(self.service.check_consistency(self.db, 1), {})
+
+    def test_first_completions_race(self):
+        """Test losing the race to create the stats row locks and returns the winner's row."""
+        with self.Session() as other:
+            winner = new_stats(1)
+            winner.total_completions = 5
+            other.add(winner)
+            other.commit()
+
+        lookups = []
+        locked = self.service._locked
+        def first_misses(db, user_id):
+            # The lookup ran before the other transaction inserted the row
+            lookups.append(user_id)
+            return None if len(lookups) == 1 else locked(db, user_id)
+
+        with patch.object(self.service, "_locked", side_effect=first_misses):
+            stats = self.service.get_stats(self.db, 1)
+        self.assertEqual(stats.total_completions, 5)
+        self.db.commit()
+        self.assertEqual(self.db.query(ExerciseStats).count(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
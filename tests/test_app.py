@@ -0,0 +1,172 @@
+import base64
+import unittest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session as OrmSession, sessionmaker
+from sqlalchemy.pool import StaticPool
+from src.app import DatabaseComponent, RecommendationsComponent, create_app
+from src.config.settings import Settings
+from src.models.analysis import ExerciseRecommendation
+from src.models.base import get_db
+from src.models.exercise import Exercise
+from src.models.user import User
+from src.services.analysis_history import history_versions
+from src.services.auth import create_access_token
+from src.services.engines import MockEngine
+
+IMAGE = base64.b64encode(b"not decoded by the mock engine").decode()
+
+class Recorder:
+    def __init__(self, name, events, fail=False):
+        self.name, self.events, self.fail = name, events, fail
+
+    async def start(self):
+        if self.fail:
+            raise RuntimeError("start failed")
+        self.events.append(("start", self.name))
+
+    async def stop(self, timeout):
+        self.events.append(("stop", self.name))
+
+class TestCreateApp(unittest.TestCase):
+    def test_mock_mode(self):
+        """Test the mock app serves placeholder analyses through its engine."""
+        app = create_app(Settings(APP_MODE="mock"))
+        self.assertIsInstance(app.state.engine, MockEngine)
+        with TestClient(app) as client:
+            self.assertEqual(client.get("/ping").json(), {"message": "pong"})
+            data = client.post("/api/analyze-face", json={"image": IMAGE}).json()["data"]
+            self.assertEqual(data["scores"]["overall"], 0.84)
+            self.assertEqual(len(data["faces"]), 1)
+            # Line-wrapped base64, as MIME encoders produce, is accepted
+            wrapped = base64.encodebytes(b"not decoded by the mock engine" * 4).decode()
+            self.assertEqual(client.post("/api/analyze-face", json={"image": wrapped}).status_code, 200)
+            self.assertEqual(client.post("/api/analyze-face", json={"image": "not base64!"}).status_code, 400)
+            self.assertEqual(client.post("/api/analyze-face", json={"image": IMAGE, "max_faces": 0}).status_code, 400)
+
+    def test_production_hides_docs(self):
+        """Test the interactive docs are only served outside production."""
+        self.assertEqual(TestClient(create_app(Settings(APP_MODE="mock"))).get("/docs").status_code, 200)
+        app = create_app(Settings(APP_MODE="mock", ENVIRONMENT="production"))
+        self.assertEqual(TestClient(app).get("/docs").status_code, 404)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            create_app(Settings(APP_MODE="turbo"))
+
+    def test_components_start_in_order_and_stop_in_reverse(self):
+        """Test lifespan starts components in order, stops them in reverse, and skips ones that never started."""
+        events = []
+        app = create_app(Settings(APP_MODE="mock"), [Recorder("db", events), Recorder("engine", events)])
+        with TestClient(app):
+            self.assertEqual(events, [("start", "db"), ("start", "engine")])
+        self.assertEqual(events[2:], [("stop", "engine"), ("stop", "db")])
+
+        events.clear()
+        app = create_app(Settings(APP_MODE="mock"), [Recorder("db", events), Recorder("engine", events, fail=True)])
+        with self.assertRaises(RuntimeError):
+            with TestClient(app):
+                pass
+        self.assertEqual(events, [("start", "db"), ("stop", "db")])
+
+class TestFullMode(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Session = sessionmaker(bind=engine)
+        self.app = create_app(Settings(APP_MODE="full"), [DatabaseComponent(engine), MockEngine()])
+
+        def get_test_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        self.app.dependency_overrides[get_db] = get_test_db
+        self.Session = Session
+        # User ids restart with every in-memory database
+        history_versions.invalidate()
+
+    def test_analyze_and_history(self):
+        """Test a stubbed engine's analysis is saved for the user and shows up in their history."""
+        with TestClient(self.app) as client:
+            # Tables exist once the database component has started
+            with self.Session() as db:
+                db.add(User(email="user@example.com", password_hash="x"))
+                db.commit()
+            headers = {"Authorization": f"Bearer {create_access_token({'sub': 'user@example.com'})}"}
+
+            self.assertEqual(client.post("/api/analyze-face", json={"image": IMAGE}).status_code, 401)
+            analysis = client.post("/api/analyze-face", json={"image": IMAGE}, headers=headers).json()
+            self.assertEqual(analysis["scorer_version"], "mock")
+
+            history = client.get("/api/analysis-history/anyone", headers=headers).json()
+            self.assertEqual([item["id"] for item in history], [analysis["id"]])
+            self.assertEqual(history[0]["scores"]["overall"], analysis["scores"]["overall"])
+            # Sent as base64, so there is no stored image to show
+            self.assertEqual((history[0]["image_url"], history[0]["thumbnail_url"]), (None, None))
+            self.assertEqual(client.get("/api/user", headers=headers).json()["email"], "user@example.com")
+
+            wrapped = base64.encodebytes(b"frame" * 40).decode()
+            self.assertEqual(client.post("/api/analyze-face", json={"image": wrapped}, headers=headers).status_code, 200)
+
+    def test_analysis_returns_stored_recommendations(self):
+        """Test the index is built at startup and an analysis's recommendations are returned and saved."""
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Session = sessionmaker(bind=engine)
+        DatabaseComponent(engine).metadata.create_all(engine)
+        with Session() as db:
+            db.add_all([
+                User(email="user@example.com", password_hash="x"),
+                Exercise(name="Jaw clench", category="jawline", difficulty="easy", duration_minutes=3),
+                Exercise(name="Mirror smile", category="symmetry", difficulty="easy", duration_minutes=4),
+            ])
+            db.commit()
+        app = create_app(Settings(APP_MODE="full"), [
+            DatabaseComponent(engine), RecommendationsComponent(Session), MockEngine(),
+        ])
+
+        def get_test_db():
+            with Session() as db:
+                yield db
+
+        app.dependency_overrides[get_db] = get_test_db
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'user@example.com'})}"}
+        with TestClient(app) as client:
+            analysis = client.post("/api/analyze-face", json={"image": IMAGE}, headers=headers).json()
+            # The in-memory database goes away when the app stops
+            with Session() as db:
+                rows = db.query(ExerciseRecommendation).filter(ExerciseRecommendation.analysis_id == analysis["id"]).all()
+
+        recommendations = analysis["exercise_recommendations"]
+        self.assertEqual({rec["name"] for rec in recommendations}, {"Jaw clench", "Mirror smile"})
+        self.assertEqual([rec["priority"] for rec in recommendations], [1, 2])
+        self.assertEqual(sorted(row.priority for row in rows), [1, 2])
+
+    def test_history_etag(self):
+        """Test an unchanged history is answered with 304 without loading it, and a new analysis changes the tag."""
+        with TestClient(self.app) as client:
+            with self.Session() as db:
+                db.add(User(email="user@example.com", password_hash="x"))
+                db.commit()
+            headers = {"Authorization": f"Bearer {create_access_token({'sub': 'user@example.com'})}"}
+            client.post("/api/analyze-face", json={"image": IMAGE}, headers=headers)
+
+            first = client.get("/api/analysis-history/me", headers=headers)
+            etag = first.headers["etag"]
+            with patch.object(OrmSession, "query", autospec=True, side_effect=OrmSession.query) as query:
+                cached = client.get("/api/analysis-history/me", headers={**headers, "If-None-Match": etag})
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached.content, b"")
+            # Only the user lookup for authentication, neither the signature nor the history
+            self.assertEqual(query.call_count, 1)
+
+            client.post("/api/analyze-face", json={"image": IMAGE}, headers=headers)
+            changed = client.get("/api/analysis-history/me", headers={**headers, "If-None-Match": etag})
+            self.assertEqual(changed.status_code, 200)
+            self.assertEqual(len(changed.json()), 2)
+            self.assertNotEqual(changed.headers["etag"], etag)
+
+if __name__ == "__main__":
+    unittest.main()
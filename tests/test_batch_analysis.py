@@ -0,0 +1,103 @@
+import io
+import json
+import unittest
+import zipfile
+from unittest.mock import patch
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from src.api import analysis
+from src.app import DatabaseComponent, create_app
+from src.config.settings import Settings
+from src.models.analysis import Analysis
+from src.models.base import get_db
+from src.models.user import User
+from src.services.auth import create_access_token
+from src.services.face_analysis import Detection
+
+def landmarks_from_bytes(image_bytes):
+    """Stand-in for the mesh: every image has a face except ones starting with b"bad"."""
+    if image_bytes.startswith(b"bad"):
+        raise ValueError("No face detected in the image")
+    seed = int.from_bytes(image_bytes[-4:].ljust(4, b"\0"), "little")
+    return Detection(np.random.default_rng(seed).uniform(100, 300, (478, 2)), 60.0, [])
+
+def archive(names):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("photos/", b"")
+        for name in names:
+            zf.writestr(name, f"image {name}".encode())
+    return buffer.getvalue()
+
+class TestBatchAnalysis(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        self.Session = sessionmaker(bind=engine)
+        app = create_app(Settings(APP_MODE="full"), [DatabaseComponent(engine)])
+
+        def get_test_db():
+            with self.Session() as db:
+                yield db
+
+        app.dependency_overrides[get_db] = get_test_db
+        self.client = TestClient(app)
+        self.client.__enter__()
+        self.addCleanup(self.client.__exit__, None, None, None)
+        with self.Session() as db:
+            db.add(User(email="user@example.com", password_hash="x"))
+            db.commit()
+        self.auth = {"Authorization": f"Bearer {create_access_token({'sub': 'user@example.com'})}"}
+        stub = patch.object(analysis.face_analysis_service, "landmarks_from_bytes", side_effect=landmarks_from_bytes)
+        stub.start()
+        self.addCleanup(stub.stop)
+
+    def post(self, files):
+        return self.client.post("/api/analyze-face/batch", files=[("files", file) for file in files], headers=self.auth)
+
+    def lines(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    def test_files_and_archives_stream_results_then_summary(self):
+        """Test zip members are expanded, failures get their own line, and the summary comes last."""
+        lines = self.lines(self.post([
+            ("one.jpg", b"image one", "image/jpeg"),
+            ("bad.jpg", b"bad image", "image/jpeg"),
+            ("more.zip", archive(["photos/two.png", "photos/three.JPG", "notes.txt"]), "application/zip"),
+        ]))
+        results = [line for line in lines if line["type"] == "result"]
+        errors = [line for line in lines if line["type"] == "error"]
+        summary = lines[-1]
+
+        self.assertEqual(sorted(line["filename"] for line in results), ["one.jpg", "photos/three.JPG", "photos/two.png"])
+        self.assertEqual(errors, [{"type": "error", "index": 1, "filename": "bad.jpg", "error": "No face detected in the image"}])
+        self.assertEqual(summary["type"], "summary")
+        self.assertEqual((summary["total"], summary["succeeded"]), (4, 3))
+        self.assertEqual(summary["failed"], [{key: value for key, value in errors[0].items() if key != "type"}])
+        self.assertTrue(all(0 <= line["scores"]["overall"] <= 100 for line in results))
+
+        with self.Session() as db:
+            self.assertEqual(sorted(id for (id,) in db.query(Analysis.id)), sorted(line["id"] for line in results))
+
+    def test_caps(self):
+        """Test batches over the image count or total size are refused before anything is analyzed."""
+        files = [(f"{i}.jpg", b"image %d" % i, "image/jpeg") for i in range(3)]
+        with patch.object(analysis.settings, "ANALYSIS_BATCH_MAX_IMAGES", 2):
+            self.assertEqual(self.post(files).status_code, 413)
+            # Members of an archive count too
+            self.assertEqual(self.post([("all.zip", archive(["a.jpg", "b.jpg", "c.jpg"]), "application/zip")]).status_code, 413)
+        with patch.object(analysis.settings, "ANALYSIS_BATCH_MAX_BYTES", 15):
+            self.assertEqual(self.post(files).status_code, 413)
+        with self.Session() as db:
+            self.assertEqual(db.query(Analysis).count(), 0)
+
+    def test_bad_batches(self):
+        self.assertEqual(self.post([("broken.zip", b"not a zip", "application/zip")]).status_code, 400)
+        self.assertEqual(self.post([("notes.zip", archive(["notes.txt"]), "application/zip")]).status_code, 400)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import asyncio
+import gzip
+import unittest
+import zlib
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from src.api.compression import CompressionMiddleware, brotli, choose_encoding, etag_matches
+from src.api.serialization import dumps
+
+ROWS = [{"symmetry": 80.0 + i, "jawline": 70.0, "facial_ratio": 90.0, "improvement_tips": []} for i in range(100)]
+LINES = [dumps(row) + b"\n" for row in ROWS[:3]]
+
+async def history(request):
+    return Response(dumps(ROWS), media_type="application/json", headers={"ETag": '"v1"'})
+
+async def small(request):
+    return Response(b'{"message":"pong"}', media_type="application/json")
+
+async def precompressed(request):
+    return Response(gzip.compress(dumps(ROWS)), media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+async def image(request):
+    return Response(b"\xff\xd8" * 1000, media_type="image/jpeg")
+
+async def stream(request):
+    async def lines():
+        for line in LINES:
+            yield line
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def client(minimum_size=1024):
+    app = Starlette(routes=[
+        Route("/history", history),
+        Route("/small", small),
+        Route("/precompressed", precompressed),
+        Route("/image", image),
+        Route("/stream", stream),
+    ])
+    app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
+    return TestClient(app)
+
+class TestNegotiation(unittest.TestCase):
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding("gzip, deflate"), "gzip")
+        self.assertIsNone(choose_encoding(""))
+        self.assertIsNone(choose_encoding("gzip;q=0, identity"))
+        self.assertIsNone(choose_encoding("deflate"))
+        self.assertEqual(choose_encoding("*"), "br" if brotli else "gzip")
+        if brotli:
+            self.assertEqual(choose_encoding("gzip, br"), "br")
+            self.assertEqual(choose_encoding("gzip, br;q=0.5"), "gzip")
+
+    def test_compressed_variant_tags_match(self):
+        self.assertTrue(etag_matches('"v1-gzip"', '"v1"'))
+        self.assertTrue(etag_matches('W/"v1", "v2-br"', 'W/"v2"'))
+        self.assertTrue(etag_matches("*", '"v1"'))
+        self.assertFalse(etag_matches('"v2"', '"v1"'))
+
+class TestCompressionMiddleware(unittest.TestCase):
+    def test_large_json_is_gzipped(self):
+        # The test client decodes gzip bodies transparently
+        response = client().get("/history", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertEqual(response.headers["etag"], '"v1-gzip"')
+        self.assertLess(int(response.headers["content-length"]), len(dumps(ROWS)) // 4)
+        self.assertEqual(response.json(), ROWS)
+
+    def test_left_alone(self):
+        """Test small bodies, binary types, encoded bodies and clients without gzip get the response unchanged."""
+        with client() as c:
+            small = c.get("/small", headers={"Accept-Encoding": "gzip"})
+            self.assertNotIn("content-encoding", small.headers)
+            self.assertEqual(small.headers["vary"], "Accept-Encoding")
+            self.assertNotIn("content-encoding", c.get("/image", headers={"Accept-Encoding": "gzip"}).headers)
+            self.assertEqual(c.get("/precompressed", headers={"Accept-Encoding": "gzip"}).json(), ROWS)
+
+            plain = c.get("/history", headers={"Accept-Encoding": "identity"})
+            self.assertNotIn("content-encoding", plain.headers)
+            self.assertEqual(plain.headers["etag"], '"v1"')
+
+    def test_stream_is_flushed_per_chunk(self):
+        """Test each streamed line can be decoded as soon as its chunk arrives."""
+        chunks = []
+        requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            # The client stays connected
+            await asyncio.Event().wait()
+
+        async def send(message):
+            chunks.append(message)
+
+        scope = {
+            "type": "http", "method": "GET", "path": "/stream", "root_path": "", "scheme": "http",
+            "query_string": b"", "headers": [(b"accept-encoding", b"gzip")], "server": ("test", 80),
+        }
+        asyncio.run(client().app(scope, receive, send))
+
+        start, *bodies = chunks
+        headers = dict(start["headers"])
+        self.assertEqual(headers[b"content-encoding"], b"gzip")
+        self.assertNotIn(b"content-length", headers)
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        decoded = [decoder.decompress(body["body"]) for body in bodies]
+        self.assertEqual(decoded[:3], LINES)
+        self.assertEqual(b"".join(decoded[3:]), b"")
+        self.assertFalse(bodies[-1]["more_body"])
+        self.assertTrue(decoder.eof)
+
+    @unittest.skipIf(brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        response = client().get("/history", headers={"Accept-Encoding": "br, gzip"})
+        self.assertEqual(response.headers["content-encoding"], "br")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from src.api import exercises
+from src.app import DatabaseComponent, create_app
+from src.config.settings import Settings
+from src.models.base import get_db
+from src.models.exercise import Exercise, ExerciseHistory
+from src.models.user import User
+from src.services.auth import create_access_token
+from src.services.catalog import catalog_service
+
+class ExerciseAPITestCase(unittest.TestCase):
+    """A full-mode app on an in-memory database with a couple of exercises."""
+
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        self.Session = sessionmaker(bind=engine)
+        app = create_app(Settings(APP_MODE="full"), [DatabaseComponent(engine)])
+
+        def get_test_db():
+            with self.Session() as db:
+                yield db
+
+        app.dependency_overrides[get_db] = get_test_db
+        self.client = TestClient(app)
+        self.client.__enter__()
+        self.addCleanup(self.client.__exit__, None, None, None)
+        with self.Session() as db:
+            db.add_all([
+                User(email="user@example.com", password_hash="x"),
+                Exercise(name="Jaw clench", category="jawline", difficulty="easy", duration_minutes=3,
+                         updated_at=datetime(2025, 7, 1, 12, 0, 0)),
+                Exercise(name="Mirror smile", category="symmetry", difficulty="medium", duration_minutes=4,
+                         updated_at=datetime(2025, 7, 2, 12, 0, 0)),
+            ])
+            db.commit()
+        # Snapshots are per process; each test has a new database
+        catalog_service.invalidate()
+        self.auth = {"Authorization": f"Bearer {create_access_token({'sub': 'user@example.com'})}"}
+
+class TestCatalog(ExerciseAPITestCase):
+    def get(self, encoding="identity", **headers):
+        return self.client.get("/api/exercises", headers={"Accept-Encoding": encoding, **headers})
+
+    def test_plain_and_gzip_variants(self):
+        plain = self.get()
+        self.assertEqual([exercise["name"] for exercise in plain.json()], ["Jaw clench", "Mirror smile"])
+        self.assertNotIn("content-encoding", plain.headers)
+        self.assertEqual(plain.headers["last-modified"], "Wed, 02 Jul 2025 12:00:00 GMT")
+        self.assertEqual(plain.headers["vary"], "Accept-Encoding")
+
+        # The test client decodes the body; the variant keeps its own tag
+        compressed = self.get("gzip")
+        self.assertEqual(compressed.headers["content-encoding"], "gzip")
+        self.assertEqual(compressed.headers["etag"], plain.headers["etag"][:-1] + '-gzip"')
+        self.assertEqual(compressed.json(), plain.json())
+
+        refused = self.get("gzip;q=0, identity")
+        self.assertNotIn("content-encoding", refused.headers)
+        self.assertEqual(refused.headers["etag"], plain.headers["etag"])
+
+    def test_if_none_match(self):
+        """Test either variant's tag revalidates either variant."""
+        plain_tag = self.get().headers["etag"]
+        gzip_tag = self.get("gzip").headers["etag"]
+        for encoding, tag in (("identity", plain_tag), ("identity", gzip_tag), ("gzip", plain_tag), ("gzip", f"W/{gzip_tag}")):
+            response = self.get(encoding, **{"If-None-Match": tag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b"")
+        self.assertEqual(self.get(**{"If-None-Match": '"stale"'}).status_code, 200)
+
+    def test_if_modified_since(self):
+        last_modified = self.get().headers["last-modified"]
+        self.assertEqual(self.get(**{"If-Modified-Since": last_modified}).status_code, 304)
+        self.assertEqual(self.get(**{"If-Modified-Since": "Tue, 01 Jul 2025 12:00:00 GMT"}).status_code, 200)
+        self.assertEqual(self.get(**{"If-Modified-Since": "not a date"}).status_code, 200)
+
+    def test_exercise_write_invalidates_snapshot(self):
+        """Test an ORM write shows up on the next request, without waiting for the periodic check."""
+        tag = self.get().headers["etag"]
+        with self.Session() as db:
+            db.add(Exercise(name="Chin lift", category="jawline", difficulty="medium", duration_minutes=5))
+            db.commit()
+        response = self.get(**{"If-None-Match": tag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["etag"], tag)
+        self.assertEqual(len(response.json()), 3)
+
+def ndjson(items):
+    return b"".join(json.dumps(item).encode() + b"\n" for item in items)
+
+class TestHistoryBatch(ExerciseAPITestCase):
+    def post(self, content, content_type="application/json"):
+        return self.client.post(
+            "/api/exercises/history/batch",
+            content=content,
+            headers={**self.auth, "Content-Type": content_type},
+        )
+
+    def test_json_batch_statuses(self):
+        """Test each item gets its own status, and a resend is recognised by client_key."""
+        items = [
+            {"exercise_id": 1, "client_key": "a", "duration_seconds": 60},
+            {"exercise_id": 2, "client_key": "b"},
+            {"exercise_id": 1, "client_key": "a"},
+            {"exercise_id": 1, "client_key": "c", "success_rate": 2},
+            {"exercise_id": 99, "client_key": "d"},
+            {"client_key": "e"},
+        ]
+        body = self.post(json.dumps(items)).json()
+        self.assertEqual((body["created"], body["duplicates"], body["invalid"]), (2, 1, 3))
+        self.assertEqual(
+            [result["status"] for result in body["results"]],
+            ["created", "created", "duplicate", "invalid", "invalid", "invalid"],
+        )
+        self.assertEqual(body["results"][4]["errors"], ["Exercise not found"])
+        self.assertEqual(body["results"][5]["client_key"], "e")
+
+        again = self.post(json.dumps(items[:2])).json()
+        self.assertEqual(again["duplicates"], 2)
+        self.assertEqual([result["id"] for result in again["results"]], [result["id"] for result in body["results"][:2]])
+        with self.Session() as db:
+            self.assertEqual(db.query(ExerciseHistory).count(), 2)
+
+    def test_offset_and_omitted_timestamps_mix(self):
+        """Test offset timestamps are stored as naive UTC alongside defaulted ones."""
+        items = [
+            {"exercise_id": 1, "client_key": "a", "completed_at": "2026-03-01T09:30:00+02:00"},
+            {"exercise_id": 2, "client_key": "b"},
+        ]
+        response = self.post(json.dumps(items))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["created"], 2)
+        with self.Session() as db:
+            stored = db.query(ExerciseHistory).filter_by(client_key="a").one()
+            self.assertEqual(stored.completed_at, datetime(2026, 3, 1, 7, 30))
+
+    def test_ndjson_split_across_chunks(self):
+        """Test lines are parsed whole even when chunks split them, and blank lines are skipped."""
+        body = ndjson([{"exercise_id": 1, "client_key": str(i)} for i in range(5)]) + b"\n\n"
+        chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+        result = self.post(iter(chunks), "application/x-ndjson").json()
+        self.assertEqual(result["created"], 5)
+
+        # A last line without a newline still counts
+        result = self.post(b'{"exercise_id": 2, "client_key": "last"}', "application/x-ndjson").json()
+        self.assertEqual(result["created"], 1)
+
+    def test_invalid_bodies(self):
+        self.assertEqual(self.post(b"{not json").status_code, 400)
+        self.assertEqual(self.post(b'{"exercise_id": 1}').status_code, 400)
+        self.assertEqual(self.post(b"[1]\n{oops\n", "application/x-ndjson").status_code, 400)
+
+    def test_caps(self):
+        """Test too many items, too many bytes and an overlong NDJSON line are refused with 413."""
+        items = [{"exercise_id": 1, "client_key": str(i)} for i in range(3)]
+        with patch.object(exercises.settings, "EXERCISE_HISTORY_BATCH_MAX", 2):
+            self.assertEqual(self.post(json.dumps(items)).status_code, 413)
+            self.assertEqual(self.post(ndjson(items), "application/x-ndjson").status_code, 413)
+
+        with patch.object(exercises.settings, "EXERCISE_HISTORY_BATCH_MAX_BYTES", 100):
+            self.assertEqual(self.post(json.dumps(items)).status_code, 413)
+            # Streamed without a Content-Length: cut off while reading
+            self.assertEqual(self.post(iter([ndjson(items)] * 3), "application/x-ndjson").status_code, 413)
+
+        with patch.object(exercises.settings, "EXERCISE_HISTORY_LINE_MAX_BYTES", 64):
+            long_line = json.dumps({"exercise_id": 1, "client_key": "x", "notes": "n" * 100}).encode()
+            self.assertEqual(self.post(iter([long_line[:40], long_line[40:]]), "application/x-ndjson").status_code, 413)
+            self.assertEqual(self.post(long_line + b"\n", "application/x-ndjson").status_code, 413)
+        with self.Session() as db:
+            self.assertEqual(db.query(ExerciseHistory).count(), 0)
+
+if __name__ == "__main__":
+    unittest.main()
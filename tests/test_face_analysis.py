@@ -1,126 +1,79 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
+import cv2
 import numpy as np
-from main import (
-    calculate_symmetry,
-    calculate_jawline,
-    calculate_facial_ratio,
-    analyze_image
-)
+from src.services.face_analysis import FaceAnalysisService
+from src.services.scoring import DEFAULT_SCORER_CONFIG, score_landmarks
+
+def face(rng=None):
+    """One (1, 478, 2) mesh with random points, to be shaped by each test."""
+    rng = rng or np.random.default_rng(0)
+    return rng.uniform(100, 300, size=(1, 478, 2))
 
 class TestFaceAnalysis(unittest.TestCase):
     def setUp(self):
-        # Create mock landmarks for testing
-        self.mock_landmarks = [
-            [100, 100],  # Left eye
-            [200, 100],  # Right eye
-            [150, 200],  # Nose
-            [100, 300],  # Left mouth
-            [200, 300],  # Right mouth
-            # Add more landmarks as needed
-        ]
-        
-        # Create mock image
-        self.mock_image = np.zeros((400, 400, 3), dtype=np.uint8)
+        # Textured frame that passes the quality gate
+        self.mock_image = np.random.default_rng(0).integers(40, 215, (400, 400, 3), dtype=np.uint8)
 
     def test_calculate_symmetry(self):
         """Test symmetry calculation with perfect and imperfect symmetry."""
-        # Perfect symmetry
-        perfect_landmarks = [
-            [100, 100],  # Left point
-            [300, 100],  # Right point
-            [100, 200],  # Left point
-            [300, 200],  # Right point
-            # Add more points
-        ]
-        
-        symmetry_score = calculate_symmetry(perfect_landmarks)
-        self.assertAlmostEqual(symmetry_score, 100.0, delta=1.0)
+        split = DEFAULT_SCORER_CONFIG["symmetry_split"]
+        landmarks = face()
+        # Perfect symmetry: each right-half point coincides with its left-half partner
+        landmarks[:, split:2 * split] = landmarks[:, :split]
+        self.assertAlmostEqual(score_landmarks(landmarks)["symmetry"][0], 100.0, delta=1.0)
 
         # Imperfect symmetry
-        imperfect_landmarks = [
-            [100, 100],  # Left point
-            [300, 120],  # Right point (slightly offset)
-            [100, 200],  # Left point
-            [300, 220],  # Right point (slightly offset)
-        ]
-        
-        symmetry_score = calculate_symmetry(imperfect_landmarks)
+        landmarks[:, split:2 * split] += [0, 20]
+        symmetry_score = score_landmarks(landmarks)["symmetry"][0]
         self.assertLess(symmetry_score, 100.0)
         self.assertGreater(symmetry_score, 0.0)
 
     def test_calculate_jawline(self):
         """Test jawline score calculation."""
-        # Straight jawline
-        straight_jawline = [
-            [100, 300],  # Left
-            [150, 300],  # Center
-            [200, 300],  # Right
-        ]
-        
-        jawline_score = calculate_jawline(straight_jawline)
-        self.assertAlmostEqual(jawline_score, 100.0, delta=1.0)
+        start, stop = DEFAULT_SCORER_CONFIG["jawline"]
+        landmarks = face()
+        # Straight jawline: evenly spaced points
+        landmarks[0, start:stop] = np.stack([np.linspace(100, 200, stop - start), np.full(stop - start, 300)], axis=1)
+        self.assertAlmostEqual(score_landmarks(landmarks)["jawline"][0], 100.0, delta=1.0)
 
         # Uneven jawline
-        uneven_jawline = [
-            [100, 300],  # Left
-            [150, 310],  # Center (slightly up)
-            [200, 300],  # Right
-        ]
-        
-        jawline_score = calculate_jawline(uneven_jawline)
+        landmarks[0, start + 5] += [0, 10]
+        jawline_score = score_landmarks(landmarks)["jawline"][0]
         self.assertLess(jawline_score, 100.0)
         self.assertGreater(jawline_score, 0.0)
 
     def test_calculate_facial_ratio(self):
         """Test facial ratio calculation."""
+        config = DEFAULT_SCORER_CONFIG
+        landmarks = face()
         # Ideal golden ratio
-        golden_ratio_landmarks = {
-            'top': [150, 100],  # Forehead
-            'bottom': [150, 300],  # Chin
-            'left': [100, 200],  # Left cheek
-            'right': [200, 200],  # Right cheek
-        }
-        
-        ratio_score = calculate_facial_ratio(golden_ratio_landmarks)
-        self.assertAlmostEqual(ratio_score, 100.0, delta=1.0)
+        landmarks[0, config["forehead"]] = [150, 100]
+        landmarks[0, config["chin"]] = [150, 100 + 100 * config["ideal_ratio"]]
+        landmarks[0, config["left_cheek"]] = [100, 200]
+        landmarks[0, config["right_cheek"]] = [200, 200]
+        self.assertAlmostEqual(score_landmarks(landmarks)["facial_ratio"][0], 100.0, delta=1.0)
 
-        # Non-ideal ratio
-        non_ideal_landmarks = {
-            'top': [150, 100],  # Forehead
-            'bottom': [150, 350],  # Chin (longer face)
-            'left': [100, 200],  # Left cheek
-            'right': [200, 200],  # Right cheek
-        }
-        
-        ratio_score = calculate_facial_ratio(non_ideal_landmarks)
+        # Non-ideal ratio (longer face)
+        landmarks[0, config["chin"]] = [150, 350]
+        ratio_score = score_landmarks(landmarks)["facial_ratio"][0]
         self.assertLess(ratio_score, 100.0)
         self.assertGreater(ratio_score, 0.0)
 
-    @patch('main.face_mesh.process')
-    def test_analyze_image(self, mock_process):
+    def test_analyze_image(self):
         """Test complete image analysis pipeline."""
-        # Mock MediaPipe results
-        mock_landmarks = MagicMock()
-        mock_landmarks.landmark = [
-            type('Landmark', (), {'x': x/400, 'y': y/400})
-            for x, y in self.mock_landmarks
-        ]
-        
-        mock_results = MagicMock()
-        mock_results.multi_face_landmarks = [mock_landmarks]
-        mock_process.return_value = mock_results
+        service = FaceAnalysisService(max_workers=1)
+        data = cv2.imencode(".png", self.mock_image)[1].tobytes()
+        with patch.object(service, "_detect", return_value=(face().astype(np.float32), [])):
+            faces = service.faces_from_bytes(data)
+        result = service.score_faces(faces)[0]
 
-        # Run analysis
-        result = analyze_image(self.mock_image)
-        
-        # Verify results
-        self.assertTrue(result['success'])
-        self.assertIn('scores', result)
-        self.assertIn('symmetry', result['scores'])
-        self.assertIn('jawline', result['scores'])
-        self.assertIn('facial_ratio', result['scores'])
-        self.assertIn('improvement_tips', result)
+        self.assertTrue(result["landmarks_detected"])
+        self.assertIn("scores", result)
+        for name in ("symmetry", "jawline", "facial_ratio", "skin_clarity", "overall"):
+            self.assertIn(name, result["scores"])
+        self.assertIn("improvement_tips", result)
+        self.assertIn("box", result)
 
-if __name__ == '__main__':
+if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from unittest import mock
+import numpy as np
+from src.services.face_analysis import FaceAnalysisService, FaceCandidate, align_face, map_to_frame
+
+class TestFacePipeline(unittest.TestCase):
+    def setUp(self):
+        self.image = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+        self.candidate = FaceCandidate(
+            box=np.array([600, 300, 100, 120], dtype=np.float32),
+            right_eye=np.array([620, 330], dtype=np.float32),
+            left_eye=np.array([680, 360], dtype=np.float32),
+            nose=np.array([645, 370], dtype=np.float32),
+            score=0.9,
+        )
+
+    def test_crop_is_aligned(self):
+        """Test the crop has a fixed size and levels the eyes."""
+        crop, transform = align_face(self.image, self.candidate, 256, 0.3)
+        self.assertEqual(crop.shape, (256, 256, 3))
+        eyes = np.array([self.candidate.right_eye, self.candidate.left_eye]) @ transform[:, :2].T + transform[:, 2]
+        self.assertAlmostEqual(eyes[0, 1], eyes[1, 1], places=3)
+        self.assertLess(eyes[0, 0], eyes[1, 0])
+
+    def test_landmarks_map_back_to_frame(self):
+        """Test crop coordinates map back onto the original frame pixels."""
+        _, transform = align_face(self.image, self.candidate, 256, 0.3)
+        points = np.array([[610.0, 310.0], [650.0, 360.0], [700.0, 420.0]])
+        in_crop = points @ transform[:, :2].T + transform[:, 2]
+        np.testing.assert_allclose(map_to_frame(in_crop, transform), points, atol=1e-3)
+
+    def test_no_face_exits_before_mesh(self):
+        """Test frames without a detected face never run the mesh."""
+        service = FaceAnalysisService(max_workers=1)
+        with mock.patch.object(service, "find_faces", return_value=[]), \
+                mock.patch.object(service, "mesh_crop") as mesh_crop:
+            faces = service.detect_faces(self.image, max_faces=3)
+        self.assertEqual(len(faces), 0)
+        mesh_crop.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
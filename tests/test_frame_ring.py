@@ -0,0 +1,141 @@
+import asyncio
+import multiprocessing
+import os
+import pickle
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest.mock import patch
+import cv2
+import numpy as np
+from src.services import face_engine
+from src.services.face_analysis import Detection, face_analysis_service
+from src.services.face_engine import FaceMeshEngine, InferenceProcessFailed
+from src.services.frame_ring import FrameRing, attach, frame_view
+from src.services.quality import REJECT, QualityError, QualityIssue
+from src.services.scheduler import InferenceScheduler
+
+def _frame_checksum(slot):
+    # Runs in an engine's inference process, through the ring it attached at start
+    shm, slot_bytes = face_engine._frames
+    return int(frame_view(shm.buf, slot, slot_bytes).sum(dtype=np.int64))
+
+def _checksum(name, slot, slot_bytes):
+    # Runs in a spawned process: read the frame in place and return something small
+    shm = attach(name)
+    try:
+        return int(frame_view(shm.buf, slot, slot_bytes).sum(dtype=np.int64))
+    finally:
+        shm.close()
+
+class TestFrameRing(unittest.TestCase):
+    def setUp(self):
+        self.ring = FrameRing(2, 64 * 64 * 3)
+        self.frame = np.random.default_rng(0).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        self.ring.close()
+
+    def test_lease_lifecycle(self):
+        """Test slots are leased until released, and frames that don't fit are refused."""
+        first = self.ring.write(self.frame)
+        second = self.ring.acquire((32, 32, 3))
+        np.testing.assert_array_equal(self.ring.view(first), self.frame)
+        self.assertIsNone(self.ring.acquire((8, 8, 3)))
+        self.assertIsNone(self.ring.acquire((65, 64, 3)))
+        self.ring.release(first)
+        with self.assertRaises(ValueError):
+            self.ring.release(first)
+        self.assertIsNotNone(self.ring.acquire((8, 8, 3)))
+        self.ring.release(second)
+        self.assertEqual(self.ring.snapshot()["exhausted"], 1)
+
+    def test_leak_detection(self):
+        """Test a slot held past the leak age is reported, and counted once per lease."""
+        slot = self.ring.acquire((8, 8, 3), owner="worker-1")
+        self.assertEqual(self.ring.check_leaks(60.0), [])
+        self.assertEqual(self.ring.check_leaks(0.0)[0]["owner"], "worker-1")
+        self.ring.check_leaks(0.0)
+        self.assertEqual(self.ring.snapshot()["leaks"], 1)
+        self.ring.release(slot)
+        self.assertEqual(self.ring.check_leaks(0.0), [])
+
+    def test_other_process_reads_in_place(self):
+        """Test a spawned process sees the frame written into the shared block."""
+        slot = self.ring.write(self.frame)
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            checksum = pool.submit(_checksum, self.ring.name, slot, self.ring.slot_bytes).result()
+        self.assertEqual(checksum, int(self.frame.sum(dtype=np.int64)))
+        self.ring.release(slot)
+
+class TestProcessEngine(unittest.TestCase):
+    def setUp(self):
+        # A thread stands in for the inference process; it sees the same block through _frames
+        self.engine = FaceMeshEngine(scheduler=InferenceScheduler(slots=1), warm_up=False, processes=1)
+        self.engine.ring = FrameRing(1, 400 * 400 * 3)
+        self.engine.pool = ThreadPoolExecutor(1)
+        face_engine._frames = (self.engine.ring.shm, self.engine.ring.slot_bytes)
+        self.image = np.random.default_rng(0).integers(40, 215, (400, 400, 3), dtype=np.uint8)
+        self.data = cv2.imencode(".png", self.image)[1].tobytes()
+
+    def tearDown(self):
+        self.engine.pool.shutdown()
+        face_engine._frames = None
+        self.engine.ring.close()
+
+    def test_frame_goes_through_slot(self):
+        """Test the decoded frame reaches the worker through the ring and its slot is freed after."""
+        seen = []
+
+        def faces_from_image(image, max_faces):
+            seen.append(image.copy())
+            return Detection(np.zeros((1, 478, 2), np.float32), np.array([50.0]), [])
+
+        with patch.object(face_analysis_service, "faces_from_image", side_effect=faces_from_image):
+            self.engine._detect_in_process(self.data, 1)
+        np.testing.assert_array_equal(seen[0], self.image)
+        self.assertEqual(self.engine.ring.snapshot()["held"], 0)
+        self.assertEqual(self.engine.encoded_fallbacks, 0)
+
+        # With the only slot taken, the encoded bytes are sent instead
+        self.engine.ring.acquire((1, 1, 1))
+        with patch.object(face_analysis_service, "faces_from_bytes", return_value="sent encoded") as fallback:
+            self.assertEqual(self.engine._detect_in_process(self.data, 1), "sent encoded")
+        fallback.assert_called_once_with(self.data, 1)
+        self.assertEqual(self.engine.encoded_fallbacks, 1)
+
+    def test_invalid_image(self):
+        with self.assertRaises(ValueError):
+            self.engine._detect_in_process(b"not an image", 1)
+
+    def test_quality_error_survives_pickling(self):
+        """Test a quality rejection raised in a worker process keeps its issues."""
+        error = QualityError([QualityIssue("blur", REJECT, "Image is too blurry", 12.0)])
+        restored = pickle.loads(pickle.dumps(error))
+        self.assertEqual(restored.issues, error.issues)
+        self.assertEqual(str(restored), str(error))
+
+class TestProcessPoolRecovery(unittest.TestCase):
+    def setUp(self):
+        self.engine = FaceMeshEngine(scheduler=InferenceScheduler(slots=1), warm_up=False, processes=1)
+        asyncio.run(self.engine.start())
+
+    def tearDown(self):
+        asyncio.run(self.engine.stop(1))
+
+    def test_dead_process_is_replaced(self):
+        """Test a process that dies fails its request with a 503, and the next request runs on a new pool with the same ring."""
+        broken = self.engine.pool
+        with self.assertRaises(InferenceProcessFailed):
+            self.engine._run_in_process(os._exit, 1)
+        self.assertIsNot(self.engine.pool, broken)
+        self.assertEqual(self.engine.snapshot()["pool_restarts"], 1)
+
+        frame = np.random.default_rng(0).integers(0, 256, (32, 32, 3), dtype=np.uint8)
+        slot = self.engine.ring.write(frame)
+        try:
+            self.assertEqual(self.engine._run_in_process(_frame_checksum, slot), int(frame.sum(dtype=np.int64)))
+        finally:
+            self.engine.ring.release(slot)
+
+if __name__ == "__main__":
+    unittest.main()
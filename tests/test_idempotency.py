@@ -0,0 +1,192 @@
+import asyncio
+import base64
+import time
+import unittest
+import warnings
+from unittest.mock import patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.exc import SAWarning
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from src.app import DatabaseComponent, create_app
+from src.config.settings import Settings
+from src.models.analysis import Analysis
+from src.models.base import Base, get_db
+from src.models.idempotency import IdempotencyRecord
+from src.models.user import User
+from src.models import exercise, job  # noqa: F401 - register tables for create_all
+from src.services.auth import create_access_token
+from src.services.engines import MockEngine
+from src.services.idempotency import IdempotencyConflict, IdempotencyStore, StoredResponse
+from src.services.scheduler import DeadlineExceeded
+
+class Counter:
+    """A computation that counts its calls and can be held open."""
+
+    def __init__(self, status_code=200, error=None):
+        self.calls = 0
+        self.status_code = status_code
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return self.status_code, {"call": self.calls}
+
+class TestIdempotencyStore(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.store = IdempotencyStore()
+
+    async def test_concurrent_duplicates_share_one_computation(self):
+        """Test duplicates in flight wait for the first request, and later ones replay it."""
+        compute = Counter()
+        first = asyncio.ensure_future(self.store.run("k", b"fp", compute))
+        duplicates = [asyncio.ensure_future(self.store.run("k", b"fp", compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        compute.release.set()
+        (stored, replayed), *rest = await asyncio.gather(first, *duplicates)
+        self.assertFalse(replayed)
+        self.assertEqual(compute.calls, 1)
+        self.assertTrue(all(r == (stored, True) for r in rest))
+
+        self.assertEqual(await self.store.run("k", b"fp", compute), (stored, True))
+        self.assertEqual(compute.calls, 1)
+        self.assertEqual(self.store.snapshot()["coalesced"], 3)
+
+    async def test_different_body_conflicts(self):
+        compute = Counter()
+        compute.release.set()
+        await self.store.run("k", b"fp", compute)
+        with self.assertRaises(IdempotencyConflict):
+            await self.store.run("k", b"other", compute)
+
+    async def test_client_errors_replay_server_errors_retry(self):
+        """Test a 4xx is stored like a success but a 5xx leaves the key free to retry."""
+        rejected = Counter(error=HTTPException(status_code=400, detail="Invalid image data"))
+        rejected.release.set()
+        stored, _ = await self.store.run("bad", b"fp", rejected)
+        self.assertEqual(stored.status_code, 400)
+        await self.store.run("bad", b"fp", rejected)
+        self.assertEqual(rejected.calls, 1)
+
+        failing = Counter(error=HTTPException(status_code=503, detail="Overloaded"))
+        failing.release.set()
+        for _ in range(2):
+            with self.assertRaises(HTTPException):
+                await self.store.run("busy", b"fp", failing)
+        self.assertEqual(failing.calls, 2)
+
+    async def test_duplicate_takes_over_from_cancelled_request(self):
+        """Test a waiting duplicate computes the response itself when the first request is cancelled."""
+        compute = Counter()
+        first = asyncio.ensure_future(self.store.run("k", b"fp", compute))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(self.store.run("k", b"fp", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        compute.release.set()
+        stored, replayed = await second
+        self.assertFalse(replayed)
+        self.assertEqual(compute.calls, 2)
+
+class TestSharedTier(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine, tables=[IdempotencyRecord.__table__])
+        self.db = sessionmaker(bind=engine)()
+
+    def tearDown(self):
+        self.db.close()
+
+    async def test_other_process_replays_from_table(self):
+        """Test a store with an empty memory tier, like another worker's, replays the stored row."""
+        compute = Counter()
+        compute.release.set()
+        stored, _ = await IdempotencyStore().run("k", b"fp", compute, self.db)
+        self.assertEqual(await IdempotencyStore().run("k", b"fp", compute, self.db), (stored, True))
+        self.assertEqual(compute.calls, 1)
+
+    async def test_waits_for_claim_held_elsewhere(self):
+        """Test a duplicate polls a key claimed by another process until its response lands."""
+        other = IdempotencyStore()
+        self.assertIsNone(other._claim(self.db, "k", b"fp"))
+        compute = Counter()
+        with warnings.catch_warnings(), patch.object(self.db, "add", wraps=self.db.add) as add:
+            warnings.simplefilter("error", SAWarning)
+            waiting = asyncio.ensure_future(IdempotencyStore().run("k", b"fp", compute, self.db))
+            await asyncio.sleep(0.3)
+            self.assertFalse(waiting.done())
+
+            other._complete(self.db, "k", StoredResponse(200, b'{"from":"other"}', b"fp"))
+            stored, replayed = await waiting
+        # Only the first attempt inserts; the polls read the row
+        self.assertEqual(add.call_count, 1)
+        self.assertTrue(replayed)
+        self.assertEqual(stored.body, b'{"from":"other"}')
+        self.assertEqual(compute.calls, 0)
+
+    async def test_wait_for_claim_held_elsewhere_ends_at_deadline(self):
+        """Test a duplicate stops polling when its own deadline passes, well before the claim's lock expires."""
+        self.assertIsNone(IdempotencyStore()._claim(self.db, "k", b"fp"))
+        compute = Counter()
+        began = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            await IdempotencyStore().run("k", b"fp", compute, self.db, deadline=began + 0.3)
+        self.assertLess(time.monotonic() - began, 1)
+        self.assertEqual(compute.calls, 0)
+
+    async def test_failed_request_releases_claim(self):
+        failing = Counter(error=RuntimeError("boom"))
+        failing.release.set()
+        with self.assertRaises(RuntimeError):
+            await IdempotencyStore().run("k", b"fp", failing, self.db)
+        self.assertIsNone(self.db.get(IdempotencyRecord, "k"))
+
+class TestEndpoints(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Session = sessionmaker(bind=engine)
+        self.app = create_app(Settings(APP_MODE="full"), [DatabaseComponent(engine), MockEngine()])
+
+        def get_test_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        self.app.dependency_overrides[get_db] = get_test_db
+        self.Session = Session
+
+    def test_retried_analysis_is_saved_once(self):
+        """Test a retry with the same Idempotency-Key replays the response without a second Analysis row."""
+        with TestClient(self.app) as client:
+            with self.Session() as db:
+                db.add(User(email="user@example.com", password_hash="x"))
+                db.commit()
+            token = create_access_token({"sub": "user@example.com"})
+            body = {"image": base64.b64encode(b"frame").decode()}
+            headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "retry-1"}
+
+            first = client.post("/api/analyze-face", json=body, headers=headers)
+            retry = client.post("/api/analyze-face", json=body, headers=headers)
+            self.assertEqual(retry.json(), first.json())
+            self.assertNotIn("idempotent-replayed", first.headers)
+            self.assertEqual(retry.headers["idempotent-replayed"], "true")
+            with self.Session() as db:
+                self.assertEqual(db.query(Analysis).count(), 1)
+
+            changed = client.post("/api/analyze-face", json={**body, "max_faces": 2}, headers=headers)
+            self.assertEqual(changed.status_code, 422)
+            client.post("/api/analyze-face", json=body, headers={"Authorization": headers["Authorization"]})
+            with self.Session() as db:
+                self.assertEqual(db.query(Analysis).count(), 2)
+
+if __name__ == "__main__":
+    unittest.main()
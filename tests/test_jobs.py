@@ -0,0 +1,95 @@
+import unittest
+from datetime import datetime, timedelta
+from conftest import DatabaseTestCase
+from src.models.job import AnalysisJob
+from src.models.user import User
+from src.models.analysis import Analysis
+from src.services.face_analysis import save_analyses
+from src.services.jobs import JobQueue
+from src.services.storage import storage_service
+
+class TestJobQueue(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.free = User(email="free@example.com", password_hash="x", is_premium=False)
+        self.premium = User(email="premium@example.com", password_hash="x", is_premium=True)
+        self.db.add_all([self.free, self.premium])
+        self.db.commit()
+        self.queue = JobQueue()
+
+    def test_premium_jobs_claimed_first(self):
+        """Test premium jobs jump ahead of older free jobs."""
+        free_job = self.queue.enqueue(self.db, self.free, "a.png")
+        premium_job = self.queue.enqueue(self.db, self.premium, "b.png")
+
+        self.assertEqual(self.queue.claim(self.db, "w1").id, premium_job.id)
+        self.assertEqual(self.queue.claim(self.db, "w2").id, free_job.id)
+        self.assertIsNone(self.queue.claim(self.db, "w3"))
+
+    def test_expired_lease_is_reclaimed(self):
+        """Test a crashed worker's job becomes claimable after the visibility timeout."""
+        job = self.queue.enqueue(self.db, self.free, "a.png")
+        claimed = self.queue.claim(self.db, "w1")
+        self.assertEqual((claimed.status, claimed.attempts), ("running", 1))
+        self.assertIsNone(self.queue.claim(self.db, "w2"))
+
+        job.available_at = datetime.utcnow() - timedelta(seconds=1)
+        self.db.commit()
+        reclaimed = self.queue.claim(self.db, "w2")
+        self.assertEqual((reclaimed.id, reclaimed.worker_id, reclaimed.attempts), (job.id, "w2", 2))
+
+    def test_retries_until_max_attempts(self):
+        """Test retryable failures requeue, and the job fails once attempts run out."""
+        job = self.queue.enqueue(self.db, self.free, "a.png")
+        for attempt in range(1, job.max_attempts + 1):
+            claimed = self.queue.claim(self.db, "w1")
+            self.assertEqual(claimed.attempts, attempt)
+            self.queue.fail(self.db, claimed, "storage unavailable")
+            claimed.available_at = datetime.utcnow()
+            self.db.commit()
+
+        self.assertEqual(job.status, "failed")
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(self.queue.claim(self.db, "w1"))
+
+    def test_permanent_failure_and_completion(self):
+        """Test non-retryable errors fail at once and completion stores the result."""
+        bad = self.queue.enqueue(self.db, self.free, "a.png")
+        self.queue.fail(self.db, self.queue.claim(self.db, "w1"), "No face detected in the image", False)
+        self.assertEqual(self.queue.to_dict(bad)["error"], "No face detected in the image")
+
+        good = self.queue.enqueue(self.db, self.free, storage_service.backend.url("ab/cd/b.png"))
+        self.queue.complete(self.db, self.queue.claim(self.db, "w1"), 7, {"scores": {"overall": 80.0}})
+        result = self.queue.to_dict(good)
+        self.assertEqual((result["status"], result["analysis_id"]), ("succeeded", 7))
+        self.assertEqual(result["image_url"], storage_service.backend.url("ab/cd/b.png"))
+        self.assertEqual(result["thumbnail_url"], storage_service.backend.url("ab/cd/b_thumb.webp"))
+
+    def test_lapsed_lease_cannot_finish_the_job(self):
+        """Test a worker whose lease lapsed neither records its analysis nor overwrites the new attempt."""
+        job = self.queue.enqueue(self.db, self.free, "a.png")
+        claimed = self.queue.claim(self.db, "w1")
+        # What the first worker still holds once its lease lapses
+        stale = AnalysisJob(id=claimed.id, worker_id="w1", attempts=1, max_attempts=claimed.max_attempts)
+        job.available_at = datetime.utcnow() - timedelta(seconds=1)
+        self.db.commit()
+        self.assertEqual(self.queue.claim(self.db, "w2").attempts, 2)
+
+        scores = {"symmetry": 80.0, "jawline": 70.0, "facial_ratio": 75.0, "skin_clarity": 65.0, "overall": 73.0}
+        result = {"scores": scores, "improvement_tips": [], "scorer_version": "test"}
+        ids = save_analyses(
+            self.db, self.free.id, [result],
+            before_commit=lambda ids: self.queue.complete(self.db, stale, ids[0], result, commit=False),
+        )
+        self.assertIsNone(ids)
+        self.assertEqual(self.db.query(Analysis).count(), 0)
+        self.assertFalse(self.queue.fail(self.db, stale, "storage unavailable"))
+        self.db.refresh(job)
+        self.assertEqual((job.status, job.worker_id, job.error), ("running", "w2", None))
+
+        self.assertTrue(self.queue.complete(self.db, job, 7, result))
+        self.db.refresh(job)
+        self.assertEqual((job.status, job.analysis_id), ("succeeded", 7))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from unittest import mock
+import cv2
+import numpy as np
+from src.services.face_analysis import FaceAnalysisService
+from src.services.quality import REJECT, WARN, QualityError, assess_face, assess_image
+
+class TestQualityGate(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Mid-grey texture with plenty of edges
+        self.sharp = rng.integers(40, 215, (480, 640, 3), dtype=np.uint8)
+
+    def codes(self, issues, severity):
+        return {issue.code for issue in issues if issue.severity == severity}
+
+    def test_good_image_passes(self):
+        """Test a sharp, well-exposed image raises no issues."""
+        self.assertEqual(assess_image(self.sharp), [])
+
+    def test_blur_exposure_and_size(self):
+        """Test blurred, dark, overexposed and tiny images are rejected with reasons."""
+        blurred = cv2.GaussianBlur(self.sharp, (0, 0), 12)
+        self.assertIn("blurry", self.codes(assess_image(blurred), REJECT))
+        self.assertIn("too_dark", self.codes(assess_image(self.sharp // 8), REJECT))
+        self.assertIn("too_bright", self.codes(assess_image(np.full_like(self.sharp, 245)), REJECT))
+        self.assertEqual(self.codes(assess_image(self.sharp[:100, :100]), REJECT), {"too_small"})
+
+    def test_dim_image_only_warns(self):
+        """Test a dim but usable image gets a warning, not a rejection."""
+        issues = assess_image((self.sharp * 0.45).astype(np.uint8))
+        self.assertIn("too_dark", self.codes(issues, WARN))
+        self.assertEqual(self.codes(issues, REJECT), set())
+
+    def test_face_pose_and_size(self):
+        """Test faces turned away or too small are rejected from detector keypoints."""
+        box = np.array([100, 100, 200, 200])
+        right_eye, left_eye = np.array([160.0, 170.0]), np.array([240.0, 170.0])
+        self.assertEqual(assess_face(box, right_eye, left_eye, np.array([202.0, 220.0])), [])
+        self.assertIn("off_angle", self.codes(assess_face(box, right_eye, left_eye, np.array([250.0, 220.0])), REJECT))
+        self.assertIn("face_too_small", self.codes(assess_face(box / 4, right_eye, left_eye, right_eye), REJECT))
+
+    def test_rejected_before_detection(self):
+        """Test the gate stops hopeless images before any model runs."""
+        service = FaceAnalysisService(max_workers=1)
+        dark = cv2.imencode(".png", self.sharp // 8)[1].tobytes()
+        with mock.patch.object(service, "_detect") as detect:
+            with self.assertRaises(QualityError) as ctx:
+                service.faces_from_bytes(dark)
+        detect.assert_not_called()
+        self.assertIsInstance(ctx.exception, ValueError)
+        self.assertIn("too_dark", {issue.code for issue in ctx.exception.issues})
+
+if __name__ == "__main__":
+    unittest.main()
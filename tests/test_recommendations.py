@@ -0,0 +1,52 @@
+import unittest
+from conftest import DatabaseTestCase
+from src.models.analysis import Analysis, ExerciseRecommendation
+from src.models.exercise import Exercise
+from src.services.recommendations import RecommendationService
+
+class TestRecommendationService(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db.add_all([
+            Exercise(name="Jaw clench", category="jawline", difficulty="easy", duration_minutes=3),
+            Exercise(name="Chin lift", category="jawline", difficulty="medium", duration_minutes=5),
+            Exercise(name="Mirror smile", category="symmetry", difficulty="medium", duration_minutes=4),
+            Exercise(name="Cheek hold", category="symmetry", difficulty="hard", duration_minutes=6),
+        ])
+        self.db.commit()
+        self.service = RecommendationService()
+        self.service.load(self.db)
+
+    def test_weakest_category_ranked_first(self):
+        """Test ranking by score deficit and difficulty selection."""
+        recs = self.service.recommend({"symmetry": 70.0, "jawline": 50.0, "facial_ratio": 90.0})
+        self.assertEqual([r.name for r in recs], ["Jaw clench", "Chin lift", "Mirror smile", "Cheek hold"])
+        self.assertEqual([r.priority for r in recs], [1, 2, 3, 4])
+        self.assertIn("Jawline score 50", recs[0].reason)
+
+    def test_no_recommendations_above_target(self):
+        """Test that categories at target produce nothing."""
+        self.assertEqual(self.service.recommend({"symmetry": 95.0, "jawline": 88.0}), [])
+
+    def test_index_refreshes_on_catalog_change(self):
+        """Test that ORM changes to exercises invalidate the index."""
+        self.db.add(Exercise(name="Ratio drill", category="facial_ratio", difficulty="easy", duration_minutes=2))
+        self.db.commit()
+        self.service.refresh_if_changed(self.db)
+        recs = self.service.recommend({"facial_ratio": 40.0})
+        self.assertEqual([r.name for r in recs], ["Ratio drill"])
+
+    def test_recommendations_written_in_bulk(self):
+        """Test that recommendations are stored for the analysis."""
+        analysis = Analysis(user_id=1, symmetry_score=70.0, jawline_score=50.0)
+        self.db.add(analysis)
+        self.db.flush()
+        self.service.recommend_for_analysis(self.db, analysis.id, {"symmetry": 70.0, "jawline": 50.0}, limit=3)
+        self.db.commit()
+
+        rows = self.db.query(ExerciseRecommendation).order_by(ExerciseRecommendation.priority).all()
+        self.assertEqual([r.priority for r in rows], [1, 2, 3])
+        self.assertTrue(all(r.analysis_id == analysis.id for r in rows))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import numpy as np
+from conftest import DatabaseTestCase
+from src.models.analysis import Analysis, AnalysisLandmarks
+from src.models.user import User
+from src.services.face_analysis import FaceAnalysisService, Detection, save_analyses
+from src.services.landmark_store import decode_batch, encode_landmarks, load_landmarks, rescore
+from src.services.scoring import DEFAULT_SCORER_CONFIG, Scorer
+
+class TestLandmarkStore(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User(email="user@example.com", password_hash="x")
+        self.db.add(self.user)
+        self.db.commit()
+        rng = np.random.default_rng(0)
+        self.faces = rng.uniform(200, 900, (3, 478, 2))
+
+    def test_roundtrip_is_subpixel(self):
+        """Test quantized landmarks decode to within a small fraction of a pixel."""
+        encoded = [encode_landmarks(face) for face in self.faces]
+        self.assertEqual(len(encoded[0][3]), 478 * 2 * 2)
+        decoded = decode_batch(
+            np.array([[x, y] for x, y, _, _ in encoded]),
+            np.array([scale for _, _, scale, _ in encoded]),
+            [blob for _, _, _, blob in encoded],
+            478,
+        )
+        self.assertLess(np.abs(decoded - self.faces).max(), 0.05)
+
+    def test_rescore_applies_new_version(self):
+        """Test stored analyses are rescored from their landmarks without the images."""
+        detections = [Detection(face, 60.0, []) for face in self.faces]
+        results = FaceAnalysisService(max_workers=1).score(detections)
+        ids = save_analyses(self.db, self.user.id, results, None, [d.landmarks for d in detections])
+        self.assertEqual(self.db.query(AnalysisLandmarks).count(), 3)
+
+        scorer = Scorer({**DEFAULT_SCORER_CONFIG, "version": "v2", "overall_weights": {"skin_clarity": 1.0}})
+        self.assertEqual(rescore(self.db, scorer, batch_size=2), 3)
+
+        for analysis_id, result in zip(ids, results):
+            analysis = self.db.get(Analysis, analysis_id)
+            self.assertEqual(analysis.scorer_version, "v2")
+            self.assertAlmostEqual(analysis.overall_score, 60.0)
+            self.assertAlmostEqual(analysis.symmetry_score, result["scores"]["symmetry"], places=2)
+
+    def test_batch_rows_line_up_with_their_faces(self):
+        """Test each analysis of a batch gets its own face's scores and landmarks."""
+        detections = [Detection(face, skin, []) for face, skin in zip(self.faces, (40.0, 60.0, 80.0))]
+        results = FaceAnalysisService(max_workers=1).score(detections)
+        ids = save_analyses(self.db, self.user.id, results, None, [d.landmarks for d in detections], [40.0, 60.0, 80.0])
+        for analysis_id, result, face, skin in zip(ids, results, self.faces, (40.0, 60.0, 80.0)):
+            self.assertEqual(self.db.get(Analysis, analysis_id).overall_score, result["scores"]["overall"])
+            stored = self.db.get(AnalysisLandmarks, analysis_id)
+            self.assertEqual(stored.skin_clarity, skin)
+            self.assertLess(np.abs(load_landmarks(self.db, analysis_id) - face).max(), 0.05)
+
+    def test_unmeasured_skin_takes_the_new_default(self):
+        """Test skin that couldn't be measured is scored and stored as unknown, not as zero."""
+        detections = [Detection(self.faces[0], np.nan, [])]
+        results = FaceAnalysisService(max_workers=1).score(detections)
+        self.assertEqual(results[0]["scores"]["skin_clarity"], DEFAULT_SCORER_CONFIG["default_skin_clarity"])
+        analysis_id, = save_analyses(self.db, self.user.id, results, None, [self.faces[0]], [np.nan])
+        self.assertIsNone(self.db.get(AnalysisLandmarks, analysis_id).skin_clarity)
+
+        scorer = Scorer({**DEFAULT_SCORER_CONFIG, "version": "v2", "default_skin_clarity": 70.0})
+        rescore(self.db, scorer)
+        self.assertEqual(self.db.get(Analysis, analysis_id).skin_clarity_score, 70.0)
+
+    def test_dry_run_writes_nothing(self):
+        """Test a dry run scores everything but leaves rows untouched."""
+        results = FaceAnalysisService(max_workers=1).score([Detection(self.faces[0], 60.0, [])])
+        analysis_id, = save_analyses(self.db, self.user.id, results, None, [self.faces[0]])
+        scorer = Scorer({**DEFAULT_SCORER_CONFIG, "version": "v2"})
+        self.assertEqual(rescore(self.db, scorer, dry_run=True), 1)
+        self.assertEqual(self.db.get(Analysis, analysis_id).scorer_version, "v1")
+
+if __name__ == "__main__":
+    unittest.main()
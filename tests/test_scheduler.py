@@ -0,0 +1,79 @@
+import asyncio
+import time
+import unittest
+from src.services.scheduler import FREE, PREMIUM, DeadlineExceeded, InferenceScheduler, Overloaded
+
+class TestInferenceScheduler(unittest.IsolatedAsyncioTestCase):
+    def make_scheduler(self, slots=1, wait_slo=None):
+        return InferenceScheduler(
+            slots=slots,
+            weights={PREMIUM: 3.0, FREE: 1.0},
+            wait_slo=wait_slo or {PREMIUM: 60.0, FREE: 60.0},
+        )
+
+    async def test_weighted_fair_order(self):
+        """Test premium gets three slots for each free slot under contention."""
+        scheduler = self.make_scheduler()
+        await scheduler.acquire(FREE)  # occupy the only slot so everything else queues
+        order = []
+
+        async def request(tier):
+            async with scheduler.slot(tier):
+                order.append(tier)
+
+        tasks = [asyncio.ensure_future(request(tier)) for tier in [FREE] * 4 + [PREMIUM] * 6]
+        await asyncio.sleep(0)
+        scheduler.release(FREE)
+        await asyncio.gather(*tasks)
+
+        self.assertEqual(order[:4].count(PREMIUM), 3)
+        self.assertEqual(order[4:8].count(PREMIUM), 3)
+        self.assertEqual(scheduler.snapshot()["tiers"][PREMIUM]["admitted"], 6)
+
+    async def test_free_tier_shed_first(self):
+        """Test the tighter free SLO sheds free requests while premium still queues."""
+        scheduler = self.make_scheduler(wait_slo={PREMIUM: 60.0, FREE: 0.1})
+        await scheduler.acquire(FREE)
+
+        with self.assertRaises(Overloaded) as ctx:
+            await scheduler.acquire(FREE)
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertIn("Retry-After", ctx.exception.headers)
+
+        waiter = asyncio.ensure_future(scheduler.acquire(PREMIUM))
+        await asyncio.sleep(0)
+        scheduler.release(FREE)
+        await waiter
+        self.assertEqual(scheduler.metrics[FREE].shed, 1)
+
+    async def test_expired_deadlines_are_dropped(self):
+        """Test requests past their deadline never take a slot."""
+        scheduler = self.make_scheduler()
+        with self.assertRaises(DeadlineExceeded):
+            await scheduler.acquire(FREE, deadline=time.monotonic() - 1)
+
+        await scheduler.acquire(FREE)
+        with self.assertRaises(DeadlineExceeded):
+            await scheduler.acquire(PREMIUM, deadline=time.monotonic() + 0.05)
+        self.assertEqual(len(scheduler._queues[PREMIUM]), 0)
+
+        scheduler.release(FREE)
+        self.assertEqual(scheduler._running, 0)
+        self.assertEqual(scheduler.metrics[FREE].expired + scheduler.metrics[PREMIUM].expired, 2)
+
+    async def test_cancelled_waiter_frees_its_place(self):
+        """Test a cancelled request is removed and its granted slot is handed on."""
+        scheduler = self.make_scheduler()
+        await scheduler.acquire(FREE)
+        cancelled = asyncio.ensure_future(scheduler.acquire(FREE))
+        waiting = asyncio.ensure_future(scheduler.acquire(FREE))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+
+        scheduler.release(FREE)
+        await waiting
+        self.assertEqual(scheduler._running, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+from src.services.scoring import (
+    Scorer,
+    ScorerRegistry,
+    face_boxes,
+    improvement_tips,
+    score_landmarks,
+    split_scores,
+)
+
+class TestScoring(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.landmarks = rng.uniform(100, 300, size=(4, 478, 2))
+
+    def test_batch_matches_single_face(self):
+        """Test that scoring a batch equals scoring each face alone."""
+        batch = score_landmarks(self.landmarks)
+        for i in range(len(self.landmarks)):
+            single = score_landmarks(self.landmarks[i:i + 1])
+            for name, values in batch.items():
+                self.assertAlmostEqual(values[i], single[name][0])
+
+    def test_scores_in_range(self):
+        """Test that every score is clipped to 0-100."""
+        for values in score_landmarks(self.landmarks).values():
+            self.assertTrue(np.all((values >= 0) & (values <= 100)))
+
+    def test_too_few_landmarks(self):
+        """Test that incomplete meshes score zero."""
+        scores = score_landmarks(np.zeros((2, 10, 2)))
+        self.assertTrue(all(np.all(values == 0) for values in scores.values()))
+
+    def test_split_scores_and_tips(self):
+        """Test per-face dicts with an overall score and low-score tips."""
+        faces = split_scores({
+            "symmetry": np.array([60.0]),
+            "jawline": np.array([80.0]),
+            "facial_ratio": np.array([90.0]),
+            "skin_clarity": np.array([90.0]),
+        })
+        self.assertEqual(faces[0]["overall"], 80.0)
+        self.assertEqual(improvement_tips(faces[0]), ["Consider facial symmetry exercises to improve balance"])
+
+    def test_face_boxes(self):
+        """Test per-face bounding boxes as x, y, width, height."""
+        faces = np.array([
+            [[10, 20], [30, 60], [20, 40]],
+            [[100, 100], [150, 120], [120, 110]],
+        ], dtype=np.float32)
+        np.testing.assert_array_equal(face_boxes(faces), [[10, 20, 20, 40], [100, 100, 50, 20]])
+        self.assertEqual(face_boxes(np.empty((0, 0, 2))).shape, (0, 4))
+
+class TestScorerRegistry(unittest.TestCase):
+    def setUp(self):
+        self.landmarks = np.random.default_rng(1).uniform(100, 300, size=(3, 478, 2))
+        self.registry = ScorerRegistry()
+
+    def test_scorers_are_immutable(self):
+        """Test a scorer's settings and index tables can't be changed in place."""
+        scorer = self.registry.active
+        with self.assertRaises(AttributeError):
+            scorer.ideal_ratio = 1.5
+        with self.assertRaises(ValueError):
+            scorer.jaw[0] = 0
+
+    def test_reload_keeps_in_flight_scorer(self):
+        """Test switching versions leaves a scorer already taken by a request untouched."""
+        in_flight = self.registry.active
+        before = in_flight.score(self.landmarks)
+        self.registry.load({"active": "v2", "scorers": [{"version": "v2", "ideal_ratio": 1.4, "tip_threshold": 90}]})
+
+        self.assertEqual(self.registry.active.version, "v2")
+        np.testing.assert_array_equal(in_flight.score(self.landmarks)["facial_ratio"], before["facial_ratio"])
+        self.assertFalse(np.allclose(self.registry.active.score(self.landmarks)["facial_ratio"], before["facial_ratio"]))
+        self.assertEqual(len(self.registry.active.improvement_tips({"symmetry": 80})), 1)
+        self.assertEqual(self.registry.versions(), ["v1", "v2"])
+
+    def test_versions_cannot_be_redefined(self):
+        """Test a config changing an existing version is rejected as a whole."""
+        with self.assertRaises(ValueError):
+            self.registry.load({"active": "v1", "scorers": [{"version": "v1", "ideal_ratio": 1.5}]})
+        with self.assertRaises(ValueError):
+            self.registry.load({"active": "v3", "scorers": [{"version": "v2"}]})
+        self.assertEqual((self.registry.active.version, self.registry.versions()), ("v1", ["v1"]))
+
+    def test_refresh_from_config_file(self):
+        """Test the registry picks up a changed config file and survives a broken one."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "scorers.json")
+            with open(path, "w") as f:
+                json.dump({"active": "v2", "scorers": [{"version": "v2", "overall_weights": {"symmetry": 1}}]}, f)
+            registry = ScorerRegistry(path)
+            registry.refresh_if_changed()
+            self.assertEqual(registry.active.version, "v2")
+            face = registry.active.split(registry.active.score(self.landmarks[:1]))[0]
+            self.assertAlmostEqual(face["overall"], face["symmetry"])
+
+            with open(path, "w") as f:
+                f.write("{not json")
+            registry._checked_at = None
+            registry.refresh_if_changed()
+            self.assertEqual(registry.active.version, "v2")
+
+    def test_default_scorer_matches_defaults(self):
+        """Test the module helpers score with the built-in v1 rules."""
+        np.testing.assert_array_equal(
+            Scorer({"version": "copy"}).score(self.landmarks)["jawline"],
+            score_landmarks(self.landmarks)["jawline"],
+        )
+
+if __name__ == '__main__':
+    unittest.main()
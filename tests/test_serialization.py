@@ -0,0 +1,40 @@
+import json
+import unittest
+from datetime import datetime
+import numpy as np
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from src.api.serialization import dumps, json_response, open_string_field
+
+class Scores(BaseModel):
+    overall: float
+
+class TestSerialization(unittest.TestCase):
+    def test_dumps_numpy_and_models(self):
+        """Test scoring output and unvalidated models encode without jsonable_encoder."""
+        content = {"scores": np.float64(81.5), "box": np.array([1.0, 2.0]), "model": Scores.model_construct(overall=90.0)}
+        self.assertEqual(json.loads(dumps(content)), {"scores": 81.5, "box": [1.0, 2.0], "model": {"overall": 90.0}})
+        self.assertEqual(json_response({"a": 1}, status_code=201).status_code, 201)
+
+    def test_open_string_field(self):
+        """Test a pre-encoded prefix plus a per-request value is valid JSON."""
+        prefix = open_string_field({"status": "healthy"}, "timestamp")
+        now = datetime.now().isoformat()
+        self.assertEqual(json.loads(prefix + now.encode() + b'"}'), {"status": "healthy", "timestamp": now})
+        self.assertEqual(json.loads(open_string_field({}, "t") + b'x"}'), {"t": "x"})
+
+    def test_static_endpoints(self):
+        """Test the pre-encoded health endpoints serve the same JSON as before."""
+        from main import app
+        client = TestClient(app)
+        root = client.get("/")
+        self.assertEqual(root.headers["content-type"], "application/json")
+        self.assertEqual(root.json()["status"], "healthy")
+        self.assertEqual(client.get("/ping").json(), {"message": "pong"})
+        health = client.get("/health").json()
+        self.assertEqual(health["status"], "healthy")
+        datetime.fromisoformat(health["timestamp"])
+        self.assertEqual(client.post("/api/auth/login", json={"email": "a@b.c", "password": "x"}).json()["message"], "Login successful")
+
+if __name__ == "__main__":
+    unittest.main()
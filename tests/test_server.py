@@ -0,0 +1,80 @@
+import gc
+import logging
+import os
+import runpy
+import unittest
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from src import server
+from src.app import create_app
+from src.config.settings import Settings
+
+HAS_SMAPS = os.path.exists(f"/proc/{os.getpid()}/smaps_rollup")
+
+class TestWorkerCount(unittest.TestCase):
+    def test_scales_with_cores(self):
+        """Test mock workers follow 2 * cores + 1 and inference workers share cores between their threads."""
+        self.assertEqual(server.worker_count(Settings(APP_MODE="mock"), cpus=2), 5)
+        self.assertEqual(server.worker_count(Settings(APP_MODE="full", ANALYSIS_WORKERS=2), cpus=8), 4)
+        self.assertEqual(server.worker_count(Settings(APP_MODE="full", ANALYSIS_WORKERS=2), cpus=1), 1)
+        self.assertEqual(server.worker_count(Settings(APP_MODE="mock", SERVER_MAX_WORKERS=8), cpus=16), 8)
+        self.assertEqual(server.worker_count(Settings(APP_MODE="full", SERVER_WORKERS=3), cpus=64), 3)
+
+class TestMemory(unittest.TestCase):
+    def tearDown(self):
+        server.master_pid = None
+
+    @unittest.skipUnless(HAS_SMAPS, "needs /proc/<pid>/smaps_rollup")
+    def test_process_memory(self):
+        """Test this process's resident memory splits into shared and private pages."""
+        memory = server.process_memory(os.getpid())
+        self.assertGreater(memory["rss_kb"], 0)
+        self.assertEqual(memory["shared_kb"] + memory["private_kb"], memory["rss_kb"])
+
+    @unittest.skipUnless(HAS_SMAPS, "needs /proc/<pid>/smaps_rollup")
+    def test_workers_of_master(self):
+        """Test the report lists the master's children, with the answering one marked current."""
+        server.master_pid = os.getppid()
+        report = server.worker_memory()
+        self.assertEqual(report["master"]["pid"], os.getppid())
+        current = [worker for worker in report["workers"] if worker["current"]]
+        self.assertEqual([worker["pid"] for worker in current], [os.getpid()])
+        self.assertGreater(report["total_pss_kb"], 0)
+
+    def test_endpoint_outside_gunicorn(self):
+        client = TestClient(create_app(Settings(APP_MODE="mock")))
+        report = client.get("/api/metrics/workers").json()
+        self.assertIsNone(report["master"])
+        self.assertEqual(report["workers"][0]["pid"], os.getpid())
+
+    def test_endpoint_needs_token_in_production(self):
+        """Test production hides pids without a metrics token, and checks the token when one is set."""
+        hidden = TestClient(create_app(Settings(APP_MODE="mock", ENVIRONMENT="production")))
+        self.assertEqual(hidden.get("/api/metrics/workers").status_code, 404)
+
+        client = TestClient(create_app(Settings(APP_MODE="mock", ENVIRONMENT="production", METRICS_TOKEN="secret")))
+        self.assertEqual(client.get("/api/metrics/workers").status_code, 403)
+        self.assertEqual(client.get("/api/metrics/workers", headers={"X-Metrics-Token": "wrong"}).status_code, 403)
+        response = client.get("/api/metrics/workers", headers={"X-Metrics-Token": "secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["workers"][0]["pid"], os.getpid())
+
+class TestGunicornConfig(unittest.TestCase):
+    def test_preload_and_freeze(self):
+        """Test the config preloads the app and freezes the master's heap before forking."""
+        config = runpy.run_path("gunicorn.conf.py")
+        self.assertTrue(config["preload_app"])
+        self.assertEqual(config["worker_class"], "uvicorn.workers.UvicornWorker")
+        app = create_app(Settings(APP_MODE="mock"))
+        arbiter = SimpleNamespace(app=SimpleNamespace(wsgi=lambda: app), log=logging.getLogger("gunicorn"), pid=1)
+        try:
+            config["when_ready"](arbiter)
+            self.assertGreater(gc.get_freeze_count(), 0)
+            config["post_fork"](arbiter, SimpleNamespace(pid=os.getpid()))
+            self.assertEqual(server.master_pid, 1)
+        finally:
+            gc.unfreeze()
+            server.master_pid = None
+
+if __name__ == "__main__":
+    unittest.main()
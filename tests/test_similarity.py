@@ -0,0 +1,188 @@
+import threading
+import unittest
+from unittest.mock import patch
+import numpy as np
+from conftest import DatabaseTestCase
+from src.models.user import User
+from src.services.face_analysis import FaceAnalysisService, Detection, save_analyses
+from src.services import similarity
+from src.services.similarity import VECTOR_DIM, FlatIndex, IVFPQIndex, SimilarityIndex, landmark_vectors
+
+def synthetic_faces(count, seed=0):
+    """Faces that vary along a few shape modes, like real ones."""
+    rng = np.random.default_rng(seed)
+    base = rng.normal(0, 50, 478 * 2) + 400
+    modes = rng.normal(0, 1, (20, 478 * 2))
+    faces = base + (rng.normal(0, 1, (count, 20)) * np.linspace(1, 0.1, 20)) @ modes
+    return faces.reshape(count, 478, 2)
+
+class TestLandmarkIndexes(unittest.TestCase):
+    def setUp(self):
+        self.faces = synthetic_faces(2000)
+        self.vectors = landmark_vectors(self.faces)
+
+    def test_vectors_ignore_position_scale_and_roll(self):
+        """Test the same shape moved, scaled and tilted maps to the same vector."""
+        angle = np.radians(20)
+        rotation = np.array([[np.cos(angle), np.sin(angle)], [-np.sin(angle), np.cos(angle)]])
+        moved = self.faces[:1] @ rotation * 1.7 + [120, -40]
+        self.assertAlmostEqual(float(landmark_vectors(moved)[0] @ self.vectors[0]), 1.0, places=5)
+        self.assertEqual(self.vectors.shape, (2000, VECTOR_DIM))
+
+    def test_mean_shape_separates_faces(self):
+        """Test different faces fall well below the duplicate threshold once the mean shape is taken out, and copies above it."""
+        raw = self.vectors[:1000] @ self.vectors[1000:].T
+        self.assertGreater(np.median(raw), similarity.settings.SIMILARITY_DUPLICATE_THRESHOLD)
+
+        mean_shape = self.vectors.mean(axis=0)
+        vectors = landmark_vectors(self.faces, mean_shape)
+        different = vectors[:1000] @ vectors[1000:].T
+        self.assertLess(abs(np.median(different)), 0.05)
+        self.assertLess(different.max(), similarity.settings.SIMILARITY_DUPLICATE_THRESHOLD)
+
+        # A re-encoded copy moves each point by a fraction of a pixel
+        copies = self.faces + np.random.default_rng(1).normal(0, 0.05, self.faces.shape)
+        same = np.sum(landmark_vectors(copies, mean_shape) * vectors, axis=1)
+        self.assertGreater(same.min(), similarity.settings.SIMILARITY_DUPLICATE_THRESHOLD)
+
+    def test_flat_search_is_exact(self):
+        """Test the flat index returns the true nearest neighbours, padding short results."""
+        index = FlatIndex(VECTOR_DIM)
+        index.add(np.arange(100, 2100), self.vectors)
+        ids, scores = index.search(self.vectors[:5], 3)
+        np.testing.assert_array_equal(ids[:, 0], np.arange(100, 105))
+        self.assertTrue(np.all(np.diff(scores, axis=1) <= 0))
+
+        small = FlatIndex(VECTOR_DIM)
+        small.add(np.array([7]), self.vectors[:1])
+        ids, _ = small.search(self.vectors[:1], 3)
+        np.testing.assert_array_equal(ids[0], [7, -1, -1])
+
+    def test_ivfpq_finds_near_duplicates(self):
+        """Test the compressed index finds a slightly perturbed copy of each face."""
+        index = IVFPQIndex(VECTOR_DIM, components=32, lists=16, subspaces=16, nprobe=4)
+        index.train(self.vectors)
+        index.add(np.arange(2000), self.vectors)
+        self.assertEqual(len(index), 2000)
+        noisy = self.faces[:50] + np.random.default_rng(1).normal(0, 0.2, (50, 478, 2))
+        ids, scores = index.search(landmark_vectors(noisy), 5)
+        self.assertGreaterEqual(np.mean(ids[:, 0] == np.arange(50)), 0.9)
+        self.assertTrue(np.all(scores[:, 0] > 0.99))
+
+class TestSimilarityIndex(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User(email="alice@example.com", password_hash="x")
+        self.bob = User(email="bob@example.com", password_hash="x")
+        self.db.add_all([self.alice, self.bob])
+        self.db.commit()
+        self.faces = synthetic_faces(20)
+        self.service = FaceAnalysisService(max_workers=1)
+
+    def save(self, user, faces):
+        results = self.service.score([Detection(face, 80.0, []) for face in faces])
+        return save_analyses(self.db, user.id, results, None, list(faces))
+
+    @patch.object(similarity.settings, "SIMILARITY_MEAN_MIN_SIZE", 10)
+    def test_similar_and_duplicates(self):
+        """Test neighbours come from stored landmarks and cross-account resubmissions are flagged."""
+        ids = self.save(self.alice, self.faces)
+        index = SimilarityIndex()
+        index.load(self.db)
+        self.assertEqual(index.snapshot()["size"], 20)
+
+        neighbours = index.similar(self.db, self.faces[3], 5, exclude=ids[3])
+        self.assertEqual(len(neighbours), 5)
+        self.assertNotIn(ids[3], [n.analysis_id for n in neighbours])
+        self.assertEqual({n.user_id for n in neighbours}, {self.alice.id})
+
+        # Alice re-analyzing her own photo is not a duplicate; Bob uploading it is
+        own = self.save(self.alice, self.faces[:1])
+        index.add(own, self.alice.id, self.faces[:1])
+        self.assertEqual(index.duplicates_found, 0)
+        copied = self.save(self.bob, self.faces[:1] + 0.01)
+        index.add(copied, self.bob.id, self.faces[:1] + 0.01)
+        self.assertEqual(index.duplicates_found, 1)
+        self.assertEqual(index.snapshot()["size"], 22)
+
+    @patch.object(similarity.settings, "SIMILARITY_MEAN_MIN_SIZE", 10)
+    def test_mean_shape_is_fixed_once_enough_faces_arrive(self):
+        """Test an index loaded empty flags no duplicates until it has seen enough faces for a mean shape."""
+        index = SimilarityIndex()
+        index.load(self.db)
+        self.assertFalse(index.snapshot()["mean_shape"])
+
+        first = self.save(self.alice, self.faces[:5])
+        index.add(first, self.alice.id, self.faces[:5])
+        copied = self.save(self.bob, self.faces[:1])
+        index.add(copied, self.bob.id, self.faces[:1])
+        self.assertEqual(index.duplicates_found, 0)
+
+        rest = self.save(self.alice, self.faces[5:])
+        index.add(rest, self.alice.id, self.faces[5:])
+        self.assertTrue(index.snapshot()["mean_shape"])
+        copied = self.save(self.bob, self.faces[7:8])
+        index.add(copied, self.bob.id, self.faces[7:8])
+        self.assertEqual(index.duplicates_found, 1)
+        self.assertEqual(index.similar(self.db, self.faces[9], 1)[0].analysis_id, rest[4])
+
+    @patch.multiple(similarity.settings, SIMILARITY_MEAN_MIN_SIZE=10, SIMILARITY_SYNC_SECONDS=60)
+    def test_workers_sync_each_others_analyses(self):
+        """Test a worker's copy of the index picks up another worker's analyses once its sync interval passes."""
+        self.save(self.alice, self.faces[:15])
+        mine, theirs = SimilarityIndex(), SimilarityIndex()
+        mine.load(self.db)
+        theirs.load(self.db)
+
+        # Saved through the other worker: only its own copy has it at once
+        (new,) = self.save(self.alice, self.faces[15:16])
+        theirs.add([new], self.alice.id, self.faces[15:16])
+        self.assertEqual(theirs.similar(self.db, self.faces[15], 1)[0].analysis_id, new)
+        self.assertNotEqual(mine.similar(self.db, self.faces[15], 1)[0].analysis_id, new)
+
+        mine._next_sync = 0
+        self.assertEqual(mine.sync(self.db), 1)
+        self.assertEqual(mine.similar(self.db, self.faces[15], 1)[0].analysis_id, new)
+        self.assertEqual(mine.snapshot()["size"], 16)
+        # Bob copying it through this worker is now caught
+        (copied,) = self.save(self.bob, self.faces[15:16])
+        mine.add([copied], self.bob.id, self.faces[15:16])
+        self.assertEqual(mine.duplicates_found, 1)
+        self.assertEqual(mine.sync(self.db), 0)
+
+    @patch.multiple(
+        similarity.settings,
+        SIMILARITY_MEAN_MIN_SIZE=10,
+        SIMILARITY_IVF_MIN_SIZE=300,
+        SIMILARITY_IVF_LISTS=16,
+        SIMILARITY_PCA_COMPONENTS=32,
+        SIMILARITY_PQ_SUBSPACES=16,
+    )
+    def test_upgrade_trains_in_the_background(self):
+        """Test add() returns while the IVF-PQ index trains, searches keep working, and later rows survive the swap."""
+        faces = synthetic_faces(310, seed=2)
+        index = SimilarityIndex()
+        index.load(self.db)
+        index.add(list(range(1, 300)), self.alice.id, list(faces[:299]))
+
+        release = threading.Event()
+        train = IVFPQIndex.train
+        def blocked_train(self, vectors):
+            release.wait(10)
+            train(self, vectors)
+
+        with patch.object(IVFPQIndex, "train", blocked_train):
+            index.add([300], self.alice.id, [faces[299]])
+            self.assertTrue(index._upgrade_thread.is_alive())
+            index.add(list(range(301, 311)), self.alice.id, list(faces[300:]))
+            self.assertEqual(index.snapshot()["kind"], "FlatIndex")
+            self.assertEqual(index.similar(self.db, faces[305], 1)[0].analysis_id, 306)
+            release.set()
+            index._upgrade_thread.join(10)
+
+        self.assertEqual(index.snapshot()["kind"], "IVFPQIndex")
+        self.assertEqual(index.snapshot()["size"], 310)
+        self.assertEqual(index.similar(self.db, faces[305], 1)[0].analysis_id, 306)
+
+if __name__ == "__main__":
+    unittest.main()
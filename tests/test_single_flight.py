@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import numpy as np
+from src.services.face_analysis import Detection, FaceAnalysisService
+from src.services.face_engine import FaceMeshEngine
+from src.services.scheduler import DeadlineExceeded, InferenceScheduler
+from src.services.single_flight import SingleFlight
+
+class Call:
+    """A function that counts its calls and finishes when released."""
+
+    def __init__(self, error=None):
+        self.calls = 0
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return self.calls
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight()
+        call = Call()
+        tasks = [asyncio.ensure_future(flights.do("image", call)) for _ in range(4)]
+        await asyncio.sleep(0)
+        call.release.set()
+        results = await asyncio.gather(*tasks)
+        self.assertEqual(results, [(1, False), (1, True), (1, True), (1, True)])
+        self.assertEqual(flights.snapshot(), {"in_flight": 0, "leaders": 1, "shared": 3, "takeovers": 0, "timeouts": 0})
+
+        # Sequential calls are not cached
+        self.assertEqual(await flights.do("image", call), (2, False))
+
+    async def test_exceptions_are_shared(self):
+        flights = SingleFlight()
+        call = Call(error=ValueError("No face detected in the image"))
+        tasks = [asyncio.ensure_future(flights.do("image", call)) for _ in range(2)]
+        await asyncio.sleep(0)
+        call.release.set()
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            self.assertIsInstance(result, ValueError)
+        self.assertEqual(call.calls, 1)
+
+    async def test_waiter_takes_over_from_cancelled_leader(self):
+        """Test cancelling the leader hands the call to a waiter instead of failing it."""
+        flights = SingleFlight()
+        call = Call()
+        leader = asyncio.ensure_future(flights.do("image", call))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flights.do("image", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        call.release.set()
+        self.assertEqual(await waiter, (2, False))
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(flights.takeovers, 1)
+
+    async def test_cancelled_waiter_leaves_leader_running(self):
+        flights = SingleFlight()
+        call = Call()
+        leader = asyncio.ensure_future(flights.do("image", call))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flights.do("image", call))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        call.release.set()
+        self.assertEqual(await leader, (1, False))
+        self.assertTrue(waiter.cancelled())
+
+    async def test_retry_on_leader_specific_errors(self):
+        """Test a waiter retries itself when the leader failed for its own reasons, like its deadline."""
+        flights = SingleFlight(retry_on=(DeadlineExceeded,))
+        expired = Call(error=DeadlineExceeded())
+        leader = asyncio.ensure_future(flights.do("image", expired))
+        await asyncio.sleep(0)
+        fresh = Call()
+        fresh.release.set()
+        waiter = asyncio.ensure_future(flights.do("image", fresh))
+        await asyncio.sleep(0)
+        expired.release.set()
+        with self.assertRaises(DeadlineExceeded):
+            await leader
+        self.assertEqual(await waiter, (1, False))
+
+    async def test_waiter_stops_at_its_own_deadline(self):
+        """Test a waiter gives up when its deadline passes while the leader runs on for the others."""
+        flights = SingleFlight(timeout_error=DeadlineExceeded)
+        call = Call()
+        leader = asyncio.ensure_future(flights.do("image", call))
+        await asyncio.sleep(0)
+        patient = asyncio.ensure_future(flights.do("image", call))
+        with self.assertRaises(DeadlineExceeded):
+            await flights.do("image", call, deadline=time.monotonic() + 0.05)
+        self.assertFalse(leader.done())
+        call.release.set()
+        self.assertEqual(await leader, (1, False))
+        self.assertEqual(await patient, (1, True))
+        self.assertEqual(flights.timeouts, 1)
+
+class TestEngineSingleFlight(unittest.IsolatedAsyncioTestCase):
+    async def test_identical_images_run_one_detection(self):
+        """Test concurrent requests for the same bytes share one detection and count the saved ones."""
+        service = FaceAnalysisService(max_workers=2)
+        engine = FaceMeshEngine(
+            service=service,
+            scheduler=InferenceScheduler(slots=2, executor=ThreadPoolExecutor(2)),
+            warm_up=False,
+            processes=0,
+        )
+        started, release = threading.Event(), threading.Event()
+        detections = []
+
+        def faces_from_bytes(image_bytes, max_faces):
+            detections.append(image_bytes)
+            started.set()
+            release.wait(5)
+            return Detection(np.random.default_rng(0).uniform(100, 300, (1, 478, 2)), np.array([60.0]), [])
+
+        with patch.object(service, "faces_from_bytes", side_effect=faces_from_bytes):
+            tasks = [asyncio.ensure_future(engine.analyze(data)) for data in (b"same", b"same", b"same", b"other")]
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            await asyncio.sleep(0.05)
+            release.set()
+            results = await asyncio.gather(*tasks)
+
+        self.assertEqual(sorted(detections), [b"other", b"same"])
+        self.assertEqual(engine.snapshot()["inferences_saved"], 2)
+        # Every caller gets its own result dicts
+        self.assertIsNot(results[0].faces[0], results[1].faces[0])
+        self.assertEqual(results[0].faces[0]["scores"], results[1].faces[0]["scores"])
+
+    async def test_duplicate_waits_no_longer_than_its_deadline(self):
+        """Test a duplicate request whose deadline passes while the leader detects gets a 504 on time."""
+        service = FaceAnalysisService(max_workers=1)
+        engine = FaceMeshEngine(
+            service=service,
+            scheduler=InferenceScheduler(slots=1, executor=ThreadPoolExecutor(1)),
+            warm_up=False,
+            processes=0,
+        )
+        started, release = threading.Event(), threading.Event()
+
+        def faces_from_bytes(image_bytes, max_faces):
+            started.set()
+            release.wait(5)
+            return Detection(np.random.default_rng(0).uniform(100, 300, (1, 478, 2)), np.array([60.0]), [])
+
+        with patch.object(service, "faces_from_bytes", side_effect=faces_from_bytes):
+            leader = asyncio.ensure_future(engine.analyze(b"same"))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            began = time.monotonic()
+            with self.assertRaises(DeadlineExceeded):
+                await engine.analyze(b"same", deadline=began + 0.1)
+            self.assertLess(time.monotonic() - began, 1)
+            release.set()
+            await leader
+
+        self.assertEqual(engine.snapshot()["single_flight"]["timeouts"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
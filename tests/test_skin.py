@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+from src.services.skin import SKIN_REGIONS, skin_clarity
+
+def face_landmarks(size=400, offset=50):
+    """478 landmarks whose skin regions are circles inside a size x size face."""
+    landmarks = np.full((478, 2), offset + size / 2, dtype=np.float32)
+    for region, (cx, cy) in zip(SKIN_REGIONS, ((0.5, 0.2), (0.3, 0.6), (0.7, 0.6))):
+        angles = np.linspace(0, 2 * np.pi, len(region), endpoint=False)
+        landmarks[list(region)] = np.stack([
+            offset + (cx + 0.12 * np.cos(angles)) * size,
+            offset + (cy + 0.1 * np.sin(angles)) * size,
+        ], axis=1)
+    return landmarks
+
+class TestSkinClarity(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.faces = face_landmarks()[None]
+
+    def image(self, brightness=170, noise=0.0):
+        image = np.full((500, 500, 3), brightness, np.float32) + self.rng.normal(0, noise, (500, 500, 3))
+        return np.clip(image, 0, 255).astype(np.uint8)
+
+    def test_smooth_skin_beats_rough_skin(self):
+        """Test texture and local contrast lower the score."""
+        smooth = skin_clarity(self.image(noise=1), self.faces)[0]
+        rough = skin_clarity(self.image(noise=30), self.faces)[0]
+        self.assertGreater(smooth, 90)
+        self.assertLess(rough, smooth - 15)
+
+    def test_blemishes_lower_the_score(self):
+        """Test dark spots on otherwise clear skin are penalised."""
+        clear = self.image(noise=1)
+        spotted = clear.copy()
+        # Scatter spots over the forehead region
+        for x, y in self.rng.uniform([215, 100], [285, 160], (30, 2)).astype(int):
+            spotted[y - 2:y + 3, x - 2:x + 3] = 90
+        self.assertLess(skin_clarity(spotted, self.faces)[0], skin_clarity(clear, self.faces)[0] - 5)
+
+    def test_exposure_invariant(self):
+        """Test the same skin scores alike when lit brighter or darker."""
+        noise = self.rng.normal(0, 10, (500, 500, 1))
+        bright = np.clip(170 + noise, 0, 255).astype(np.uint8).repeat(3, axis=2)
+        dark = np.clip(85 + noise / 2, 0, 255).astype(np.uint8).repeat(3, axis=2)
+        self.assertAlmostEqual(skin_clarity(bright, self.faces)[0], skin_clarity(dark, self.faces)[0], delta=3)
+
+    def test_off_frame_face_is_unmeasured(self):
+        """Test faces whose skin regions fall outside the image get NaN, not a zero score."""
+        self.assertTrue(np.isnan(skin_clarity(self.image(), face_landmarks(offset=2000)[None])[0]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,262 @@
+import asyncio
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+import cv2
+import numpy as np
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from src.models.base import Base
+from src.models.analysis import Analysis
+from src.models import exercise, user  # noqa: F401 - register tables for create_all
+from src.models.job import AnalysisJob
+from src.models.media import MediaObject
+from src.services.media_compaction import compact_media
+from src.services.storage import StorageService, sniff_image_type
+from src.services.storage_backends import LocalStorageBackend, S3StorageBackend
+from src.services.thumbnails import derivative_key
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+class TestStorageService(unittest.TestCase):
+    def setUp(self):
+        self.media_dir = tempfile.TemporaryDirectory()
+        self.backend = LocalStorageBackend(self.media_dir.name, "http://testserver/media/")
+        self.storage = StorageService(backend=self.backend)
+        self.storage.chunk_size = 16
+
+        # Saves record themselves from a worker thread, so every thread shares the database
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        self.Session = sessionmaker(bind=engine)
+        self.db = self.Session()
+
+    def tearDown(self):
+        self.db.close()
+        self.media_dir.cleanup()
+
+    def _age_saves(self):
+        """Move every recorded save out of the GC grace period."""
+        self.db.query(MediaObject).update({MediaObject.saved_at: datetime(2000, 1, 1)})
+        self.db.commit()
+
+    def _upload(self, content: bytes) -> UploadFile:
+        return UploadFile(file=io.BytesIO(content), filename="selfie.bin")
+
+    def test_sniff_image_type(self):
+        """Test image type detection from magic bytes."""
+        self.assertEqual(sniff_image_type(b"\xff\xd8\xff\xe0rest"), "image/jpeg")
+        self.assertEqual(sniff_image_type(PNG_HEADER + b"rest"), "image/png")
+        self.assertEqual(sniff_image_type(b"RIFF\x00\x00\x00\x00WEBPVP8 "), "image/webp")
+        self.assertIsNone(sniff_image_type(b"GIF89a"))
+        self.assertIsNone(sniff_image_type(b""))
+
+    def test_save_image_streams_to_disk(self):
+        """Test that uploads are written in chunks with a sniffed extension."""
+        content = PNG_HEADER + os.urandom(100)
+        url = asyncio.run(self.storage.save_image(self._upload(content), self.db))
+
+        self.assertTrue(url.startswith("http://testserver/media/"))
+        self.assertTrue(url.endswith(".png"))
+        self.assertEqual(self.backend.get_bytes(self.backend.key_from_url(url)), content)
+        self.assertEqual([f for f in os.listdir(self.media_dir.name) if f.startswith(".")], [])
+
+    def test_save_image_rejects_oversized_upload(self):
+        """Test that the size limit is enforced while streaming."""
+        self.storage.max_size = 64
+        content = PNG_HEADER + os.urandom(100)
+
+        with self.assertRaises(HTTPException) as ctx:
+            asyncio.run(self.storage.save_image(self._upload(content), self.db))
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertEqual(os.listdir(self.media_dir.name), [])
+
+    def test_save_image_rejects_unknown_type(self):
+        """Test that non-image bytes are rejected regardless of filename."""
+        with self.assertRaises(HTTPException) as ctx:
+            asyncio.run(self.storage.save_image(self._upload(b"not an image at all"), self.db))
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertEqual(os.listdir(self.media_dir.name), [])
+
+    def test_thumbnails_generated_once(self):
+        """Test that WebP derivatives are produced and removed with the original."""
+        image = np.random.randint(0, 255, (1200, 800, 3), dtype=np.uint8)
+        _, encoded = cv2.imencode(".jpg", image)
+
+        async def save_and_thumbnail():
+            url = await self.storage.save_image(self._upload(encoded.tobytes()), self.db)
+            key = self.backend.key_from_url(url)
+            await self.storage.thumbnails.generate(key)
+            return url, key
+
+        url, key = asyncio.run(save_and_thumbnail())
+        thumb = cv2.imdecode(np.frombuffer(self.backend.get_bytes(derivative_key(key, "thumb")), np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(max(thumb.shape[:2]), 256)
+        self.assertEqual(self.storage.thumbnail_url(url), self.backend.url(derivative_key(key, "thumb")))
+
+        self._age_saves()
+        with self.Session() as db:
+            self.assertTrue(self.storage.delete_image(url, db))
+        self.assertFalse(self.backend.exists(key))
+        self.assertFalse(self.backend.exists(derivative_key(key, "thumb")))
+
+    def test_identical_uploads_are_stored_once(self):
+        """Test content-addressed deduplication and reference-counted deletes."""
+        content = PNG_HEADER + os.urandom(100)
+        first = asyncio.run(self.storage.save_image(self._upload(content), self.db))
+        second = asyncio.run(self.storage.save_image(self._upload(content), self.db))
+        self.assertEqual(first, second)
+        key = self.backend.key_from_url(first)
+        self.assertRegex(key, r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.png$")
+
+        self._age_saves()
+        with self.Session() as db:
+            db.add_all([Analysis(user_id=1, image_url=first), Analysis(user_id=2, image_url=first)])
+            db.commit()
+
+            # Still referenced by the second analysis
+            db.query(Analysis).filter(Analysis.user_id == 1).delete()
+            db.commit()
+            self.assertFalse(self.storage.delete_image(first, db))
+            self.assertTrue(self.backend.exists(key))
+
+            db.query(Analysis).delete()
+            db.commit()
+            self.assertTrue(self.storage.delete_image(first, db))
+            self.assertFalse(self.backend.exists(key))
+
+    def test_pending_jobs_keep_their_image(self):
+        """Test a queued or retrying job's image isn't deleted under it, but a finished one's is."""
+        url = asyncio.run(self.storage.save_image(self._upload(PNG_HEADER + os.urandom(100)), self.db))
+        self._age_saves()
+        with self.Session() as db:
+            job = AnalysisJob(user_id=1, image_url=url, status="queued", attempts=1)
+            db.add(job)
+            db.commit()
+            self.assertFalse(self.storage.delete_image(url, db))
+
+            job.status = "succeeded"
+            db.commit()
+            self.assertTrue(self.storage.delete_image(url, db))
+
+    def test_media_root_is_created_on_first_use(self):
+        """Test a local backend leaves no directory behind until something is stored."""
+        root = os.path.join(self.media_dir.name, "lazy")
+        storage = StorageService(backend=LocalStorageBackend(root, "http://testserver/media/"))
+        self.assertFalse(os.path.exists(root))
+        url = asyncio.run(storage.save_image(self._upload(PNG_HEADER + b"lazy"), self.db))
+        self.assertTrue(os.path.exists(os.path.join(root, *storage.backend.key_from_url(url).split("/"))))
+
+    def test_thumbnail_url(self):
+        """Test the thumbnail URL sits next to the original's, and images not in storage have none of their own."""
+        url = self.backend.url("ab/cd/abcd.png")
+        self.assertEqual(self.storage.thumbnail_url(url), self.backend.url(derivative_key("ab/cd/abcd.png", "thumb")))
+        self.assertIsNone(self.storage.thumbnail_url(None))
+
+    def test_recent_uploads_survive_gc(self):
+        """Test that an image is kept while its analysis may still be uncommitted, whichever process saved it."""
+        content = PNG_HEADER + os.urandom(100)
+        url = asyncio.run(self.storage.save_image(self._upload(content), self.db))
+        other_process = StorageService(backend=self.backend)
+        with self.Session() as db:
+            self.assertFalse(other_process.delete_image(url, db))
+        self.assertTrue(self.backend.exists(self.backend.key_from_url(url)))
+
+        # Re-uploading old content renews its grace period
+        self._age_saves()
+        asyncio.run(other_process.save_image(self._upload(content), self.db))
+        with self.Session() as db:
+            self.assertFalse(self.storage.delete_image(url, db))
+
+    def test_upload_waits_out_a_delete_of_its_content(self):
+        """Test an upload of content being deleted writes it again instead of trusting the doomed object."""
+        content = PNG_HEADER + os.urandom(100)
+        url = asyncio.run(self.storage.save_image(self._upload(content), self.db))
+        key = self.backend.key_from_url(url)
+        self._age_saves()
+        self.assertTrue(self.storage._begin_delete(self.db, key))
+
+        saved = []
+        def upload():
+            with self.Session() as db:
+                saved.append(asyncio.run(StorageService(backend=self.backend).save_image(self._upload(content), db)))
+        uploader = threading.Thread(target=upload)
+        uploader.start()
+        time.sleep(0.2)
+        self.assertEqual(saved, [])
+
+        # The delete goes ahead, then the waiting upload stores the content again
+        self.backend.delete(key)
+        self.storage._end_delete(self.db, key, True)
+        uploader.join(5)
+        self.assertEqual(saved, [url])
+        self.assertTrue(self.backend.exists(key))
+        with self.Session() as db:
+            self.assertFalse(self.storage.delete_image(url, db))
+
+    def test_compact_media_dedupes_legacy_files(self):
+        """Test that legacy uuid-named media is migrated and deduplicated."""
+        content = PNG_HEADER + os.urandom(100)
+        self.backend.put_bytes(content, "legacy-a.png", "image/png")
+        self.backend.put_bytes(content, "legacy-b.png", "image/png")
+        with self.Session() as db:
+            self.backend.put_bytes(content, "legacy-c.png", "image/png")
+            db.add_all([
+                Analysis(user_id=1, image_url=self.backend.url("legacy-a.png")),
+                Analysis(user_id=1, image_url=self.backend.url("legacy-b.png")),
+                # Only a queued job refers to this one
+                AnalysisJob(user_id=1, image_url=self.backend.url("legacy-c.png"), status="queued"),
+            ])
+            db.commit()
+
+            stats = compact_media(db, self.storage)
+            self.assertEqual(stats["migrated"], 1)
+            self.assertEqual(stats["deduplicated"], 2)
+
+            urls = {url for (url,) in db.query(Analysis.image_url)} | {url for (url,) in db.query(AnalysisJob.image_url)}
+        self.assertEqual(len(urls), 1)
+        self.assertEqual(self.backend.get_bytes(self.backend.key_from_url(urls.pop())), content)
+        self.assertFalse(self.backend.exists("legacy-a.png"))
+        self.assertFalse(self.backend.exists("legacy-b.png"))
+        self.assertFalse(self.backend.exists("legacy-c.png"))
+
+@unittest.skipUnless(os.getenv("TEST_S3_ENDPOINT_URL"), "set TEST_S3_ENDPOINT_URL to run against MinIO")
+class TestS3StorageBackend(unittest.TestCase):
+    """Runs against a local S3 stand-in, e.g. `minio server /tmp/minio`."""
+
+    def setUp(self):
+        self.backend = S3StorageBackend(
+            bucket=os.getenv("TEST_S3_BUCKET", "mafixy-test"),
+            endpoint_url=os.environ["TEST_S3_ENDPOINT_URL"],
+            region="us-east-1",
+            access_key_id=os.getenv("TEST_S3_ACCESS_KEY_ID", "minioadmin"),
+            secret_access_key=os.getenv("TEST_S3_SECRET_ACCESS_KEY", "minioadmin"),
+        )
+        try:
+            self.backend.client.create_bucket(Bucket=self.backend.bucket)
+        except self.backend.client.exceptions.BucketAlreadyOwnedByYou:
+            pass
+
+    def test_round_trip(self):
+        """Test put, read, URL mapping and delete."""
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as f:
+            f.write(PNG_HEADER + b"payload")
+
+        self.backend.put_file(path, "tests/object.png", "image/png")
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(self.backend.exists("tests/object.png"))
+        self.assertEqual(self.backend.get_bytes("tests/object.png"), PNG_HEADER + b"payload")
+        self.assertEqual(self.backend.key_from_url(self.backend.url("tests/object.png")), "tests/object.png")
+
+        self.backend.delete("tests/object.png")
+        self.assertFalse(self.backend.exists("tests/object.png"))
+
+if __name__ == '__main__':
+    unittest.main()
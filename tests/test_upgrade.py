@@ -0,0 +1,44 @@
+import unittest
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from conftest import memory_engine
+from src.models.base import Base
+from src.models.upgrade import upgrade
+
+class TestSchemaUpgrade(unittest.TestCase):
+    def test_adds_columns_create_all_leaves_out(self):
+        """Test tables from before scorer_version and client_key get them, and a second run changes nothing."""
+        engine = memory_engine(create_tables=False)
+        with engine.begin() as connection:
+            connection.execute(text("CREATE TABLE analyses (id INTEGER PRIMARY KEY, user_id INTEGER, image_url VARCHAR)"))
+            connection.execute(text("CREATE TABLE exercise_history (id INTEGER PRIMARY KEY, user_id INTEGER, exercise_id INTEGER)"))
+            connection.execute(text("INSERT INTO exercise_history (user_id, exercise_id) VALUES (1, 1), (1, 1)"))
+        Base.metadata.create_all(engine)
+
+        self.assertEqual(upgrade(engine), [
+            "scorer_version", "ix_analyses_scorer_version", "ix_analyses_image_url",
+            "client_key", "uq_exercise_history_client_key",
+        ])
+        inspector = inspect(engine)
+        self.assertIn("scorer_version", {column["name"] for column in inspector.get_columns("analyses")})
+        unique = [index for index in inspector.get_indexes("exercise_history") if index["unique"]]
+        self.assertEqual([index["column_names"] for index in unique], [["user_id", "client_key"]])
+
+        # Existing rows without a key stay valid; a repeated key doesn't
+        with engine.begin() as connection:
+            connection.execute(text("UPDATE exercise_history SET client_key = 'a' WHERE id = 1"))
+        with self.assertRaises(IntegrityError), engine.begin() as connection:
+            connection.execute(text("UPDATE exercise_history SET client_key = 'a' WHERE id = 2"))
+        self.assertEqual(upgrade(engine), [])
+
+    def test_fresh_and_legacy_schemas(self):
+        """Test a database create_all made needs nothing, and the legacy schema only gets what its tables can take."""
+        self.assertEqual(upgrade(memory_engine()), [])
+
+        legacy = memory_engine(create_tables=False)
+        with legacy.begin() as connection:
+            connection.execute(text("CREATE TABLE analyses (id VARCHAR PRIMARY KEY, user_id VARCHAR NOT NULL)"))
+        self.assertEqual(upgrade(legacy), ["scorer_version", "ix_analyses_scorer_version"])
+
+if __name__ == "__main__":
+    unittest.main()